@@ -0,0 +1,106 @@
+"""Initial tables
+
+Revision ID: 0001_initial_tables
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+Databases created before migrations were committed to the repository
+(autogenerated at deploy time, or through models.create_tables) already
+have these tables; they are left untouched, so such databases can simply
+be stamped with `alembic stamp 0001_initial_tables --purge`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_initial_tables'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+order_status = sa.Enum('Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled', 'Returned', 'Failed', name='orderstatus')
+payment_method = sa.Enum(
+    'CreditCard', 'DebitCard', 'BankTransfer', 'ACH', 'SEPA', 'Paypal', 'ApplePay', 'GooglePay', 'UPI',
+    'Alipay', 'WeChatPay', 'MobileMoney', 'CashOnDelivery', 'Crypto', 'GiftCard', 'BuyNowPayLater',
+    'StoreCredit', 'Other', name='paymentmethod',
+)
+payment_status = sa.Enum('Pending', 'Completed', 'Failed', 'Refunded', 'Cancelled', 'Authorized', 'Voided', name='paymentstatus')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'orders' not in existing:
+        op.create_table(
+            'orders',
+            sa.Column('id', sa.String(length=255), nullable=False),
+            sa.Column('user_id', sa.String(length=255), nullable=False),
+            sa.Column('status', order_status, nullable=False),
+            sa.Column('total_amount', sa.Float(), nullable=False),
+            sa.Column('currency', sa.String(length=10), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'order_items' not in existing:
+        op.create_table(
+            'order_items',
+            sa.Column('id', sa.String(length=255), nullable=False),
+            sa.Column('order_id', sa.String(length=255), nullable=False),
+            sa.Column('product_id', sa.String(length=255), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('price_per_unit', sa.Float(), nullable=False),
+            sa.Column('total_price', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'payments' not in existing:
+        op.create_table(
+            'payments',
+            sa.Column('id', sa.String(length=255), nullable=False),
+            sa.Column('order_id', sa.String(length=255), nullable=True),
+            sa.Column('user_id', sa.String(length=255), nullable=True),
+            sa.Column('method', payment_method, nullable=False),
+            sa.Column('status', payment_status, nullable=False),
+            sa.Column('amount', sa.DECIMAL(precision=18, scale=8), nullable=False),
+            sa.Column('currency', sa.String(length=10), nullable=False),
+            sa.Column('transaction_id', sa.String(length=255), nullable=True),
+            sa.Column('gateway_response', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('refunded_amount', sa.DECIMAL(precision=18, scale=8), nullable=True),
+            sa.Column('parent_payment_id', sa.String(length=255), nullable=True),
+            sa.ForeignKeyConstraint(['parent_payment_id'], ['payments.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'order_outbox' not in existing:
+        op.create_table(
+            'order_outbox',
+            sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+            sa.Column('aggregate_id', sa.String(length=255), nullable=False),
+            sa.Column('event_type', sa.String(length=50), nullable=False),
+            sa.Column('topic', sa.String(length=255), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('published_at', sa.DateTime(), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_order_outbox_published_at_id', 'order_outbox', ['published_at', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_outbox_published_at_id', table_name='order_outbox')
+    op.drop_table('order_outbox')
+    op.drop_table('payments')
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    bind = op.get_bind()
+    for enum in (payment_status, payment_method, order_status):
+        enum.drop(bind, checkfirst=True)
@@ -0,0 +1,55 @@
+"""Indexes for order, order item and payment listings
+
+Revision ID: 0002_order_payment_indexes
+Revises: 0001_initial_tables
+Create Date: 2026-10-18 09:30:00.000000
+
+On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY so the
+tables stay writable while they are created. The unique transaction_id
+index fails if duplicate gateway transaction ids already exist; resolve
+them before upgrading.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_order_payment_indexes'
+down_revision: Union[str, None] = '0001_initial_tables'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, unique)
+INDEXES = [
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'], False),
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at'], False),
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id'], False),
+    ('ix_order_items_order_id', 'order_items', ['order_id'], False),
+    ('ix_order_items_product_id', 'order_items', ['product_id'], False),
+    ('ix_payments_order_id', 'payments', ['order_id'], False),
+    ('ix_payments_user_id_created_at', 'payments', ['user_id', 'created_at'], False),
+    ('ix_payments_created_at_id', 'payments', ['created_at', 'id'], False),
+    ('uq_payments_transaction_id', 'payments', ['transaction_id'], True),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    # CONCURRENTLY can't run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(
+                name, table, columns, unique=unique,
+                postgresql_concurrently=is_postgres, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=is_postgres, if_exists=True)
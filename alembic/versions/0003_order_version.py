@@ -0,0 +1,31 @@
+"""Version column on orders for optimistic concurrency
+
+Revision ID: 0003_order_version
+Revises: 0002_order_payment_indexes
+Create Date: 2026-10-18 11:00:00.000000
+
+Existing orders start at version 1. Adding a NOT NULL column with a
+constant default does not rewrite the table on PostgreSQL 11+.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_order_version'
+down_revision: Union[str, None] = '0002_order_payment_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('version')
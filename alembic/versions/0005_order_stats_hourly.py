@@ -0,0 +1,57 @@
+"""Hourly order stats rollup
+
+Revision ID: 0005_order_stats_hourly
+Revises: 0004_idempotency_keys
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_order_stats_hourly'
+down_revision: Union[str, None] = '0004_idempotency_keys'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The type already exists (created with the orders table)
+order_status = postgresql.ENUM(
+    'Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled', 'Returned', 'Failed',
+    name='orderstatus', create_type=False,
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'order_stats_hourly',
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('status', order_status, nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('gmv', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket', 'currency', 'status'),
+    )
+    op.create_index('ix_order_stats_hourly_status_bucket', 'order_stats_hourly', ['status', 'bucket'])
+
+    # Backfill from the existing orders; from here on the order write paths keep it current
+    if op.get_bind().dialect.name == 'postgresql':
+        bucket = "date_trunc('hour', created_at)"
+    else:
+        bucket = "strftime('%Y-%m-%d %H:00:00.000000', created_at)"
+    op.execute(
+        f"INSERT INTO order_stats_hourly (bucket, currency, status, order_count, gmv) "
+        f"SELECT {bucket}, currency, status, count(*), coalesce(sum(total_amount), 0) "
+        f"FROM orders WHERE created_at IS NOT NULL "
+        f"GROUP BY {bucket}, currency, status"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_stats_hourly_status_bucket', table_name='order_stats_hourly')
+    op.drop_table('order_stats_hourly')
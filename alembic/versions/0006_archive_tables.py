@@ -0,0 +1,114 @@
+"""Archive tables for closed orders, their items and payments
+
+Revision ID: 0006_archive_tables
+Revises: 0005_order_stats_hourly
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_archive_tables'
+down_revision: Union[str, None] = '0005_order_stats_hourly'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The types already exist (created with the orders and payments tables)
+order_status = postgresql.ENUM(
+    'Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled', 'Returned', 'Failed',
+    name='orderstatus', create_type=False,
+)
+payment_method = postgresql.ENUM(
+    'CreditCard', 'DebitCard', 'BankTransfer', 'ACH', 'SEPA', 'Paypal', 'ApplePay', 'GooglePay', 'UPI',
+    'Alipay', 'WeChatPay', 'MobileMoney', 'CashOnDelivery', 'Crypto', 'GiftCard', 'BuyNowPayLater',
+    'StoreCredit', 'Other', name='paymentmethod', create_type=False,
+)
+payment_status = postgresql.ENUM(
+    'Pending', 'Completed', 'Failed', 'Refunded', 'Cancelled', 'Authorized', 'Voided',
+    name='paymentstatus', create_type=False,
+)
+
+ARCHIVE_TABLES = ('orders_archive', 'order_items_archive', 'payments_archive')
+
+# Monthly partitions are created by services.archive as orders are archived
+PARTITIONED = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'orders_archive',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('user_id', sa.String(length=255), nullable=False),
+        sa.Column('status', order_status, nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        **PARTITIONED,
+    )
+    op.create_index('ix_orders_archive_user_id_created_at', 'orders_archive', ['user_id', 'created_at'])
+    op.create_index('ix_orders_archive_status_created_at', 'orders_archive', ['status', 'created_at'])
+    op.create_index('ix_orders_archive_created_at_id', 'orders_archive', ['created_at', 'id'])
+
+    op.create_table(
+        'order_items_archive',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('order_id', sa.String(length=255), nullable=False),
+        sa.Column('product_id', sa.String(length=255), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price_per_unit', sa.Float(), nullable=False),
+        sa.Column('total_price', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        **PARTITIONED,
+    )
+    op.create_index('ix_order_items_archive_order_id', 'order_items_archive', ['order_id'])
+
+    op.create_table(
+        'payments_archive',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('order_id', sa.String(length=255), nullable=True),
+        sa.Column('user_id', sa.String(length=255), nullable=True),
+        sa.Column('method', payment_method, nullable=False),
+        sa.Column('status', payment_status, nullable=False),
+        sa.Column('amount', sa.DECIMAL(precision=18, scale=8), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('transaction_id', sa.String(length=255), nullable=True),
+        sa.Column('gateway_response', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('refunded_amount', sa.DECIMAL(precision=18, scale=8), nullable=True),
+        sa.Column('parent_payment_id', sa.String(length=255), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        **PARTITIONED,
+    )
+    op.create_index('ix_payments_archive_order_id', 'payments_archive', ['order_id'])
+    op.create_index('ix_payments_archive_user_id_created_at', 'payments_archive', ['user_id', 'created_at'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Catch-all for rows outside the monthly partitions, so an insert never fails for lack of one
+        for table in ARCHIVE_TABLES:
+            op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_payments_archive_user_id_created_at', table_name='payments_archive')
+    op.drop_index('ix_payments_archive_order_id', table_name='payments_archive')
+    op.drop_table('payments_archive')
+    op.drop_index('ix_order_items_archive_order_id', table_name='order_items_archive')
+    op.drop_table('order_items_archive')
+    op.drop_index('ix_orders_archive_created_at_id', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_status_created_at', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_user_id_created_at', table_name='orders_archive')
+    op.drop_table('orders_archive')
@@ -0,0 +1,31 @@
+"""Claim lease on idempotency keys
+
+Revision ID: 0007_idempotency_lease
+Revises: 0006_archive_tables
+Create Date: 2026-10-18 18:00:00.000000
+
+A nullable column without a default is a catalog-only change. Keys
+claimed before this migration have no lease and can be taken over.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_idempotency_lease'
+down_revision: Union[str, None] = '0006_archive_tables'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('idempotency_keys', sa.Column('locked_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('idempotency_keys') as batch_op:
+        batch_op.drop_column('locked_until')
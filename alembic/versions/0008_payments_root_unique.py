@@ -0,0 +1,46 @@
+"""One root payment per order
+
+Revision ID: 0008_payments_root_unique
+Revises: 0007_idempotency_lease
+Create Date: 2026-10-18 19:00:00.000000
+
+Partial unique index on payments(order_id) for payments without a parent,
+so redelivered order events can't open a second payment for the same
+order. On PostgreSQL it is built with CREATE INDEX CONCURRENTLY. The
+upgrade fails if an order already has more than one root payment; resolve
+those before upgrading.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_payments_root_unique'
+down_revision: Union[str, None] = '0007_idempotency_lease'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    # CONCURRENTLY can't run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_payments_order_id_root', 'payments', ['order_id'], unique=True,
+            postgresql_where=sa.text('parent_payment_id IS NULL'),
+            sqlite_where=sa.text('parent_payment_id IS NULL'),
+            postgresql_concurrently=is_postgres, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'uq_payments_order_id_root', table_name='payments',
+            postgresql_concurrently=is_postgres, if_exists=True,
+        )
@@ -0,0 +1,32 @@
+"""Claim lease on outbox events
+
+Revision ID: 0009_outbox_claims
+Revises: 0008_payments_root_unique
+Create Date: 2026-10-18 20:00:00.000000
+
+The relay claims a batch in a short transaction and publishes it with no
+transaction open. A nullable column without a default is a catalog-only
+change.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_outbox_claims'
+down_revision: Union[str, None] = '0008_payments_root_unique'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('order_outbox', sa.Column('claimed_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('order_outbox') as batch_op:
+        batch_op.drop_column('claimed_until')
@@ -0,0 +1,84 @@
+"""
+Compare POST /api/v1/orders/bulk with N single POST /api/v1/orders/ calls.
+
+Runs both service paths against a throwaway database and prints the wall
+time and the number of SQL statements for each.
+
+Usage:
+    python -m benchmarks.bench_bulk_orders [N]
+
+Set BENCH_DATABASE_URL to a postgresql+asyncpg URL to measure against
+PostgreSQL; the default is a temporary SQLite file.
+"""
+import os, sys, asyncio, tempfile, time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["POSTGRES_DB"] = os.getenv("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{DB_FILE}")
+
+from sqlalchemy import event
+from core.database import engine_db, AsyncSessionDB, Base
+from schemas.orders import OrderSchema
+from services.orders import OrderService
+import models  # noqa: F401 - registers every table on Base.metadata
+
+
+def sample_orders(n: int, items_per_order: int = 3):
+    return [
+        OrderSchema(
+            user_id=f"user-{i % 100}",
+            status="Pending",
+            total_amount=items_per_order * 9.99,
+            items=[
+                {"product_id": f"product-{j}", "quantity": 1, "price_per_unit": 9.99, "total_price": None}
+                for j in range(items_per_order)
+            ],
+        )
+        for i in range(n)
+    ]
+
+
+async def reset_schema():
+    async with engine_db.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def run_single(orders):
+    for order_in in orders:
+        async with AsyncSessionDB() as session:
+            await OrderService(session).create_order(order_in)
+
+
+async def run_bulk(orders):
+    async with AsyncSessionDB() as session:
+        await OrderService(session).create_orders_bulk(orders)
+
+
+async def measure(label, fn, orders):
+    await reset_schema()
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine_db.sync_engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    await fn(orders)
+    elapsed = time.perf_counter() - started
+    event.remove(engine_db.sync_engine, "before_cursor_execute", count)
+    print(f"{label:<12} {len(orders):>6} orders  {elapsed * 1000:>10.1f} ms  {statements:>7} statements")
+    return elapsed
+
+
+async def main(n: int):
+    engine_db.echo = False
+    orders = sample_orders(n)
+    single = await measure("single", run_single, orders)
+    bulk = await measure("bulk", run_bulk, orders)
+    print(f"speedup: {single / bulk:.1f}x")
+    await engine_db.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,85 @@
+"""
+Compare the current OrderService.create_order with the previous ORM path.
+
+The previous path added the order through the unit of work (flush, one
+INSERT per table), committed, re-selected the order with its items and
+refreshed it. The current one issues one INSERT per table and returns the
+order it built. Both run against a throwaway database; the script prints
+wall time and round trips (statements plus commits) per order.
+
+Usage:
+    python -m benchmarks.bench_create_order [N]
+
+Set BENCH_DATABASE_URL to a postgresql+asyncpg URL to measure against
+PostgreSQL; the default is a temporary SQLite file.
+"""
+import os, sys, asyncio, tempfile, time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["POSTGRES_DB"] = os.getenv("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{DB_FILE}")
+
+from sqlalchemy import event
+from core.database import engine_db, AsyncSessionDB
+from services.orders import OrderService, validate_order, build_order
+from services.outbox import add_order_event
+from benchmarks.bench_bulk_orders import sample_orders, reset_schema
+
+
+async def legacy_create_order(service: OrderService, order_in):
+    validate_order(order_in)
+    order = build_order(order_in)
+    order_id = order.id
+    service.db.add(order)
+    await service.db.flush()
+    add_order_event(service.db, order.to_dict(), "create")
+    await service.db.commit()
+    order = await service.get_order_by_id(order_id)
+    await service.db.refresh(order)
+    return order
+
+
+async def run_legacy(orders):
+    for order_in in orders:
+        async with AsyncSessionDB() as session:
+            await legacy_create_order(OrderService(session), order_in)
+
+
+async def run_current(orders):
+    for order_in in orders:
+        async with AsyncSessionDB() as session:
+            await OrderService(session).create_order(order_in)
+
+
+async def measure(label, fn, orders):
+    await reset_schema()
+    round_trips = 0
+
+    def count(*args):
+        nonlocal round_trips
+        round_trips += 1
+
+    event.listen(engine_db.sync_engine, "before_cursor_execute", count)
+    event.listen(engine_db.sync_engine, "commit", count)
+    started = time.perf_counter()
+    await fn(orders)
+    elapsed = time.perf_counter() - started
+    event.remove(engine_db.sync_engine, "before_cursor_execute", count)
+    event.remove(engine_db.sync_engine, "commit", count)
+    print(
+        f"{label:<8} {len(orders):>6} orders  {elapsed * 1000:>10.1f} ms  "
+        f"{elapsed * 1e6 / len(orders):>8.0f} us/order  {round_trips / len(orders):>5.1f} round trips/order"
+    )
+    return elapsed
+
+
+async def main(n: int):
+    engine_db.echo = False
+    orders = sample_orders(n)
+    legacy = await measure("legacy", run_legacy, orders)
+    current = await measure("current", run_current, orders)
+    print(f"speedup: {legacy / current:.1f}x")
+    await engine_db.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,74 @@
+"""
+Compare the image pipeline with the previous per-size Pillow path.
+
+A corpus of synthetic photos (JPEG, 3000x2000 by default) is written to a
+temporary directory. The previous path decodes the full image once per
+output size and encodes WebP with method=6 in the calling thread; the
+pipeline decodes each image once with draft/reduce and runs on a process
+pool. The script prints wall time per image for both and checks that the
+output sizes match.
+
+Usage:
+    python -m benchmarks.bench_images [N] [WORKERS]
+"""
+import os, sys, asyncio, io, tempfile, time
+
+from PIL import Image, ImageDraw, ImageFilter
+from core.utils.images import ImagePipeline, DEFAULT_VARIANTS, fit_size
+
+
+def make_corpus(n: int, size=(3000, 2000)):
+    directory = tempfile.mkdtemp()
+    paths = []
+    for i in range(n):
+        img = Image.linear_gradient("L").resize(size).convert("RGB")
+        draw = ImageDraw.Draw(img)
+        for j in range(40):
+            x, y = (i * 97 + j * 211) % size[0], (i * 53 + j * 157) % size[1]
+            draw.ellipse((x, y, x + 300, y + 200), fill=((j * 40) % 255, (i * 30) % 255, (j * 70) % 255))
+        img = Image.merge("RGB", [Image.effect_noise(size, 30 + i % 20).point(lambda v, b=b: (v + b) % 256) for b in (0, 60, 120)]) \
+            if i % 2 else img.filter(ImageFilter.GaussianBlur(2))
+        path = os.path.join(directory, f"photo-{i}.jpg")
+        img.save(path, format="JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def legacy_process(path):
+    results = {}
+    for variant in DEFAULT_VARIANTS:
+        img = Image.open(path)
+        img = img.convert("RGB").resize(fit_size(img.size, variant.size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="WebP", quality=variant.quality, method=6)
+        results[variant.name] = buffer.getvalue()
+    return results
+
+
+async def main(n: int, workers: int):
+    paths = make_corpus(n)
+    started = time.perf_counter()
+    legacy = [legacy_process(path) for path in paths]
+    legacy_time = time.perf_counter() - started
+
+    pipeline = ImagePipeline(max_workers=workers)
+    await pipeline.process(paths[0])  # start the worker processes
+    started = time.perf_counter()
+    current = await pipeline.process_many(paths)
+    current_time = time.perf_counter() - started
+    pipeline.close()
+
+    for old, new in zip(legacy, current):
+        for name in old:
+            assert Image.open(io.BytesIO(old[name])).size == Image.open(io.BytesIO(new[name])).size
+    legacy_bytes = sum(len(v) for r in legacy for v in r.values())
+    current_bytes = sum(len(v) for r in current for v in r.values())
+    print(f"legacy    {n:>4} images  {legacy_time * 1000 / n:>8.1f} ms/image  {legacy_bytes / 1024:>8.0f} KiB")
+    print(f"pipeline  {n:>4} images  {current_time * 1000 / n:>8.1f} ms/image  {current_bytes / 1024:>8.0f} KiB  ({workers} workers)")
+    print(f"speedup: {legacy_time / current_time:.1f}x")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    asyncio.run(main(n, workers))
@@ -0,0 +1,61 @@
+"""
+Compare the response serialization of a 1k-order page.
+
+baseline: Order.to_dict() for every row + Starlette's stdlib-json JSONResponse
+current:  core.utils.response.Response, which encodes the ORM objects with orjson
+
+Usage:
+    python -m benchmarks.bench_serialization [ORDERS] [ITEMS_PER_ORDER]
+"""
+import sys, time
+from datetime import datetime
+from fastapi.responses import JSONResponse
+from core.utils.response import Response
+from models.orders import Order, OrderItem, OrderStatus
+
+
+def sample_page(n: int, items_per_order: int):
+    now = datetime.utcnow()
+    return [
+        Order(
+            id=f"order-{i}", user_id=f"user-{i % 100}", status=OrderStatus.Pending,
+            total_amount=items_per_order * 9.99, currency="USD", created_at=now, updated_at=now,
+            items=[
+                OrderItem(id=f"item-{i}-{j}", order_id=f"order-{i}", product_id=f"product-{j}",
+                          quantity=1, price_per_unit=9.99, total_price=9.99)
+                for j in range(items_per_order)
+            ],
+        )
+        for i in range(n)
+    ]
+
+
+def baseline(orders):
+    return JSONResponse(content={
+        "data": [order.to_dict() for order in orders],
+        "message": "Request processed successfully",
+        "success": True,
+    })
+
+
+def current(orders):
+    return Response(data=orders)
+
+
+def bench(label, fn, orders, rounds=20):
+    fn(orders)  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = fn(orders).body
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"{label:<10} {elapsed * 1000:>8.2f} ms/page  {len(body) / 1024:>8.1f} KiB")
+    return elapsed
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    orders = sample_page(n, items)
+    slow = bench("baseline", baseline, orders)
+    fast = bench("current", current, orders)
+    print(f"speedup: {slow / fast:.1f}x")
@@ -1,16 +1,71 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import event, text
+from fastapi import Request
 from elasticsearch import AsyncElasticsearch, Elasticsearch
 from core.config import settings,logging
-import asyncio
+from core.utils import metrics
+from contextvars import ContextVar
+import asyncio, time
 Base = declarative_base()
 CHAR_LENGTH=255
 
 # Database engine
 SQL_DATABASE_URI = str(settings.SQL_DATABASE_URI) 
+SQL_REPLICA_URI = settings.POSTGRES_REPLICA_DB
 
-engine_db = create_async_engine(SQL_DATABASE_URI, echo=True, pool_pre_ping=True)
+
+class Ewma:
+    """Exponentially weighted moving average of a load signal."""
+
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.value = 0.0
+
+    def observe(self, sample: float) -> None:
+        self.value += self.alpha * (sample - self.value)
+
+
+# Recent connection checkout wait of this worker, read by the load shedding middleware
+pool_wait = Ewma()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(waited)
+            pool_wait.observe(waited)
+
+
+def _engine_options(uri: str, instrumented: bool = True) -> dict:
+    url = make_url(uri)
+    options = dict(
+        echo=settings.DB_ECHO,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        poolclass=InstrumentedQueuePool if instrumented else AsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "asyncpg":
+        # Server-side prepared statements kept per connection by asyncpg
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+engine_db = create_async_engine(SQL_DATABASE_URI, **_engine_options(SQL_DATABASE_URI))
 
 # Session factory for the first database (Async)
 AsyncSessionDB = sessionmaker(
@@ -19,11 +74,98 @@ AsyncSessionDB = sessionmaker(
     expire_on_commit=False
 )
 
+# Read replica, used by get_read_db only. Its pool is not instrumented: the pool gauges, the
+# checkout wait histogram and pool_wait (which drives load shedding) describe the primary only.
+engine_replica = (
+    create_async_engine(SQL_REPLICA_URI, **_engine_options(SQL_REPLICA_URI, instrumented=False))
+    if SQL_REPLICA_URI else None
+)
+AsyncSessionReplica = sessionmaker(
+    bind=engine_replica,
+    class_=AsyncSession,
+    expire_on_commit=False
+) if engine_replica is not None else None
+
+
+def _record_pool_usage(pool, returning: int = 0) -> None:
+    metrics.DB_POOL_SIZE.set(pool.size())
+    metrics.DB_POOL_CHECKED_OUT.set(max(pool.checkedout() - returning, 0))
+    metrics.DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+@event.listens_for(engine_db.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _record_pool_usage(engine_db.sync_engine.pool)
+
+
+@event.listens_for(engine_db.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    # Fired before the connection is back in the pool, so it still counts as checked out
+    _record_pool_usage(engine_db.sync_engine.pool, returning=1)
+
+
+# Per-request SQL logging, switched on by the DB_DEBUG_HEADER request header
+sql_debug: ContextVar[bool] = ContextVar("sql_debug", default=False)
+
+
+@event.listens_for(engine_db.sync_engine, "before_cursor_execute")
+def _log_debug_sql(conn, cursor, statement, parameters, context, executemany):
+    if sql_debug.get():
+        logging.info(f"[SQL] {statement} {parameters!r}")
+
+
+class QueryStats:
+    """Statements executed, and the time spent in them, by one request."""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Set by the metrics middleware for the duration of each request
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(engine_db.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(engine_db.sync_engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    metrics.DB_QUERY_SECONDS.observe(elapsed)
+    stats = query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+if engine_replica is not None:
+    for _name, _listener in (
+        ("before_cursor_execute", _log_debug_sql),
+        ("before_cursor_execute", _start_query_timer),
+        ("after_cursor_execute", _record_query_time),
+    ):
+        event.listen(engine_replica.sync_engine, _name, _listener)
+
+
+def sql_debug_requested(request: Request) -> bool:
+    return settings.DB_ALLOW_SQL_DEBUG and request.headers.get(settings.DB_DEBUG_HEADER, "").lower() in ("1", "true")
+
+
 # Dependency to get the async session for the first database
-async def get_db():
+async def get_db(request: Request):
+    if sql_debug_requested(request):
+        sql_debug.set(True)
     try:
         async with AsyncSessionDB() as session:
-            logging.info(f"Database connected")
             yield session
     except Exception as e:
         # Log the error or handle it accordingly
@@ -31,4 +173,90 @@ async def get_db():
         raise
 
 
-    
\ No newline at end of file
+class ReplicaLag:
+    """
+    Whether the read replica is close enough to the primary to serve reads.
+
+    The lag is measured at most once per `interval` seconds per worker (one
+    cheap query, other requests meanwhile use the previous result). An
+    unreachable replica counts as lagging, so reads go to the primary.
+    """
+
+    # Replay lag; 0 when the replica has replayed everything it received (an idle primary
+    # leaves pg_last_xact_replay_timestamp() behind without the replica being late)
+    LAG_QUERY = text(
+        "SELECT CASE"
+        " WHEN NOT pg_is_in_recovery() THEN 0"
+        " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+        " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+        " END"
+    )
+
+    def __init__(
+        self,
+        engine,
+        max_lag: float = settings.DB_REPLICA_MAX_LAG,
+        interval: float = settings.DB_REPLICA_LAG_CHECK_INTERVAL,
+    ):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag: float | None = None
+        self._checked_at = float("-inf")
+
+    async def acceptable(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at >= self.interval:
+            self._checked_at = now
+            self.lag = await self.measure()
+        return self.lag is not None and self.lag <= self.max_lag
+
+    async def measure(self) -> float | None:
+        """Current lag in seconds, or None when the replica can't be queried."""
+        try:
+            async with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = float(await conn.scalar(self.LAG_QUERY))
+                else:
+                    # No replication to measure (e.g. a local stand-in database)
+                    await conn.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            logging.warning(f"[Replica] Lag check failed, reading from the primary: {e}")
+            metrics.DB_REPLICA_LAG.set(-1)
+            return None
+        metrics.DB_REPLICA_LAG.set(lag)
+        return lag
+
+
+replica_lag = ReplicaLag(engine_replica) if engine_replica is not None else None
+
+
+async def get_read_sessionmaker(request: Request) -> sessionmaker:
+    """
+    Session factory for a read-only request: the replica, unless the client
+    wrote recently (read-your-writes) or the replica lags behind.
+    """
+    if AsyncSessionReplica is None:
+        return AsyncSessionDB
+    if request.cookies.get(settings.DB_PRIMARY_COOKIE):
+        metrics.DB_READ_SESSIONS.labels(database="primary", reason="recent_write").inc()
+        return AsyncSessionDB
+    if not await replica_lag.acceptable():
+        metrics.DB_READ_SESSIONS.labels(database="primary", reason="replica_lag").inc()
+        return AsyncSessionDB
+    metrics.DB_READ_SESSIONS.labels(database="replica", reason="replica").inc()
+    return AsyncSessionReplica
+
+
+# Dependency to get an async session for read-only routes (see get_read_sessionmaker)
+async def get_read_db(request: Request):
+    if sql_debug_requested(request):
+        sql_debug.set(True)
+    session_factory = await get_read_sessionmaker(request)
+    try:
+        async with session_factory() as session:
+            yield session
+    except Exception as e:
+        logging.critical(f"Database connection failed: {e}")
+        raise
@@ -0,0 +1,116 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for entry in accept_encoding.lower().split(","):
+        coding, _, params = entry.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class GzipStreamResponder(IdentityResponder):
+    """gzip through a zlib stream; streamed chunks are flushed as they are produced."""
+
+    content_encoding = "gzip"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, level: int):
+        super().__init__(app, minimum_size)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.compress(body) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self.compressor.compress(body) + self.compressor.flush()
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least `minimum_size` bytes with brotli or gzip.
+
+    Brotli is preferred when the client accepts it and the package is
+    installed. Responses that already carry a Content-Encoding, event streams
+    and small bodies are sent as is; streamed bodies (exports) are compressed
+    chunk by chunk. Levels default to values meant for dynamic content:
+    the highest ones cost several times the CPU for a few percent.
+
+    Every response varies on Accept-Encoding. When a coding is negotiated,
+    strong ETags are sent weak: the compressed bytes differ from the identity
+    body the route's ETag was computed for. This applies to 304s and small
+    uncompressed bodies of the same request too, so a client sees one ETag
+    per representation; If-None-Match compares weakly, so it still matches.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = settings.COMPRESSION_MIN_SIZE,
+        gzip_level: int = settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = settings.COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif "gzip" in accepted or "*" in accepted:
+            responder = GzipStreamResponder(self.app, self.minimum_size, self.gzip_level)
+        else:
+            await self.app(scope, receive, representation_headers(send, weak_etag=False))
+            return
+        await responder(scope, receive, representation_headers(send, weak_etag=True))
+
+
+def representation_headers(send: Send, weak_etag: bool) -> Send:
+    """Wrap `send` to add Vary: Accept-Encoding and, if asked, weaken a strong ETag."""
+    async def send_with_headers(message: Message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(scope=message)
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if weak_etag and etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+        await send(message)
+
+    return send_with_headers
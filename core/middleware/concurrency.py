@@ -0,0 +1,174 @@
+from collections import deque
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+from core.database import pool_wait
+from core.utils import metrics
+from core.utils.latency import excluded_wait
+from core.utils.response import Response
+import asyncio, time
+
+
+class LoadShedError(Exception):
+    """The request was not admitted; `reason` is queue_full or queue_timeout."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limit on concurrently executing requests that adapts to how the service copes (AIMD).
+
+    Every finished request grows the limit by 1/limit (about +1 per limit's
+    worth of requests) while latency stays under `target_latency` and the
+    recent DB connection wait under `pool_wait_threshold`. Otherwise the
+    limit is cut by 10%, at most once per `target_latency`, so one slow burst
+    doesn't collapse it. The limit stays within [min_limit, max_limit].
+
+    Requests over the limit wait in a FIFO queue of at most `queue_size`
+    entries for up to `queue_timeout` seconds, so short spikes are absorbed
+    and everything else fails fast instead of piling up on the DB pool.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = settings.LOAD_SHED_INITIAL_CONCURRENCY,
+        min_limit: int = settings.LOAD_SHED_MIN_CONCURRENCY,
+        max_limit: int = settings.LOAD_SHED_MAX_CONCURRENCY,
+        target_latency: float = settings.LOAD_SHED_TARGET_LATENCY_MS / 1000,
+        pool_wait_threshold: float = settings.LOAD_SHED_POOL_WAIT_MS / 1000,
+        queue_size: int = settings.LOAD_SHED_QUEUE_SIZE,
+        queue_timeout: float = settings.LOAD_SHED_QUEUE_TIMEOUT_MS / 1000,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.target_latency = target_latency
+        self.pool_wait_threshold = pool_wait_threshold
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._last_decrease = 0.0
+        metrics.CONCURRENCY_LIMIT.set(int(self.limit))
+
+    async def acquire(self) -> None:
+        """
+        Wait for an execution slot.
+
+        Raises:
+        - LoadShedError: The queue is full, or no slot freed up within queue_timeout.
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise LoadShedError("queue_full")
+
+        # release() hands the slot over by resolving the future (in_flight already counts it)
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+        try:
+            await asyncio.wait((slot,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if slot.done():
+                self._free_slot()
+            else:
+                self._abandon(slot)
+            raise
+        if not slot.done():
+            self._abandon(slot)
+            raise LoadShedError("queue_timeout")
+
+    def release(self, latency: float) -> None:
+        """Give back a slot; `latency` is how long the request took to start its response once admitted."""
+        self._adjust(latency)
+        self._free_slot()
+
+    def _free_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            slot = self._waiters.popleft()
+            self.in_flight += 1
+            slot.set_result(None)
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _abandon(self, slot: asyncio.Future) -> None:
+        slot.cancel()
+        self._waiters.remove(slot)
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _adjust(self, latency: float) -> None:
+        previous = int(self.limit)
+        if latency > self.target_latency or pool_wait.value > self.pool_wait_threshold:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target_latency:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * 0.9)
+        elif self.in_flight >= previous:
+            # Only grow while the limit is actually the constraint
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if int(self.limit) != previous:
+            metrics.CONCURRENCY_LIMIT.set(int(self.limit))
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Admit requests under `path_prefix` through an AdaptiveConcurrencyLimiter.
+
+    Requests that are not admitted get 503 with Retry-After right away, before
+    they take a DB connection; the time every request spent queued is
+    recorded in http_admission_queue_seconds.
+
+    The limiter is fed the time to the response start, not to the last body
+    chunk, so streamed responses such as exports don't count as slow
+    requests; time spent in core.utils.latency.not_latency() blocks is left out
+    as well.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: AdaptiveConcurrencyLimiter | None = None,
+        path_prefix: str = settings.LOAD_SHED_PATH_PREFIX,
+    ):
+        self.app = app
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        queued = time.perf_counter()
+        try:
+            await self.limiter.acquire()
+        except LoadShedError as e:
+            metrics.ADMISSION_QUEUE_SECONDS.observe(time.perf_counter() - queued)
+            metrics.LOAD_SHED.labels(reason=e.reason).inc()
+            response = Response(success=False, message="Service overloaded, retry shortly", code=503)
+            response.headers["Retry-After"] = "1"
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        metrics.ADMISSION_QUEUE_SECONDS.observe(started - queued)
+        first_byte = None
+        waited = [0.0]
+        token = excluded_wait.set(waited)
+
+        async def send_timed(message: Message):
+            nonlocal first_byte
+            if message["type"] == "http.response.start" and first_byte is None:
+                first_byte = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            excluded_wait.reset(token)
+            responded = first_byte if first_byte is not None else time.perf_counter()
+            self.limiter.release(max(0.0, responded - started - waited[0]))
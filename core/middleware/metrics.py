@@ -0,0 +1,61 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.database import QueryStats, query_stats
+from core.utils import metrics
+import time
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Return the path template of the matched route, e.g. /api/v1/orders/{order_id}.
+
+    Raw paths are never used as label values, so ids in URLs and 404 probes
+    can't blow up the number of series.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status, in-flight count and SQL time for every HTTP request.
+
+    Written as a plain ASGI middleware rather than BaseHTTPMiddleware so that
+    streaming responses are timed until their last chunk and the request keeps
+    running in the caller's task (the per-request QueryStats contextvar must be
+    visible to the SQLAlchemy cursor events).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = QueryStats()
+        token = query_stats.set(stats)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = metrics.HTTP_IN_FLIGHT.labels(method=method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            query_stats.reset(token)
+
+            route = route_template(scope)
+            metrics.HTTP_REQUESTS.labels(method=method, route=route, status=str(status_code)).inc()
+            metrics.HTTP_REQUEST_SECONDS.labels(method=method, route=route).observe(elapsed)
+            metrics.DB_QUERIES_PER_REQUEST.labels(route=route).observe(stats.count)
+            metrics.DB_SECONDS_PER_REQUEST.labels(route=route).observe(stats.seconds)
@@ -0,0 +1,107 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+from core.config import settings, logging
+from core.middleware.metrics import route_template
+from datetime import datetime, timezone
+import asyncio, os, random, re, time
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # optional, only needed when PROFILING_ENABLED is set
+    Profiler = None
+
+
+def profiling_available() -> bool:
+    return Profiler is not None
+
+
+class ProfilingMiddleware:
+    """
+    Sample the call stack of requests and keep the slow ones as speedscope profiles.
+
+    A request is profiled with probability `sample_rate` (every request by
+    default, so no slow one is missed), or when it carries the profiling
+    header and `allow_header` is set. Sampled requests are only written out
+    when they took longer than `threshold_ms`; header requests always are.
+    Files land in `directory` (open them at https://www.speedscope.app) and
+    only the newest `max_files` are kept.
+
+    Requests that are not sampled only pay for one random() call.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        directory: str = settings.PROFILING_DIR,
+        threshold_ms: float = settings.PROFILING_THRESHOLD_MS,
+        sample_rate: float = settings.PROFILING_SAMPLE_RATE,
+        interval: float = settings.PROFILING_INTERVAL,
+        header: str = settings.PROFILING_HEADER,
+        allow_header: bool = settings.PROFILING_ALLOW_HEADER,
+        max_files: int = settings.PROFILING_MAX_FILES,
+    ):
+        if Profiler is None:
+            raise RuntimeError("Request profiling requires pyinstrument to be installed.")
+        self.app = app
+        self.directory = directory
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.header = header.lower().encode()
+        self.allow_header = allow_header
+        self.max_files = max_files
+        os.makedirs(self.directory, exist_ok=True)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = self.allow_header and self._header_requested(scope)
+        if not forced and random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        # async_mode keeps other requests running on the event loop out of this profile
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - started
+            if forced or elapsed >= self.threshold:
+                try:
+                    await asyncio.to_thread(self._write_profile, profiler, scope, elapsed)
+                except Exception as e:
+                    logging.error(f"[Profiling] Failed to write profile: {e}")
+
+    def _header_requested(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self.header:
+                return value.lower() in (b"1", b"true")
+        return False
+
+    def _write_profile(self, profiler, scope: Scope, elapsed: float):
+        route = re.sub(r"[^A-Za-z0-9]+", "_", route_template(scope)).strip("_") or "root"
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(
+            self.directory,
+            f"{stamp}-{scope['method']}-{route}-{elapsed * 1000:.0f}ms.speedscope.json",
+        )
+        with open(path, "w") as f:
+            f.write(profiler.output(renderer=SpeedscopeRenderer()))
+        logging.info(f"[Profiling] {scope['method']} {scope['path']} took {elapsed * 1000:.0f}ms, profile: {path}")
+        self._prune()
+
+    def _prune(self):
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".speedscope.json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[:max(len(profiles) - self.max_files, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from redis.asyncio import Redis
+from starlette.types import ASGIApp, Receive, Scope, Send
+from core.config import settings, logging
+from core.utils import metrics
+from core.utils.response import Response
+import math, time
+
+
+class RateLimitRule(NamedTuple):
+    """`rate` requests per second per client, with bursts of up to `burst`, under a path prefix."""
+    prefix: str
+    rate: float
+    burst: int
+
+
+def parse_rules(rules: List[str]) -> List[RateLimitRule]:
+    """
+    Parse "prefix=rate/burst" entries, e.g. "/api/v1/orders=20/40".
+
+    Returns:
+    - list: The rules, longest prefix first so the most specific one matches.
+    """
+    parsed = []
+    for rule in rules:
+        if not rule:
+            continue
+        prefix, _, limits = rule.partition("=")
+        rate, _, burst = limits.partition("/")
+        parsed.append(RateLimitRule(prefix.strip(), float(rate), int(burst or math.ceil(float(rate)))))
+    return sorted(parsed, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+# (allowed, tokens left, seconds until the next token)
+Decision = Tuple[bool, float, float]
+
+
+class LocalTokenBuckets:
+    """Token buckets in this worker's memory; the least recently seen clients are dropped past `max_keys`."""
+
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_CLIENTS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: int) -> Decision:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(burst), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, bucket[0], 0.0
+        bucket[0] = tokens
+        return False, tokens, (1 - tokens) / rate
+
+
+# Refill and take a token atomically; Redis' own clock keeps workers on different hosts consistent
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisTokenBuckets:
+    """
+    Token buckets shared by every worker through Redis, one script call per request.
+
+    If Redis fails, requests are decided by `fallback` (this worker's own
+    buckets) for the next `retry_interval` seconds, so a Redis outage
+    degrades to per-worker limits rather than rejecting or admitting
+    everything, and doesn't cost a connection attempt per request.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        fallback: Optional[LocalTokenBuckets] = None,
+        prefix: str = "ratelimit",
+        retry_interval: float = 5.0,
+    ):
+        self.redis = redis
+        self.fallback = fallback or LocalTokenBuckets()
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._unavailable_until = 0.0
+
+    async def acquire(self, key: str, rate: float, burst: int) -> Decision:
+        if time.monotonic() < self._unavailable_until:
+            return await self.fallback.acquire(key, rate, burst)
+        try:
+            allowed, tokens = await self._script(keys=[f"{self.prefix}:{key}"], args=[rate, burst])
+        except Exception as e:
+            logging.warning(f"[RateLimit] Redis unavailable, using local buckets for {self.retry_interval}s: {e}")
+            self._unavailable_until = time.monotonic() + self.retry_interval
+            return await self.fallback.acquire(key, rate, burst)
+        tokens = float(tokens)
+        return bool(allowed), tokens, 0.0 if allowed else (1 - tokens) / rate
+
+
+class RateLimitMiddleware:
+    """
+    Per-client, per-route token bucket rate limiting.
+
+    Each request is matched against the rules by path prefix and takes one
+    token from the bucket of (rule, client). A client is identified by the
+    `client_header` value when it is sent, otherwise by its address (the first
+    X-Forwarded-For entry when `trust_forwarded` is set, which is only safe
+    behind a proxy that overwrites it). Requests without a token get 429 with
+    Retry-After before any work is done for them.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rules: List[str] = settings.RATE_LIMIT_RULES,
+        buckets=None,
+        client_header: Optional[str] = settings.RATE_LIMIT_CLIENT_HEADER,
+        trust_forwarded: bool = settings.RATE_LIMIT_TRUST_FORWARDED,
+    ):
+        self.app = app
+        self.rules = parse_rules(rules)
+        self.buckets = buckets or LocalTokenBuckets()
+        self.client_header = client_header.lower().encode() if client_header else None
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        rule = next((rule for rule in self.rules if path.startswith(rule.prefix)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, tokens, retry_after = await self.buckets.acquire(
+            f"{rule.prefix}:{self._client_id(scope)}", rule.rate, rule.burst
+        )
+        if not allowed:
+            metrics.RATE_LIMITED.labels(rule=rule.prefix).inc()
+            response = Response(success=False, message="Too many requests, slow down", code=429)
+            response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+            response.headers["X-RateLimit-Limit"] = str(rule.burst)
+            response.headers["X-RateLimit-Remaining"] = "0"
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    def _client_id(self, scope: Scope) -> str:
+        forwarded = None
+        for name, value in scope["headers"]:
+            if self.client_header is not None and name == self.client_header:
+                return "key:" + value.decode("latin-1")
+            if self.trust_forwarded and name == b"x-forwarded-for":
+                forwarded = value.decode("latin-1").split(",")[0].strip()
+        if forwarded:
+            return "ip:" + forwarded
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
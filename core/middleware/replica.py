@@ -0,0 +1,37 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin a client's reads to the primary for a few seconds after it writes.
+
+    Responses to write requests (any method but GET, HEAD and OPTIONS) set a
+    short-lived cookie; while the client sends it back, get_read_db gives it
+    a primary session, so it sees its own writes even if the replica hasn't
+    replayed them yet. Other clients keep reading from the replica.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        cookie_name: str = settings.DB_PRIMARY_COOKIE,
+        max_age: int = settings.DB_READ_YOUR_WRITES_SECONDS,
+    ):
+        self.app = app
+        self.cookie = f"{cookie_name}=1; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -0,0 +1,157 @@
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jwt import PyJWKClient
+from typing import Any, Dict, List, Optional
+from core.config import settings, logging
+from core.utils import metrics
+from core.utils.cache import TTLCache
+import asyncio, hashlib, time
+import jwt
+
+Claims = Dict[str, Any]
+
+ASYMMETRIC_PREFIXES = ("RS", "ES", "PS", "EdDSA")
+
+
+class TokenVerifier:
+    """
+    Verify bearer tokens once and serve their claims from memory afterwards.
+
+    Verified claims are kept in an LRU keyed by the sha256 of the token, for
+    at most `cache_ttl` seconds and never past the token's own `exp`, so a
+    cached token expires exactly when the signed one would. Only valid tokens
+    are cached; a forged or expired token is rejected on every request.
+
+    HS* tokens are checked against `secret_key`. Tokens signed with an
+    asymmetric algorithm are checked against the key set published at
+    `jwks_url`, which is fetched off the event loop and kept for
+    `jwks_cache_ttl` seconds (an unknown `kid` triggers a refetch, so key
+    rotation needs no restart). The algorithm in the token header must be
+    one of `algorithms`.
+
+    # Example usage:
+    verifier = TokenVerifier(secret_key="...", algorithms=["HS256"])
+    claims = await verifier.verify(token)     # raises jwt.PyJWTError subclasses
+    """
+
+    def __init__(
+        self,
+        secret_key: Optional[str] = settings.SECRET_KEY,
+        algorithms: List[str] = settings.JWT_ALGORITHMS,
+        jwks_url: Optional[str] = settings.JWT_JWKS_URL,
+        jwks_cache_ttl: int = settings.JWT_JWKS_CACHE_TTL,
+        audience: Optional[str] = settings.JWT_AUDIENCE,
+        issuer: Optional[str] = settings.JWT_ISSUER,
+        leeway: float = settings.JWT_LEEWAY,
+        cache_ttl: float = settings.JWT_CACHE_TTL,
+        max_entries: int = settings.JWT_CACHE_ENTRIES,
+    ):
+        self.secret_key = secret_key
+        self.algorithms = list(algorithms)
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.cache_ttl = cache_ttl
+        self.jwks = PyJWKClient(jwks_url, cache_keys=True, lifespan=jwks_cache_ttl) if jwks_url else None
+        self._claims = TTLCache(max_entries=max_entries, ttl=cache_ttl)
+
+    async def verify(self, token: str) -> Claims:
+        """
+        Claims of a valid token. The returned dict is shared with the cache and must not be modified.
+
+        Raises:
+        - jwt.ExpiredSignatureError: The token has expired.
+        - jwt.PyJWTError: The token is malformed, badly signed or fails a claim check.
+        """
+        cache_key = hashlib.sha256(token.encode()).digest()
+        claims = self._claims.get(cache_key)
+        if claims is not None:
+            metrics.JWT_VERIFICATIONS.labels(result="cached").inc()
+            return claims
+
+        started = time.perf_counter()
+        try:
+            claims = await self._decode(token)
+        except jwt.ExpiredSignatureError:
+            metrics.JWT_VERIFICATIONS.labels(result="expired").inc()
+            raise
+        except jwt.PyJWTError:
+            metrics.JWT_VERIFICATIONS.labels(result="invalid").inc()
+            raise
+        finally:
+            metrics.JWT_VERIFY_SECONDS.observe(time.perf_counter() - started)
+        metrics.JWT_VERIFICATIONS.labels(result="valid").inc()
+
+        ttl = self.cache_ttl
+        if "exp" in claims:
+            ttl = min(ttl, float(claims["exp"]) - time.time())
+        if ttl > 0:
+            self._claims.set(cache_key, claims, ttl=ttl)
+        return claims
+
+    async def _decode(self, token: str) -> Claims:
+        algorithm = jwt.get_unverified_header(token).get("alg")
+        if algorithm not in self.algorithms:
+            raise jwt.InvalidAlgorithmError(f"Algorithm {algorithm!r} is not allowed")
+
+        if algorithm.startswith(ASYMMETRIC_PREFIXES):
+            if self.jwks is None:
+                raise jwt.InvalidKeyError("No JWKS configured for asymmetric tokens")
+            # PyJWKClient fetches with blocking urllib when the key set is stale or the kid is new
+            key = (await asyncio.to_thread(self.jwks.get_signing_key_from_jwt, token)).key
+        elif self.secret_key:
+            key = self.secret_key
+        else:
+            raise jwt.InvalidKeyError("No secret configured for HMAC tokens")
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            issuer=self.issuer,
+            leeway=self.leeway,
+            options={"require": ["exp"]},
+        )
+
+    def forget(self, token: str) -> None:
+        """Drop a token from this worker's cache, e.g. on logout."""
+        self._claims.delete(hashlib.sha256(token.encode()).digest())
+
+
+# One verifier (and claims cache) per worker process
+token_verifier = TokenVerifier()
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def get_token_claims(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> Claims:
+    """
+    FastAPI dependency returning the verified claims of the request's bearer token.
+
+    # Example usage:
+    @router.get("/")
+    async def list_orders(claims: dict = Depends(get_token_claims)):
+        user_id = claims["sub"]
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return await token_verifier.verify(credentials.credentials)
+    except jwt.ExpiredSignatureError:
+        detail = "Token expired"
+    except jwt.exceptions.PyJWKClientError as e:
+        logging.error(f"[Auth] JWKS lookup failed: {e}")
+        detail = "Invalid token"
+    except jwt.PyJWTError as e:
+        logging.debug(f"[Auth] Rejected token: {e}")
+        detail = "Invalid token"
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": 'Bearer error="invalid_token"'},
+    )
@@ -0,0 +1,229 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from redis.asyncio import Redis
+from core.config import settings, logging
+from core.utils import metrics
+from core.utils.serialization import dumps
+import asyncio, time
+
+_MISSING = object()
+# Result handed to coalesced callers when the leading load was cancelled: they load again themselves
+_RELOAD = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ReadThroughCache:
+    """
+    Two-level read-through cache of JSON-encoded entities.
+
+    Lookups go to a short-lived in-process LRU first, then to the shared Redis
+    (when configured), then to the loader. Values are stored as the JSON bytes
+    produced by `core.utils.serialization.dumps`, so a hit can be embedded in a
+    response without decoding it. Concurrent misses for the same key share one
+    load. Writers must call `invalidate()` after committing; the invalidation
+    is broadcast over Redis pub/sub so every worker drops its local copy.
+    """
+
+    CHANNEL = "cache-invalidate"
+
+    def __init__(
+        self,
+        name: str,
+        redis: Optional[Redis] = None,
+        local_ttl: float = 5.0,
+        redis_ttl: int = 300,
+        max_entries: int = 10000,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.redis = redis
+        self.redis_ttl = redis_ttl
+        self.enabled = enabled
+        self.local = TTLCache(max_entries=max_entries, ttl=local_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation: Dict[str, int] = {}
+        # Bumped whenever _generation is cleared, so loads that started before still see a change
+        self._epoch = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Optional[bytes]:
+        """
+        Return the JSON bytes cached for `key`, loading and caching them on a miss.
+
+        `loader` returns the entity (any value `dumps` can encode) or None when it
+        doesn't exist; missing entities are not cached.
+        """
+        if not self.enabled:
+            entity = await loader()
+            return None if entity is None else dumps(entity)
+
+        full_key = self._key(key)
+        cached = self.local.get(full_key)
+        if cached is not None:
+            metrics.CACHE_REQUESTS.labels(cache=self.name, result="hit_local").inc()
+            return cached
+
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            value = await asyncio.shield(inflight)
+            if value is _RELOAD:
+                return await self.get_or_load(key, loader)
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._load(full_key, loader)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # Only the leading caller went away (e.g. its client disconnected); the ones
+            # waiting on this load are still there and must not fail with its cancellation
+            future.set_result(_RELOAD)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._inflight.pop(full_key, None)
+
+    async def _load(self, full_key: str, loader: Callable[[], Awaitable[Any]]) -> Optional[bytes]:
+        generation = self._generation_of(full_key)
+
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(full_key)
+            except Exception as e:
+                logging.warning(f"[Cache:{self.name}] Redis read failed: {e}")
+                value = None
+            if value is not None:
+                metrics.CACHE_REQUESTS.labels(cache=self.name, result="hit_redis").inc()
+                self._store_local(full_key, value, generation)
+                return value
+
+        metrics.CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+        entity = await loader()
+        if entity is None:
+            return None
+        value = dumps(entity)
+        # Skip caching if the key was invalidated while we were loading
+        if self._store_local(full_key, value, generation) and self.redis is not None:
+            try:
+                await self.redis.set(full_key, value, ex=self.redis_ttl)
+                if self._generation_of(full_key) != generation:
+                    # Invalidated while the fill was in flight: don't keep a stale entry for redis_ttl
+                    await self.redis.delete(full_key)
+            except Exception as e:
+                logging.warning(f"[Cache:{self.name}] Redis write failed: {e}")
+        return value
+
+    def _generation_of(self, full_key: str) -> tuple:
+        return self._epoch, self._generation.get(full_key, 0)
+
+    def _store_local(self, full_key: str, value: bytes, generation: tuple) -> bool:
+        if self._generation_of(full_key) != generation:
+            return False
+        self.local.set(full_key, value)
+        return True
+
+    def _evict_local(self, full_key: str) -> None:
+        self.local.delete(full_key)
+        self._generation[full_key] = self._generation.get(full_key, 0) + 1
+        if len(self._generation) > self.local.max_entries:
+            self._generation.clear()
+            self._epoch += 1
+
+    async def invalidate(self, *keys: str) -> None:
+        if not self.enabled or not keys:
+            return
+        full_keys = [self._key(key) for key in keys]
+        for full_key in full_keys:
+            self._evict_local(full_key)
+        metrics.CACHE_INVALIDATIONS.labels(cache=self.name).inc(len(full_keys))
+        if self.redis is not None:
+            try:
+                await self.redis.delete(*full_keys)
+                for full_key in full_keys:
+                    await self.redis.publish(self.CHANNEL, full_key)
+            except Exception as e:
+                logging.warning(f"[Cache:{self.name}] Redis invalidation failed: {e}")
+
+
+async def listen_for_invalidations(redis: Redis, caches: list[ReadThroughCache]) -> None:
+    """Drop local entries invalidated by other workers; runs until cancelled."""
+    by_name = {cache.name: cache for cache in caches}
+    while True:
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(ReadThroughCache.CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                full_key = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+                cache = by_name.get(full_key.split(":", 1)[0])
+                if cache:
+                    cache._evict_local(full_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Local entries are short-lived, so a gap only delays invalidation by the local TTL
+            logging.warning(f"[Cache] Invalidation listener failed, reconnecting: {e}")
+            await asyncio.sleep(1)
+
+
+# Shared Redis client (None when REDIS_URL is not set: local caching only)
+redis_client: Optional[Redis] = Redis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+
+order_cache = ReadThroughCache(
+    "order",
+    redis=redis_client,
+    local_ttl=settings.CACHE_LOCAL_TTL,
+    redis_ttl=settings.CACHE_REDIS_TTL,
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    enabled=settings.CACHE_ENABLED,
+)
+payment_cache = ReadThroughCache(
+    "payment",
+    redis=redis_client,
+    local_ttl=settings.CACHE_LOCAL_TTL,
+    redis_ttl=settings.CACHE_REDIS_TTL,
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    enabled=settings.CACHE_ENABLED,
+)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Any, Optional
+from starlette.responses import Response as StarletteResponse
+from core.utils.serialization import loads
+import hashlib
+
+
+def make_etag(resource_id: str, updated_at: Optional[datetime], *extra: Any) -> str:
+    """
+    Strong ETag of a resource version, from its id, updated_at and any other
+    field that changes with it (e.g. the order version).
+    """
+    stamp = updated_at.isoformat() if updated_at else ""
+    key = "|".join([resource_id, stamp, *map(str, extra)])
+    return '"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+
+
+def payload_etag(payload: bytes, *extra_fields: str) -> str:
+    """make_etag() of an encoded entity, as stored by the read-through caches."""
+    data = loads(payload)
+    updated_at = datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None
+    return make_etag(data["id"], updated_at, *(data[field] for field in extra_fields))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> StarletteResponse:
+    return StarletteResponse(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def with_etag(response: StarletteResponse, etag: str) -> StarletteResponse:
+    response.headers["ETag"] = etag
+    # Clients may keep the body but must revalidate it before every use
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
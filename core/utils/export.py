@@ -0,0 +1,43 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from core.utils.serialization import dumps
+import csv, io
+
+# Rows are buffered into chunks of roughly this size before being handed to the server
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+async def ndjson_stream(rows: AsyncIterator[Any], to_dict: Optional[Callable[[Any], Dict[str, Any]]] = None) -> AsyncIterator[bytes]:
+    """
+    Encode rows as newline-delimited JSON, one object per line.
+
+    Models with a registered encoder are written directly; pass `to_dict` for anything else.
+    """
+    buffer = bytearray()
+    async for row in rows:
+        buffer += dumps(to_dict(row) if to_dict else row)
+        buffer += b"\n"
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def csv_stream(rows: AsyncIterator[Any], columns: List[str], to_dict: Callable[[Any], Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Encode rows as CSV with a header line; keys missing from `columns` are dropped."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(to_dict(row))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
@@ -8,6 +8,14 @@ from google.auth.exceptions import DefaultCredentialsError,GoogleAuthError
 import google.auth
 from google_auth_oauthlib.flow import InstalledAppFlow
 import googleapiclient.errors
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from core.config import settings, logging
+from core.utils.images import encode_image
+import asyncio, threading
+
+# Resumable transfers must move multiples of 256 KiB per request
+CHUNK_ALIGNMENT = 256 * 1024
 
 class ImageFile:
     @staticmethod
@@ -23,43 +31,74 @@ class ImageFile:
 
         # Example usage:
         ImageFile.reduce_image_quality('input_image.jpg', 'output_image.jpg', quality=30)  # Adjust quality from 0 to 100
+
+        This runs in the calling thread; from async code, or for several sizes
+        or images, use core.utils.images.ImagePipeline instead.
         """
-        # Open the image
-        img = Image.open(input_image_path)
-        
-        # Check if the image format is JPEG or other supported formats for quality reduction
-        if target_format == 'jpeg':
-            img.convert("RGB").save(output_image_path, format='JPEG', quality=quality)
-        elif target_format == 'webp':
-            # WebP is the most efficient for web images
-            img.convert("RGB").save(output_image_path, format='WebP', quality=quality, method=6)
-        elif target_format == 'png':
-            # PNG doesn't support quality, but we can still optimize the file
-            img.save(output_image_path, format='PNG', optimize=True)
-        else:
-            raise ValueError("Unsupported format: Please choose 'jpeg', 'webp', or 'png'.")
+        # Decode, re-encode and write the image
+        with Image.open(input_image_path) as img:
+            data = encode_image(img, target_format, quality)
+        with open(output_image_path, 'wb') as f:
+            f.write(data)
         
         
         print(f"Image saved with reduced quality at: {output_image_path}")
 
 class GoogleDrive:
-    def __init__(self, jsonkey='path/to/your/json/key.json'):
-        if not jsonkey:
+    """
+    Google Drive client.
+
+    Credentials are loaded once. The Drive service is built once per thread:
+    googleapiclient's HTTP transport (httplib2) is not thread-safe, and
+    AsyncGoogleDrive runs calls on a thread pool. Uploads and downloads are
+    resumable and move `chunk_size` bytes per request, so large files never
+    sit in memory and a failed chunk is retried on its own.
+    """
+
+    def __init__(
+        self,
+        jsonkey='path/to/your/json/key.json',
+        chunk_size: int = settings.GOOGLE_DRIVE_CHUNK_SIZE,
+        num_retries: int = settings.GOOGLE_DRIVE_NUM_RETRIES,
+        http=None,
+    ):
+        if not jsonkey and http is None:
             raise ValueError("The JSON key file path must be provided.")
+        if chunk_size % CHUNK_ALIGNMENT:
+            raise ValueError(f"chunk_size must be a multiple of {CHUNK_ALIGNMENT} bytes.")
         self.key = jsonkey
+        self.chunk_size = chunk_size
+        self.num_retries = num_retries
         self.mimetype = 'application/octet-stream'  # Default MIME type for unknown files
+        self._http = http  # a prepared transport (e.g. googleapiclient.http.HttpMockSequence) instead of credentials
+        self._credentials = None
+        self._credentials_lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_credentials(self):
+        """Load the service account credentials once; they are shared by every thread."""
+        if self._credentials is None:
+            with self._credentials_lock:
+                if self._credentials is None:
+                    self._credentials = service_account.Credentials.from_service_account_file(
+                        self.key,
+                        scopes=['https://www.googleapis.com/auth/drive']
+                    )
+        return self._credentials
 
     def get_drive_service(self):
         """Return authenticated Google Drive service."""
+        service = getattr(self._local, "service", None)
+        if service is not None:
+            return service
         try:
-            # Try to load the credentials from the provided JSON key file
-            creds = service_account.Credentials.from_service_account_file(
-                self.key,
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
-            # Build the Drive API service
-            drive_service = build('drive', 'v3', credentials=creds)
-            return drive_service
+            if self._http is not None:
+                service = build('drive', 'v3', http=self._http, cache_discovery=False)
+            else:
+                # Build the Drive API service
+                service = build('drive', 'v3', credentials=self.get_credentials(), cache_discovery=False)
+            self._local.service = service
+            return service
         
         except FileNotFoundError:
             raise ValueError(f"The provided JSON key file '{self.key}' was not found.")
@@ -107,7 +146,7 @@ class GoogleDrive:
 
         try:
             # Create the folder on Google Drive
-            folder = drive_service.files().create(body=folder_metadata, fields='id').execute()
+            folder = drive_service.files().create(body=folder_metadata, fields='id').execute(num_retries=self.num_retries)
             return {'id': folder['id']}
         except Exception as e:
             raise Exception(f"An error occurred while creating the folder: {str(e)}")
@@ -119,14 +158,19 @@ class GoogleDrive:
         drive_service = self.get_drive_service()
 
         try:
-            # List all files in the folder
-            results = drive_service.files().list(
-                q=f"'{folder_id}' in parents",
-                fields="files(id, name, mimeType)"
-            ).execute()
-            files = results.get('files', [])
-
-            return files
+            # List all files in the folder, following the result pages
+            files, page_token = [], None
+            while True:
+                results = drive_service.files().list(
+                    q=f"'{folder_id}' in parents",
+                    fields="nextPageToken, files(id, name, mimeType)",
+                    pageSize=1000,
+                    pageToken=page_token,
+                ).execute(num_retries=self.num_retries)
+                files.extend(results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    return files
         except Exception as e:
             raise Exception(f"An error occurred while fetching the folder contents: {str(e)}")
 
@@ -142,11 +186,11 @@ class GoogleDrive:
             if files:
                 for file in files:
                     # Delete each file in the folder
-                    drive_service.files().delete(fileId=file['id']).execute()
+                    drive_service.files().delete(fileId=file['id']).execute(num_retries=self.num_retries)
 
             # Now, delete the folder itself
-            drive_service.files().delete(fileId=folder_id).execute()
-            print(f"Folder with ID {folder_id} has been successfully deleted.")
+            drive_service.files().delete(fileId=folder_id).execute(num_retries=self.num_retries)
+            logging.info(f"Folder with ID {folder_id} has been successfully deleted.")
         except Exception as e:
             raise Exception(f"An error occurred while deleting the folder: {str(e)}")
     
@@ -154,7 +198,7 @@ class GoogleDrive:
         """Uploads a file to Google Drive with proper MIME type handling."""
         if not filepath:
             raise ValueError("The file path must be provided.")
-        self.mimetype = self.get_mimetype(filepath)
+        mimetype = self.get_mimetype(filepath)
 
         drive_service = self.get_drive_service()
 
@@ -164,16 +208,18 @@ class GoogleDrive:
             'parents': [folder_id] if folder_id else []  # Use the provided folder ID (or leave it empty)
         }
 
-        media = MediaFileUpload(filepath, mimetype=self.mimetype)
+        # Resumable session: the file is read and sent chunk_size bytes at a time
+        media = MediaFileUpload(filepath, mimetype=mimetype, chunksize=self.chunk_size, resumable=True)
 
         try:
-            # Create the file on Google Drive
-            file = drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-            file_id = file['id']
-            file_info = drive_service.files().get(fileId=file_id, fields='webViewLink, webContentLink').execute()
+            # Create the file on Google Drive; the link comes back with the final chunk
+            request = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
+            file = None
+            while file is None:
+                _, file = request.next_chunk(num_retries=self.num_retries)
 
             # Return the file ID and the shareable link or viewable link
-            return {'id': file['id'], 'link': file_info.get('webViewLink', 'No link available')}
+            return {'id': file['id'], 'link': file.get('webViewLink', 'No link available')}
         except Exception as e:
             raise Exception(f"An error occurred while uploading the file: {str(e)}")
 
@@ -187,24 +233,20 @@ class GoogleDrive:
 
         try:
             # Request file metadata
-            file = drive_service.files().get(fileId=file_id).execute()
+            file = drive_service.files().get(fileId=file_id, fields='name').execute(num_retries=self.num_retries)
             file_name = file['name']
             file_path = os.path.join(destination_path, file_name)
 
             # Set up the download process
             request = drive_service.files().get_media(fileId=file_id)
-            fh = open(file_path, 'wb')
-
-            # Use MediaIoBaseDownload to download the file
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                print(f"Download {int(status.progress() * 100)}%.")
-            
-            # Close the file after download
-            fh.close()
-            print(f"File {file_name} downloaded successfully to {file_path}.")
+            with open(file_path, 'wb') as fh:
+                # Ranged requests of chunk_size bytes, written to disk as they arrive
+                downloader = MediaIoBaseDownload(fh, request, chunksize=self.chunk_size)
+                done = False
+                while done is False:
+                    status, done = downloader.next_chunk(num_retries=self.num_retries)
+
+            logging.info(f"File {file_name} downloaded successfully to {file_path}.")
             return file_path
         except Exception as e:
             raise Exception(f"An error occurred while downloading the file: {str(e)}")
@@ -217,7 +259,7 @@ class GoogleDrive:
 
         try:
             # Fetch the file metadata using fileId
-            file = drive_service.files().get(fileId=file_id).execute()
+            file = drive_service.files().get(fileId=file_id, fields='id').execute(num_retries=self.num_retries)
 
             # Return the Google Drive URL
             return f"https://drive.google.com/file/d/{file_id}/view"
@@ -232,11 +274,90 @@ class GoogleDrive:
 
         try:
             # Delete the file using its file ID
-            drive_service.files().delete(fileId=file_id).execute()
-            print(f"File with ID {file_id} has been successfully deleted.")
+            drive_service.files().delete(fileId=file_id).execute(num_retries=self.num_retries)
+            logging.info(f"File with ID {file_id} has been successfully deleted.")
         except Exception as e:
             raise Exception(f"An error occurred while deleting the file: {str(e)}")
 
+
+class AsyncGoogleDrive:
+    """
+    Non-blocking facade over GoogleDrive for use in async code.
+
+    Every call runs on a dedicated thread pool, so transfers never block the
+    event loop. Batch transfers run concurrently, at most `max_concurrency`
+    at a time.
+
+    # Example usage:
+    drive = AsyncGoogleDrive(GoogleDrive(jsonkey='key.json'))
+    results = await drive.upload_many(['a.pdf', 'b.pdf'], folder_id=folder_id)
+    """
+
+    def __init__(
+        self,
+        drive: GoogleDrive,
+        max_workers: int = settings.GOOGLE_DRIVE_MAX_WORKERS,
+        max_concurrency: int = settings.GOOGLE_DRIVE_MAX_CONCURRENCY,
+    ):
+        self.drive = drive
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gdrive")
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def create_folder(self, folder_name, parent_folder_id=None):
+        return await self._run(self.drive.create_folder, folder_name, parent_folder_id)
+
+    async def get_folder_contents(self, folder_id):
+        return await self._run(self.drive.get_folder_contents, folder_id)
+
+    async def delete_folder(self, folder_id):
+        return await self._run(self.drive.delete_folder, folder_id)
+
+    async def upload_file(self, filepath, folder_id=None):
+        return await self._run(self.drive.upload_file, filepath, folder_id)
+
+    async def download_file(self, file_id, destination_path):
+        return await self._run(self.drive.download_file, file_id, destination_path)
+
+    async def get_file_link(self, file_id):
+        return await self._run(self.drive.get_file_link, file_id)
+
+    async def delete_file(self, file_id):
+        return await self._run(self.drive.delete_file, file_id)
+
+    async def upload_many(self, filepaths, folder_id=None):
+        """
+        Upload several files concurrently.
+
+        Returns:
+        - list: For each path, in order, the upload result or the exception it raised.
+        """
+        return await self._gather(self.upload_file(path, folder_id) for path in filepaths)
+
+    async def download_many(self, file_ids, destination_path):
+        """
+        Download several files concurrently into `destination_path`.
+
+        Returns:
+        - list: For each file id, in order, the local path or the exception raised.
+        """
+        return await self._gather(self.download_file(file_id, destination_path) for file_id in file_ids)
+
+    async def _gather(self, transfers):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited(transfer):
+            async with semaphore:
+                return await transfer
+
+        return await asyncio.gather(*(limited(t) for t in transfers), return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 class YouTubeAPI:
     def __init__(self, credentials_json='path/to/your/credentials.json'):
         if not credentials_json:
@@ -0,0 +1,133 @@
+from PIL import Image, ImageOps
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from core.config import settings
+import asyncio, io, multiprocessing
+
+ImageSource = Union[bytes, str]  # encoded image bytes or a file path
+
+class ImageVariant(NamedTuple):
+    """One output of the pipeline: `size` is the bounding box (None keeps the original size)."""
+    name: str
+    size: Optional[Tuple[int, int]] = None
+    format: str = 'webp'
+    quality: int = 30
+
+
+# Sizes generated for order receipts and attachments
+DEFAULT_VARIANTS = (
+    ImageVariant('large', (1600, 1600), 'webp', 75),
+    ImageVariant('medium', (800, 800), 'webp', 70),
+    ImageVariant('thumbnail', (200, 200), 'webp', 60),
+)
+
+
+def fit_size(size: Tuple[int, int], box: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """Largest size with the aspect ratio of `size` that fits in `box` (never upscales)."""
+    if box is None:
+        return size
+    scale = min(box[0] / size[0], box[1] / size[1], 1.0)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def encode_image(img: Image.Image, format: str, quality: int, webp_method: int = settings.IMAGE_WEBP_METHOD) -> bytes:
+    buffer = io.BytesIO()
+    if format == 'jpeg':
+        img.convert("RGB").save(buffer, format='JPEG', quality=quality, optimize=True)
+    elif format == 'webp':
+        mode = "RGBA" if "A" in img.getbands() else "RGB"
+        img.convert(mode).save(buffer, format='WebP', quality=quality, method=webp_method)
+    elif format == 'png':
+        # PNG doesn't support quality, but we can still optimize the file
+        img.save(buffer, format='PNG', optimize=True)
+    else:
+        raise ValueError("Unsupported format: Please choose 'jpeg', 'webp', or 'png'.")
+    return buffer.getvalue()
+
+
+def process_image(
+    source: ImageSource,
+    variants: Iterable[ImageVariant] = DEFAULT_VARIANTS,
+    webp_method: int = settings.IMAGE_WEBP_METHOD,
+) -> Dict[str, bytes]:
+    """
+    Decode an image once and encode every variant from it.
+
+    JPEGs are decoded with `Image.draft`, which lets libjpeg scale by 1/2, 1/4
+    or 1/8 while decoding, down to the largest size any variant needs. Each
+    variant is resized from the smallest image produced so far that is still
+    big enough, with `reducing_gap` so Pillow shrinks by whole factors
+    (`Image.reduce`) before the final resampling.
+
+    Returns:
+    - dict: Encoded bytes by variant name.
+    """
+    variants = list(variants)
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        boxes = [v.size for v in variants]
+        if all(box is not None for box in boxes):
+            # Every variant is bounded, so the decoder never needs more than the largest one
+            # (square, so an EXIF rotation applied afterwards can't leave it too small)
+            needed = max(max(fit_size(img.size, box)) for box in boxes)
+            img.draft("RGB", (needed, needed))
+        img.load()
+        img = ImageOps.exif_transpose(img)
+
+        results: Dict[str, bytes] = {}
+        current = img
+        for variant in sorted(variants, key=lambda v: fit_size(img.size, v.size), reverse=True):
+            target = fit_size(img.size, variant.size)
+            if target != current.size:
+                current = current.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+            results[variant.name] = encode_image(current, variant.format, variant.quality, webp_method)
+        return results
+
+
+class ImagePipeline:
+    """
+    Batch image processing on a process pool, awaitable from the event loop.
+
+    Decoding and encoding are CPU bound and hold the GIL, so they run in
+    separate processes (started with "spawn", which is safe in a process that
+    already runs threads and an event loop). Paths are handed to the workers
+    as-is and read there, only the encoded variants travel back.
+
+    # Example usage:
+    pipeline = ImagePipeline()
+    variants = await pipeline.process(upload_bytes)         # {'large': b'...', 'medium': ..., ...}
+    results = await pipeline.process_many(['a.jpg', 'b.jpg'])
+    """
+
+    def __init__(self, max_workers: int = settings.IMAGE_MAX_WORKERS, webp_method: int = settings.IMAGE_WEBP_METHOD):
+        self.max_workers = max_workers
+        self.webp_method = webp_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def process(self, source: ImageSource, variants: Iterable[ImageVariant] = DEFAULT_VARIANTS) -> Dict[str, bytes]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, process_image, source, tuple(variants), self.webp_method)
+
+    async def process_many(
+        self, sources: Iterable[ImageSource], variants: Iterable[ImageVariant] = DEFAULT_VARIANTS
+    ) -> List[Union[Dict[str, bytes], Exception]]:
+        """
+        Process several images in parallel.
+
+        Returns:
+        - list: For each source, in order, its variants or the exception it raised.
+        """
+        variants = tuple(variants)
+        return await asyncio.gather(*(self.process(source, variants) for source in sources), return_exceptions=True)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,9 +1,12 @@
 from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
-from sqlalchemy.ext.asyncio import AsyncSession
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
 import asyncio
 import json
 import socket
-from core.config import logging
+import time
+from core.config import settings, logging
+from core.utils import metrics
 
 # Kafka Availability Check
 def is_kafka_available(host: str, port: int, timeout: float = 2.0) -> bool:
@@ -17,11 +20,40 @@ def is_kafka_available(host: str, port: int, timeout: float = 2.0) -> bool:
 
 # Kafka Consumer
 class KafkaConsumer:
-    def __init__(self, broker: str, topic: str, group_id: str, db: AsyncSession):
+    """
+    Consumes the order topic and hands every decoded payload to `handler`.
+
+    `consume()` processes one message at a time and relies on auto commit.
+    `consume_batches()` is the pipeline mode: it pulls batches with `getmany()`,
+    processes different keys concurrently (messages sharing a key stay in
+    order), dead-letters poison messages and commits offsets only once every
+    message of the batch has been handled.
+    """
+    def __init__(
+        self,
+        broker: str,
+        topic: str,
+        group_id: str,
+        handler: Callable[[dict], Awaitable[Any]] | None = None,
+        producer: "KafkaProducer | None" = None,
+        dlq_topic: str | None = None,
+        batch_size: int = 500,
+        max_concurrency: int = 16,
+        max_retries: int = 3,
+        poll_timeout_ms: int = 1000,
+        enable_auto_commit: bool = True,
+    ):
         self.broker = broker
         self.topic = topic
         self.group_id = group_id
-        self.db = db
+        self.handler = handler
+        self.producer = producer
+        self.dlq_topic = dlq_topic
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.poll_timeout_ms = poll_timeout_ms
+        self.enable_auto_commit = enable_auto_commit
         self.consumer: AIOKafkaConsumer | None = None
 
     async def start(self):
@@ -30,7 +62,8 @@ class KafkaConsumer:
             bootstrap_servers=self.broker,
             group_id=self.group_id,
             auto_offset_reset="earliest",
-            enable_auto_commit=True,
+            enable_auto_commit=self.enable_auto_commit,
+            max_poll_records=self.batch_size,
         )
         await self.consumer.start()
         logging.info("[Kafka Consumer] Started.")
@@ -47,68 +80,253 @@ class KafkaConsumer:
 
             async for message in self.consumer:
                 try:
-                    payload = json.loads(message.value.decode())
+                    payload = self._decode(message)
                     logging.info(f"[Kafka Consumer] Received message: {payload}")
-
-                    if payload.get("action") == "create":
-                        order_data = payload.get("order")
-                        if order_data:
-                            # service = PaymentService(self.db)
-                            # payment_id = str(generator.get_id())
-                            # payment = await service.create_payment(
-                            #     id = payment_id
-                            #     order_id=order_data['id'],
-                            #     amount=order_data['total_amount'],
-                            #     currency=order_data['currency'],
-                            #     method=method,
-                            #     user_id=order_data['user_id'],
-                            #     transaction_id=transaction_id,
-                            #     gateway_response=gateway_response,
-                            #     parent_payment_id=parent_payment_id,
-                            # )
-                            # if payment.to_dict():
-                            #     logging.info(f"Payment-{payment_id} made on: {order_data['id']}")
-                            
-                            pass
+                    if self.handler:
+                        await self.handler(payload)
                 except Exception as inner_ex:
                     logging.error(f"[Kafka Consumer] Error processing message: {inner_ex}")
         except Exception as e:
             logging.critical(f"[Kafka Consumer] Fatal error: {e}")
 
+    async def consume_batches(self):
+        """
+        Batched pipeline with manual offset commits.
+
+        The handler is expected to make its side effects durable (e.g. commit
+        its DB transaction) before returning. If a batch cannot be fully
+        handled, the partitions are rewound to the start of the batch and it is
+        redelivered, so nothing is committed past an unprocessed message.
+        """
+        if not self.consumer:
+            raise RuntimeError("Consumer has not been started.")
+        if self.enable_auto_commit:
+            raise RuntimeError("consume_batches() requires enable_auto_commit=False.")
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        backoff = 1.0
+        while True:
+            batches = await self.consumer.getmany(timeout_ms=self.poll_timeout_ms, max_records=self.batch_size)
+            if not batches:
+                await self._record_lag()
+                continue
+
+            started = time.perf_counter()
+            try:
+                # Partition order is preserved inside each key group
+                by_key: dict[Any, list] = defaultdict(list)
+                for tp, messages in batches.items():
+                    for message in messages:
+                        by_key[(tp, message.key)].append(message)
+
+                # A failing group cancels its siblings, so nothing is still in
+                # flight when the batch is rewound and fetched again
+                async with asyncio.TaskGroup() as group:
+                    for messages in by_key.values():
+                        group.create_task(self._process_in_order(messages, semaphore))
+                await self.consumer.commit({tp: messages[-1].offset + 1 for tp, messages in batches.items()})
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, ExceptionGroup):
+                    e = e.exceptions[0]
+                logging.error(f"[Kafka Consumer] Batch failed, redelivering in {backoff:.0f}s: {e}")
+                for tp, messages in batches.items():
+                    self.consumer.seek(tp, messages[0].offset)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            metrics.KAFKA_CONSUMER_BATCH_SECONDS.observe(time.perf_counter() - started)
+            await self._record_lag()
+
+    async def _process_in_order(self, messages: list, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            for message in messages:
+                await self._process_message(message)
+
+    async def _process_message(self, message):
+        try:
+            payload = self._decode(message)
+        except Exception as e:
+            await self._dead_letter(message, f"Undecodable message: {e}")
+            return
+
+        for attempt in range(1, self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                if self.handler:
+                    await self.handler(payload)
+                metrics.KAFKA_CONSUMER_MESSAGES.labels(outcome="processed").inc()
+                metrics.KAFKA_CONSUMER_PROCESS_SECONDS.observe(time.perf_counter() - started)
+                if message.timestamp and message.timestamp > 0:
+                    # Record timestamps are producer wall-clock milliseconds
+                    metrics.KAFKA_CONSUMER_END_TO_END_SECONDS.observe(max(time.time() - message.timestamp / 1000, 0))
+                return
+            except Exception as e:
+                error = e
+                metrics.KAFKA_CONSUMER_MESSAGES.labels(outcome="retried").inc()
+                logging.warning(
+                    f"[Kafka Consumer] Attempt {attempt}/{self.max_retries} failed for "
+                    f"{message.topic}[{message.partition}]@{message.offset}: {e}"
+                )
+                await asyncio.sleep(0.1 * 2 ** (attempt - 1))
+        await self._dead_letter(message, str(error))
+
+    async def _dead_letter(self, message, reason: str):
+        if not (self.producer and self.dlq_topic):
+            # Without a dead-letter topic we can't drop the message safely
+            raise RuntimeError(f"No dead-letter topic configured for poison message: {reason}")
+        await self.producer.send(
+            {
+                "topic": message.topic,
+                "partition": message.partition,
+                "offset": message.offset,
+                "key": message.key.decode(errors="replace") if message.key else None,
+                "value": message.value.decode(errors="replace") if message.value else None,
+                "error": reason,
+            },
+            key=message.key.decode(errors="replace") if message.key else None,
+            topic=self.dlq_topic,
+            wait=True,
+        )
+        metrics.KAFKA_CONSUMER_MESSAGES.labels(outcome="dead_lettered").inc()
+        logging.error(f"[Kafka Consumer] Dead-lettered {message.topic}[{message.partition}]@{message.offset}: {reason}")
+
+    async def _record_lag(self):
+        for tp in self.consumer.assignment():
+            highwater = self.consumer.highwater(tp)
+            if highwater is None:
+                continue
+            position = await self.consumer.position(tp)
+            metrics.KAFKA_CONSUMER_LAG.labels(topic=tp.topic, partition=str(tp.partition)).set(max(highwater - position, 0))
+
+    @staticmethod
+    def _decode(message) -> dict:
+        return json.loads(message.value.decode())
+
 
 # Kafka Producer
 class KafkaProducer:
-    def __init__(self, broker: str, topic: str):
+    """
+    Long-lived producer shared by every request of a worker.
+
+    Start it once from the application startup hook and stop it from the
+    shutdown hook; `stop()` flushes whatever is still batched or in flight.
+    """
+    def __init__(
+        self,
+        broker,
+        topic: str,
+        linger_ms: int = 5,
+        max_batch_size: int = 16384,
+        compression_type: str | None = None,
+        acks: int | str = 1,
+        request_timeout_ms: int = 40000,
+    ):
         self.broker = broker
         self.topic = topic
+        self.linger_ms = linger_ms
+        self.max_batch_size = max_batch_size
+        self.compression_type = compression_type
+        self.acks = acks
+        self.request_timeout_ms = request_timeout_ms
         self.producer: AIOKafkaProducer | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_started(self) -> bool:
+        return self.producer is not None
 
     async def start(self):
-        self.producer = AIOKafkaProducer(bootstrap_servers=self.broker)
-        await self.producer.start()
-        logging.info("[Kafka Producer] Started.")
+        async with self._lock:
+            if self.producer:
+                return
+            producer = AIOKafkaProducer(
+                bootstrap_servers=self.broker,
+                linger_ms=self.linger_ms,
+                max_batch_size=self.max_batch_size,
+                compression_type=self.compression_type,
+                acks=int(self.acks) if str(self.acks).lstrip("-").isdigit() else self.acks,
+                request_timeout_ms=self.request_timeout_ms,
+            )
+            await producer.start()
+            self.producer = producer
+            logging.info("[Kafka Producer] Started.")
 
-    async def stop(self):
+    async def flush(self):
         if self.producer:
-            await self.producer.stop()
+            await self.producer.flush()
+
+    async def stop(self):
+        async with self._lock:
+            if not self.producer:
+                return
+            producer, self.producer = self.producer, None
+            try:
+                await producer.flush()
+            except Exception as e:
+                logging.error(f"[Kafka Producer] Failed to flush pending messages: {e}")
+            await producer.stop()
             logging.info("[Kafka Producer] Stopped.")
 
-    async def send(self, message: dict):
+    async def send(self, message: dict | bytes, key: str | None = None, wait: bool = True, topic: str | None = None):
+        """
+        Send a message to the producer topic (or to `topic` when given).
+
+        With `wait=True` this returns once the broker acknowledged the record.
+        With `wait=False` the record is only appended to the current batch and
+        the delivery future is returned, so callers don't pay for the round trip.
+        """
         if not self.producer:
             raise RuntimeError("Producer is not started.")
+        value = message if isinstance(message, bytes) else json.dumps(message).encode()
+        key_bytes = key.encode() if key is not None else None
+        topic = topic or self.topic
+        started = time.perf_counter()
         try:
-            await self.producer.send_and_wait(self.topic, json.dumps(message).encode())
-            logging.info(f"[Kafka Producer] Message sent.-> {message}")
+            if wait:
+                await self.producer.send_and_wait(topic, value, key=key_bytes)
+                metrics.KAFKA_PRODUCER_SEND_SECONDS.labels(topic=topic).observe(time.perf_counter() - started)
+                logging.info(f"[Kafka Producer] Message sent.-> {message}")
+                return None
+            future = await self.producer.send(topic, value, key=key_bytes)
+            future.add_done_callback(lambda f: self._log_delivery(f, topic, started))
+            return future
         except Exception as e:
+            metrics.KAFKA_PRODUCER_ERRORS.labels(topic=topic).inc()
             logging.error(f"[Kafka Producer] Failed to send message: {e}")
             raise
 
+    @staticmethod
+    def _log_delivery(future: asyncio.Future, topic: str, started: float):
+        if future.cancelled():
+            metrics.KAFKA_PRODUCER_ERRORS.labels(topic=topic).inc()
+            logging.error("[Kafka Producer] Message delivery cancelled.")
+        elif future.exception():
+            metrics.KAFKA_PRODUCER_ERRORS.labels(topic=topic).inc()
+            logging.error(f"[Kafka Producer] Failed to deliver message: {future.exception()}")
+        else:
+            metrics.KAFKA_PRODUCER_SEND_SECONDS.labels(topic=topic).observe(time.perf_counter() - started)
+
 
 # Helper function to send Kafka messages
-async def send_kafka_message(kafka_producer: KafkaProducer, message: dict):
+async def send_kafka_message(kafka_producer: KafkaProducer, message: dict, key: str | None = None, wait: bool = True):
     try:
-        await kafka_producer.send(message)
+        await kafka_producer.send(message, key=key, wait=wait)
         logging.info("[Kafka Helper] Message sent successfully.")
     except Exception as e:
         logging.error(f"[Kafka Helper] Error sending message: {e}")
 
+
+
+# One producer per worker process, started and stopped by the app lifecycle hooks in main.py
+kafka_producer = KafkaProducer(
+    broker=settings.KAFKA_BOOTSTRAP_SERVERS,
+    topic=str(settings.KAFKA_TOPIC),
+    linger_ms=settings.KAFKA_LINGER_MS,
+    max_batch_size=settings.KAFKA_MAX_BATCH_SIZE,
+    compression_type=settings.KAFKA_COMPRESSION_TYPE,
+    acks=settings.KAFKA_ACKS,
+)
@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+# Seconds the current request spent waiting on other requests, set by whoever measures its
+# latency (core.middleware.concurrency); None when nothing does
+excluded_wait: ContextVar[list | None] = ContextVar("excluded_wait", default=None)
+
+
+@contextmanager
+def not_latency():
+    """
+    Don't count the time spent inside as latency of the current request.
+
+    For waits on another request rather than on this service's capacity
+    (e.g. a duplicate Idempotency-Key waiting for the first request's
+    response), which would otherwise make the load shedder shrink its limit.
+    """
+    waited = excluded_wait.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if waited is not None:
+            waited[0] += time.perf_counter() - started
@@ -1,39 +1,264 @@
-import smtplib, os
-from aiosmtplib import SMTP
+import os
+from aiosmtplib import SMTP, SMTPException, SMTPServerDisconnected
 from email.message import EmailMessage
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-import asyncio
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from core.config import settings, logging
+from core.utils import metrics
+import asyncio, time
 
-# Set up Jinja2 environment pointing to your templates folder
+# Set up Jinja2 environment pointing to your templates folder.
+# Templates ship with the code, so they are compiled once and never re-checked on disk.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 env = Environment(
     loader=FileSystemLoader(TEMPLATES_DIR),
-    autoescape=select_autoescape(['html', 'xml'])
+    autoescape=select_autoescape(['html', 'xml']),
+    auto_reload=False,
 )
+_templates: Dict[str, Template] = {}
+
+
+def render_template(name: str, **context: Any) -> str:
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = env.get_template(name)
+    return template.render(**context)
+
 
 def render_activation_email(activation_link: str) -> str:
-    template = env.get_template("activation_email.html")
-    return template.render(activation_link=activation_link)
+    return render_template("activation_email.html", activation_link=activation_link)
 
 
-async def send_activation_email(to_email: str, activation_link: str, from_email: str, from_password: str):
-    html_content = render_activation_email(activation_link)
-    # print(html_content,'-')
+def build_message(to_email: str, subject: str, text: str, html: Optional[str] = None, from_email: Optional[str] = None) -> EmailMessage:
     msg = EmailMessage()
-    msg["Subject"] = "Activate your account"
-    msg["From"] = from_email
+    msg["Subject"] = subject
+    msg["From"] = from_email or settings.MAIL_FROM
     msg["To"] = to_email
-    msg.set_content("Please activate your account by visiting the link.")
-    msg.add_alternative(html_content, subtype='html')
-    
-    smtp = SMTP(hostname="smtp.gmail.com", port=587, start_tls=True)
-    await smtp.connect()
-    await smtp.login(from_email, from_password)
-    
-    # Send the email: convert message to string
-    await smtp.sendmail(from_email, to_email, msg.as_string())
-    await smtp.quit() 
-    
-def send_email(to_email:str, activation_link:str, from_email:str, from_password:str):
-    asyncio.run(send_activation_email(to_email=to_email, activation_link=activation_link, from_email=from_email, from_password=from_password))
+    msg.set_content(text)
+    if html is not None:
+        msg.add_alternative(html, subtype='html')
+    return msg
+
+
+class SMTPConnectionPool:
+    """
+    A fixed number of authenticated SMTP connections, reused across messages.
+
+    Connections are opened (connect, STARTTLS, login) on first use and kept
+    open. A connection the server dropped is reopened when it is next
+    acquired, or when a send fails because of the disconnect.
+    """
+
+    def __init__(
+        self,
+        hostname: str = settings.SMTP_HOST,
+        port: int = settings.SMTP_PORT,
+        username: Optional[str] = settings.SMTP_USERNAME,
+        password: Optional[str] = settings.SMTP_PASSWORD,
+        start_tls: bool = settings.SMTP_START_TLS,
+        timeout: float = settings.SMTP_TIMEOUT,
+        size: int = settings.SMTP_POOL_SIZE,
+    ):
+        self.options = dict(
+            hostname=hostname, port=port, username=username, password=password,
+            start_tls=start_tls, timeout=timeout,
+        )
+        self.size = size
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(SMTP(**self.options))
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[SMTP]:
+        smtp = await self._idle.get()
+        try:
+            if not smtp.is_connected:
+                await smtp.connect()
+            yield smtp
+        finally:
+            self._idle.put_nowait(smtp)
+
+    async def send(self, smtp: SMTP, message: EmailMessage) -> None:
+        """Send over `smtp`, reconnecting once if the server closed the connection."""
+        try:
+            await smtp.send_message(message)
+        except SMTPServerDisconnected:
+            smtp.close()
+            await smtp.connect()
+            await smtp.send_message(message)
+
+    async def close(self) -> None:
+        for _ in range(self.size):
+            smtp = await self._idle.get()
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except SMTPException:
+                    smtp.close()
+
+
+class MailService:
+    """
+    Background sender for outgoing email.
+
+    `enqueue()` returns immediately, which makes it safe to call from request
+    handlers; one worker per pooled connection drains the bounded queue and
+    sends up to `batch_size` messages per connection checkout. When the queue
+    is full new messages are dropped (and counted) instead of blocking callers.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[SMTPConnectionPool] = None,
+        queue_size: int = settings.MAIL_QUEUE_SIZE,
+        batch_size: int = settings.MAIL_BATCH_SIZE,
+    ):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def is_started(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self.is_started:
+            return
+        if self.pool is None:
+            self.pool = SMTPConnectionPool()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.pool.size)]
+        logging.info("[Mail] Service started.")
+
+    async def stop(self, timeout: float = 10.0):
+        """Send what is still queued (for at most `timeout` seconds), then close the connections."""
+        if not self.is_started:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"[Mail] Stopping with {self.queue.qsize()} unsent messages.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.pool.close()
+        logging.info("[Mail] Service stopped.")
+
+    def enqueue(self, message: EmailMessage) -> bool:
+        """Queue a message for background delivery; False if the queue is full or the service isn't running."""
+        if not self.is_started:
+            # Nothing would ever send it (the service only runs when MAIL_FROM is configured)
+            metrics.MAIL_MESSAGES.labels(outcome="dropped").inc()
+            logging.warning(f"[Mail] Service not started, dropping message to {message['To']}.")
+            return False
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            metrics.MAIL_MESSAGES.labels(outcome="dropped").inc()
+            logging.error(f"[Mail] Queue full, dropping message to {message['To']}.")
+            return False
+        metrics.MAIL_QUEUE_DEPTH.set(self.queue.qsize())
+        return True
+
+    async def send(self, message: EmailMessage) -> None:
+        """Send one message now, over a pooled connection."""
+        await self.send_many([message])
+
+    async def send_many(self, messages: Iterable[EmailMessage]) -> int:
+        """
+        Send messages now, `batch_size` per connection checkout, over all pooled connections.
+
+        Returns:
+        - int: Number of messages the server accepted.
+        """
+        if self.pool is None:
+            self.pool = SMTPConnectionPool()
+        messages = list(messages)
+        batches = [messages[i:i + self.batch_size] for i in range(0, len(messages), self.batch_size)]
+        sent = await asyncio.gather(*(self._send_batch(batch) for batch in batches))
+        return sum(sent)
+
+    async def _send_batch(self, batch: List[EmailMessage]) -> int:
+        started = time.perf_counter()
+        sent = 0
+        try:
+            async with self.pool.acquire() as smtp:
+                for message in batch:
+                    try:
+                        await self.pool.send(smtp, message)
+                        sent += 1
+                    except SMTPException as e:
+                        # A rejected recipient must not fail the rest of the batch
+                        logging.error(f"[Mail] Failed to send to {message['To']}: {e}")
+        except (SMTPException, OSError) as e:
+            logging.error(f"[Mail] SMTP connection failed: {e}")
+        metrics.MAIL_MESSAGES.labels(outcome="sent").inc(sent)
+        metrics.MAIL_MESSAGES.labels(outcome="failed").inc(len(batch) - sent)
+        metrics.MAIL_SEND_SECONDS.observe(time.perf_counter() - started)
+        return sent
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._send_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+                metrics.MAIL_QUEUE_DEPTH.set(self.queue.qsize())
+
+
+# One mail service per worker process, started and stopped by the app lifecycle hooks in main.py
+mail_service = MailService()
+
+
+async def send_activation_email(to_email: str, activation_link: str, from_email: Optional[str] = None):
+    html_content = render_activation_email(activation_link)
+    msg = build_message(
+        to_email,
+        subject="Activate your account",
+        text="Please activate your account by visiting the link.",
+        html=html_content,
+        from_email=from_email,
+    )
+    await mail_service.send(msg)
+
+
+def send_email(to_email: str, activation_link: str, from_email: Optional[str] = None) -> bool:
+    """Queue the activation email; safe to call from sync code running inside the event loop."""
+    msg = build_message(
+        to_email,
+        subject="Activate your account",
+        text="Please activate your account by visiting the link.",
+        html=render_activation_email(activation_link),
+        from_email=from_email,
+    )
+    return mail_service.enqueue(msg)
+
+
+def order_confirmation_message(to_email: str, order: Dict[str, Any]) -> EmailMessage:
+    """Confirmation email for an order as returned by Order.to_dict()."""
+    return build_message(
+        to_email,
+        subject=f"Order {order['id']} confirmed",
+        text=f"Your order {order['id']} for {order['total_amount']} {order['currency']} has been received.",
+        html=render_template("order_confirmation.html", order=order),
+    )
+
+
+def send_order_confirmations(recipients: Iterable[tuple[str, Dict[str, Any]]]) -> int:
+    """
+    Queue confirmation emails for (email, order dict) pairs.
+
+    The background workers send them in batches of MAIL_BATCH_SIZE per SMTP
+    connection checkout.
+
+    Returns:
+    - int: Number of messages queued.
+    """
+    return sum(mail_service.enqueue(order_confirmation_message(to_email, order)) for to_email, order in recipients)
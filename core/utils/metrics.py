@@ -0,0 +1,265 @@
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry
+from prometheus_client import multiprocess
+import os
+
+# Gunicorn runs several workers, each with its own registry. When
+# PROMETHEUS_MULTIPROC_DIR is set every worker writes its samples to that
+# directory and /metrics aggregates them, whichever worker serves the scrape.
+# Gauges therefore declare how values from several processes are combined.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10)
+
+
+# --- HTTP requests --- #
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last body chunk",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+
+# --- Database time per request --- #
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing one SQL statement",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed while handling one request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+DB_SECONDS_PER_REQUEST = Histogram(
+    "http_request_db_seconds",
+    "Time spent in SQL statements while handling one request",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+# --- Order outbox relay --- #
+
+OUTBOX_PUBLISHED = Counter(
+    "order_outbox_published_total",
+    "Order events relayed from the outbox to Kafka",
+)
+OUTBOX_RELAY_FAILURES = Counter(
+    "order_outbox_relay_failures_total",
+    "Outbox relay batches that failed and will be retried",
+)
+OUTBOX_PENDING = Gauge(
+    "order_outbox_pending_events",
+    "Order events written to the outbox but not yet published",
+    multiprocess_mode="livemax",
+)
+OUTBOX_LAG = Gauge(
+    "order_outbox_lag_seconds",
+    "Age of the oldest unpublished outbox event",
+    multiprocess_mode="livemax",
+)
+OUTBOX_BATCH_SECONDS = Histogram(
+    "order_outbox_relay_batch_seconds",
+    "Time spent relaying one outbox batch to Kafka",
+)
+
+
+# --- Order archival --- #
+
+ARCHIVED_ORDERS = Counter(
+    "orders_archived_total",
+    "Closed orders moved to the archive tables",
+)
+ARCHIVE_BATCH_SECONDS = Histogram(
+    "orders_archive_batch_seconds",
+    "Time spent archiving one batch of orders",
+)
+
+
+# --- Kafka producer --- #
+
+KAFKA_PRODUCER_SEND_SECONDS = Histogram(
+    "kafka_producer_send_seconds",
+    "Time from handing a record to the producer until the broker acknowledged it",
+    ["topic"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_PRODUCER_ERRORS = Counter(
+    "kafka_producer_errors_total",
+    "Records the producer failed to deliver",
+    ["topic"],
+)
+
+
+# --- Kafka consumer pipeline --- #
+
+KAFKA_CONSUMER_MESSAGES = Counter(
+    "kafka_consumer_messages_total",
+    "Consumed Kafka messages by outcome",
+    ["outcome"],
+)
+KAFKA_CONSUMER_PROCESS_SECONDS = Histogram(
+    "kafka_consumer_process_seconds",
+    "Time spent handling one Kafka message",
+)
+KAFKA_CONSUMER_END_TO_END_SECONDS = Histogram(
+    "kafka_consumer_end_to_end_seconds",
+    "Time from the record timestamp until it was handled",
+    buckets=LATENCY_BUCKETS + (30, 60, 300),
+)
+KAFKA_CONSUMER_BATCH_SECONDS = Histogram(
+    "kafka_consumer_batch_seconds",
+    "Time spent handling one getmany() batch, commit included",
+)
+KAFKA_CONSUMER_LAG = Gauge(
+    "kafka_consumer_lag",
+    "Messages between the committed position and the high watermark",
+    ["topic", "partition"],
+    multiprocess_mode="livemax",
+)
+
+
+# --- Read-through caches --- #
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit_local, hit_redis, miss)",
+    ["cache", "result"],
+)
+CACHE_INVALIDATIONS = Counter(
+    "cache_invalidations_total",
+    "Keys explicitly invalidated by write paths",
+    ["cache"],
+)
+
+
+# --- Outgoing mail --- #
+
+MAIL_MESSAGES = Counter(
+    "mail_messages_total",
+    "Emails handled by the mail service by outcome (sent, failed, dropped)",
+    ["outcome"],
+)
+MAIL_QUEUE_DEPTH = Gauge(
+    "mail_queue_depth",
+    "Emails waiting in the send queue",
+    multiprocess_mode="livesum",
+)
+MAIL_SEND_SECONDS = Histogram(
+    "mail_send_batch_seconds",
+    "Time spent sending one batch of emails over a pooled SMTP connection",
+    buckets=LATENCY_BUCKETS + (30,),
+)
+
+
+# --- Bearer token verification --- #
+
+JWT_VERIFICATIONS = Counter(
+    "jwt_verifications_total",
+    "Bearer tokens checked by result (cached, valid, expired, invalid)",
+    ["result"],
+)
+JWT_VERIFY_SECONDS = Histogram(
+    "jwt_verify_seconds",
+    "Time to verify a token that was not in the claims cache, including JWKS lookups",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+
+
+# --- Rate limiting and load shedding --- #
+
+RATE_LIMITED = Counter(
+    "http_rate_limited_total",
+    "Requests rejected with 429 by a per-client token bucket, by rule prefix",
+    ["rule"],
+)
+LOAD_SHED = Counter(
+    "http_load_shed_total",
+    "Requests rejected with 503 by the concurrency limiter, by reason (queue_full, queue_timeout)",
+    ["reason"],
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "http_admission_queue_seconds",
+    "Time requests waited for a concurrency slot (admitted and shed alike)",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "http_admission_queue_depth",
+    "Requests waiting for a concurrency slot",
+    multiprocess_mode="livesum",
+)
+CONCURRENCY_LIMIT = Gauge(
+    "http_concurrency_limit",
+    "Current adaptive limit on concurrently executing requests",
+    multiprocess_mode="livesum",
+)
+
+
+# --- Database connection pool --- #
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured size of the SQLAlchemy connection pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond the pool size",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+# --- Read replica routing --- #
+
+DB_READ_SESSIONS = Counter(
+    "db_read_sessions_total",
+    "Sessions of read-only routes, by database and why it was chosen (replica, recent_write, replica_lag)",
+    ["database", "reason"],
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Last measured replication lag of the read replica (-1 when unreachable)",
+    multiprocess_mode="livemax",
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+
+    Under gunicorn the samples of all live workers are merged from
+    PROMETHEUS_MULTIPROC_DIR, otherwise the process registry is used.
+
+    Returns:
+    - tuple: The encoded payload and its content type.
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
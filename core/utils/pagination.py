@@ -0,0 +1,58 @@
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.sql import Select
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+import base64, json
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque, URL-safe cursor for the sort key values of the last row of a page."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the sort key")
+        return [
+            datetime.fromisoformat(v) if isinstance(col.type, DateTime) and v is not None else v
+            for col, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+
+
+def keyset_paginate(query: Select, columns: Sequence[Any], cursor: Optional[str], limit: int) -> Select:
+    """
+    Restrict `query` to the page after `cursor`, newest first.
+
+    `columns` is the unique sort key, e.g. `(Order.created_at, Order.id)`. An
+    empty or missing cursor returns the first page. One extra row is fetched so
+    `split_page` can tell whether another page follows.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.where(tuple_(*columns) < tuple_(*values))
+    return query.order_by(*(col.desc() for col in columns)).limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], columns: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    Trim the look-ahead row and build the cursor of the next page.
+
+    Returns:
+    - tuple: The rows of this page and the `next_cursor` (None on the last page).
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, col.key) for col in columns])
@@ -1,5 +1,13 @@
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from core.utils.serialization import dumps
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; accepts models registered in core.utils.serialization."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
 
 def get_message_from_code(code: int) -> str:
     """
@@ -89,28 +97,34 @@ def get_message_from_code(code: int) -> str:
     # Default to the status code if not found in the dictionary
     return message_dict.get(code, f"Unknown status code {code}")
 
-def Response(data=None, success=True, message=None, code=200):
+def Response(data=None, success=True, message=None, code=200, extra=None):
     """
     A generic response handler for JSON responses with status, message, and data.
 
     Parameters:
-    - data: The actual data to return (default is None).
+    - data: The actual data to return (default is None). ORM models with a
+      registered encoder (Order, OrderItem, Payment) can be passed as is.
     - status: The status of the response, typically 'success' or 'error' (default is 'success').
     - message: A message describing the response (default is 'Request processed successfully').
     - code: The HTTP status code to return (default is 200).
+    - extra: Additional top-level envelope fields, e.g. {"next_cursor": ...} (default is None).
 
     Returns:
-    - JSONResponse: A JSON response with the provided data, status, message, and status code.
+    - FastJSONResponse: A JSON response with the provided data, status, message, and status code.
     """
     # Use provided message or default to the one based on the code
     r_message = message if message else get_message_from_code(code)
     
-    return JSONResponse(
-        content={
-            "data": data,
-            "message": r_message,
-            "success": success
-        },
+    content = {
+        "data": data,
+        "message": r_message,
+        "success": success
+    }
+    if extra:
+        content.update(extra)
+
+    return FastJSONResponse(
+        content=content,
         status_code=code
     )
 
@@ -0,0 +1,55 @@
+from decimal import Decimal
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, Sequence, Type
+import orjson
+
+# Per-class encoders compiled once by `register_encoder`
+_ENCODERS: Dict[Type, Callable[[Any], Any]] = {}
+
+
+def register_encoder(cls: Type, fields: Sequence[str]) -> Callable[[Any], Any]:
+    """
+    Compile and register the JSON encoder of `cls`.
+
+    The encoder reads `fields` in one call and hands the raw values to orjson,
+    which serializes datetimes, enums, nested lists and other registered
+    models natively, so no `to_dict()` conversion is needed.
+    """
+    fields = tuple(fields)
+    from_attributes = attrgetter(*fields)
+    from_state = itemgetter(*fields)
+
+    def encoder(obj):
+        # Loaded ORM attributes live in the instance __dict__; reading them there skips
+        # the instrumented descriptors. Expired or unloaded ones go through getattr.
+        try:
+            values = from_state(obj.__dict__)
+        except KeyError:
+            values = from_attributes(obj)
+        return dict(zip(fields, values)) if len(fields) > 1 else {fields[0]: values}
+
+    _ENCODERS[cls] = encoder
+    return encoder
+
+
+def _default(obj: Any) -> Any:
+    encoder = _ENCODERS.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize `content` (plain data and/or registered models) to JSON bytes."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data)
+
+
+def fragment(data: bytes) -> orjson.Fragment:
+    """Wrap already encoded JSON so it is embedded in a response as is."""
+    return orjson.Fragment(data)
@@ -25,5 +25,10 @@ chmod +x ./run_migrations.sh && success "Migration script made executable"
 info "Running migration script..."
 ./run_migrations.sh
 
+# Every worker writes its metrics here; /metrics merges them. Start from an empty
+# directory so samples from a previous container run are not reported again.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 info "Starting Gunicorn server..."
-exec gunicorn main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:${PORT:-8000}
+exec gunicorn main:app --config gunicorn.conf.py --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:${PORT:-8000}
@@ -0,0 +1,10 @@
+# Gunicorn hooks for the production server; workers and bind are passed on the
+# command line in entrypoint.prod.sh.
+import os
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a dead worker from the shared prometheus files
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,9 +5,23 @@ from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.cors import CORSMiddleware
 from routes.orders import router as order_router
 from routes.payments import router as payment_router
-from core.database import get_db 
+from core.database import get_db, engine_replica
 from core.utils.response import Response, RequestValidationError 
-from core.utils.kafka import KafkaConsumer,KafkaProducer ,is_kafka_available
+from core.utils.kafka import KafkaConsumer, kafka_producer, is_kafka_available
+from core.utils.metrics import render_metrics
+from core.middleware.metrics import MetricsMiddleware
+from core.middleware.profiling import ProfilingMiddleware, profiling_available
+from core.middleware.concurrency import ConcurrencyLimitMiddleware
+from core.middleware.compression import CompressionMiddleware
+from core.middleware.ratelimit import RateLimitMiddleware, RedisTokenBuckets
+from core.middleware.replica import ReadYourWritesMiddleware
+from services.outbox import OutboxRelay
+from services.payments import handle_order_event
+from services.idempotency import purge_expired_keys_forever
+from services.archive import OrderArchiver
+from core.utils.messages.email import mail_service
+from core.utils.cache import redis_client, order_cache, payment_cache, listen_for_invalidations
+from fastapi.responses import Response as RawResponse
 import asyncio, logging
 
 
@@ -20,19 +34,31 @@ app = FastAPI(
 # Load settings/configuration from your core config module
 settings = Settings()
 
-# Initialize Kafka consumer with broker(s), topic and group ID from settings
+# Initialize Kafka consumer with broker(s), topic and group ID from settings.
+# Order "create" events open a payment; offsets are committed manually once it is stored.
 kafka_consumer = KafkaConsumer(
     broker=",".join(settings.KAFKA_BOOTSTRAP_SERVERS),
     topic=str(settings.KAFKA_TOPIC),
     group_id=str(settings.KAFKA_GROUP),
-    db: AsyncSession = Depends(get_db),
+    handler=handle_order_event,
+    producer=kafka_producer,
+    dlq_topic=settings.KAFKA_DLQ_TOPIC,
+    batch_size=settings.KAFKA_CONSUMER_BATCH_SIZE,
+    max_concurrency=settings.KAFKA_CONSUMER_MAX_CONCURRENCY,
+    max_retries=settings.KAFKA_CONSUMER_MAX_RETRIES,
+    enable_auto_commit=False,
 )
 
-kafka_producer = KafkaProducer(broker=settings.KAFKA_BOOTSTRAP_SERVERS,
-                                topic=str(settings.KAFKA_TOPIC))
-
 consumer_task = None  # This will hold the asyncio task for consuming Kafka messages
 
+# Drains order events committed to the outbox table to Kafka
+outbox_relay = OutboxRelay(producer=kafka_producer)
+outbox_task = None
+cache_listener_task = None  # Drops local cache entries invalidated by other workers
+idempotency_purge_task = None  # Deletes Idempotency-Key records past their TTL
+order_archiver = OrderArchiver() if settings.ARCHIVE_ENABLED else None
+archive_task = None  # Moves closed orders to the archive tables
+
 # Setup CORS middleware if BACKEND_CORS_ORIGINS is configured in settings
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -48,6 +74,39 @@ if settings.BACKEND_CORS_ORIGINS:
 # Add session middleware to manage client sessions with your secret key
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
+# Clients that just wrote read from the primary for a few seconds, see POSTGRES_REPLICA_DB
+if engine_replica is not None:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Opt-in stack sampling of slow requests, see PROFILING_* in core/config.py
+if settings.PROFILING_ENABLED:
+    if profiling_available():
+        app.add_middleware(ProfilingMiddleware)
+    else:
+        logging.warning("PROFILING_ENABLED is set but pyinstrument is not installed; profiling is off.")
+
+# Sheds load before it reaches the DB pool: requests over the adaptive concurrency limit
+# get 503, see LOAD_SHED_* in core/config.py
+if settings.LOAD_SHED_ENABLED:
+    app.add_middleware(ConcurrencyLimitMiddleware)
+
+# Per-client token buckets, checked before the concurrency limit so a single noisy client
+# can't take all the slots; shared across workers through Redis when configured
+if settings.RATE_LIMIT_ENABLED:
+    if settings.RATE_LIMIT_BACKEND == "redis" and redis_client is not None:
+        app.add_middleware(RateLimitMiddleware, buckets=RedisTokenBuckets(redis_client))
+    else:
+        if settings.RATE_LIMIT_BACKEND == "redis":
+            logging.warning("RATE_LIMIT_BACKEND is redis but REDIS_URL is not set; rate limits are per worker.")
+        app.add_middleware(RateLimitMiddleware)
+
+# brotli/gzip for bodies over COMPRESSION_MIN_SIZE (order and payment listings, exports)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Added last so it wraps every other middleware and times the whole request
+app.add_middleware(MetricsMiddleware)
+
 # Register all routers (API route groups) for different resources
 app.include_router(order_router)
 app.include_router(payment_router)
@@ -61,6 +120,12 @@ async def read_root():
         "version": "1.0.0"
     }
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    payload, content_type = render_metrics()
+    return RawResponse(content=payload, media_type=content_type)
+
 # Global handler for request validation errors to return consistent error responses
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -85,17 +150,38 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.on_event("startup")
 async def startup():
-    global consumer_task
+    global consumer_task, outbox_task, cache_listener_task, idempotency_purge_task, archive_task
     kafka_host = settings.KAFKA_HOST
     kafka_port = int(settings.KAFKA_PORT)
+    # One producer per worker, shared by every request until shutdown
+    try:
+        await kafka_producer.start()
+    except Exception as e:
+        logging.critical(f"Failed to start Kafka producer: {e}")
+        await kafka_producer.stop()
+
+    # The relay keeps retrying on its own if Kafka is not reachable yet
+    outbox_task = asyncio.create_task(outbox_relay.run())
+
+    idempotency_purge_task = asyncio.create_task(purge_expired_keys_forever())
+
+    if order_archiver is not None:
+        archive_task = asyncio.create_task(order_archiver.run())
+
+    # Background email sender, only when a sender address is configured
+    if settings.MAIL_FROM:
+        await mail_service.start()
+
+    if redis_client is not None:
+        cache_listener_task = asyncio.create_task(listen_for_invalidations(redis_client, [order_cache, payment_cache]))
+
     try:
         await kafka_consumer.start()
-        consumer_task = asyncio.create_task(kafka_consumer.consume())
+        consumer_task = asyncio.create_task(kafka_consumer.consume_batches())
 
     except Exception as e:
         logging.critical(f"Failed to start Kafka consumer: {e}")
         await kafka_consumer.stop()
-        await kafka_producer.stop()
 
     
     logging.info("App started")
@@ -103,9 +189,36 @@ async def startup():
 # FastAPI event handler triggered on application shutdown
 @app.on_event("shutdown")
 async def shutdown():
+    # Let the relay finish its current batch before the producer goes away
+    outbox_relay.stop()
+    if outbox_task:
+        try:
+            await asyncio.wait_for(outbox_task, timeout=10)
+        except asyncio.TimeoutError:
+            outbox_task.cancel()
+        except Exception as e:
+            logging.error(f"Outbox relay stopped with an error: {e}")
+
     # Stop Kafka consumer gracefully
+    if consumer_task:
+        consumer_task.cancel()
     await kafka_consumer.stop()
     logging.critical("Kafka consumer stopped.")
+    # Flushes anything still batched before closing the connection
     await kafka_producer.stop()
     logging.critical("Kafka producer stopped.")
+
+    # Sends what is still queued before closing the SMTP connections
+    await mail_service.stop()
+
+    if idempotency_purge_task:
+        idempotency_purge_task.cancel()
+    if archive_task:
+        # A batch in progress is rolled back and simply picked up again by the next run
+        order_archiver.stop()
+        archive_task.cancel()
+    if cache_listener_task:
+        cache_listener_task.cancel()
+    if redis_client is not None:
+        await redis_client.aclose()
     
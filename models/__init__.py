@@ -1,6 +1,10 @@
 # models/__init__.py
 from .orders import Order, OrderItem
 from .payments import Payment
+from .outbox import OrderOutbox
+from .idempotency import IdempotencyKey
+from .order_stats import OrderStatsHourly
+from .archive import ArchivedOrder, ArchivedOrderItem, ArchivedPayment
 # import other models too...
 
 from core.database import Base,engine_db  # or wherever your Base is defined
@@ -0,0 +1,143 @@
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, DateTime, Enum, Integer, DECIMAL, Text, Index
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from core.database import Base, CHAR_LENGTH
+from core.utils.serialization import register_encoder
+from models.orders import OrderStatus
+from models.payments import PaymentMethod, PaymentStatus
+
+# On PostgreSQL the archive tables are partitioned by month of created_at, so the
+# partition key is part of every primary key (see services/archive.py for partition upkeep)
+ARCHIVE_TABLE_ARGS = {"postgresql_partition_by": "RANGE (created_at)"}
+
+
+class ArchivedOrder(Base):
+    """
+    A closed order moved out of `orders` by `services.archive.OrderArchiver`.
+
+    Same columns (and JSON shape) as Order, plus when it was archived.
+    Archived orders are read-only.
+    """
+    __tablename__ = "orders_archive"
+
+    id: Mapped[str] = mapped_column(String(CHAR_LENGTH), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(CHAR_LENGTH), nullable=False)
+    status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), nullable=False)
+
+    total_amount: Mapped[float] = mapped_column(nullable=False)
+    currency: Mapped[str] = mapped_column(String(10), nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    items: Mapped[List["ArchivedOrderItem"]] = relationship(
+        "ArchivedOrderItem",
+        primaryjoin="foreign(ArchivedOrderItem.order_id) == ArchivedOrder.id",
+        viewonly=True,
+        lazy="raise",
+    )
+
+    __table_args__ = (
+        Index("ix_orders_archive_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_archive_status_created_at", "status", "created_at"),
+        Index("ix_orders_archive_created_at_id", "created_at", "id"),
+        ARCHIVE_TABLE_ARGS,
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "status": self.status.value,
+            "total_amount": self.total_amount,
+            "currency": self.currency,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "version": self.version,
+            "items": [item.to_dict() for item in self.items],
+        }
+
+    def __repr__(self):
+        return f"<ArchivedOrder(id={self.id}, user_id={self.user_id}, status={self.status}, total={self.total_amount})>"
+
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+
+    id: Mapped[str] = mapped_column(String(CHAR_LENGTH), primary_key=True)
+    order_id: Mapped[str] = mapped_column(String(CHAR_LENGTH), nullable=False)
+    product_id: Mapped[str] = mapped_column(String(CHAR_LENGTH), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    price_per_unit: Mapped[float] = mapped_column(nullable=False)
+    total_price: Mapped[float] = mapped_column(nullable=False)
+    # The order's created_at: items are partitioned together with their order
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_order_items_archive_order_id", "order_id"),
+        ARCHIVE_TABLE_ARGS,
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "product_id": self.product_id,
+            "quantity": self.quantity,
+            "price_per_unit": self.price_per_unit,
+            "total_price": self.total_price,
+        }
+
+
+class ArchivedPayment(Base):
+    __tablename__ = "payments_archive"
+
+    id: Mapped[str] = mapped_column(String(CHAR_LENGTH), primary_key=True)
+    order_id: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), nullable=True)
+    user_id: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), nullable=True)
+    method: Mapped[PaymentMethod] = mapped_column(Enum(PaymentMethod), nullable=False)
+    status: Mapped[PaymentStatus] = mapped_column(Enum(PaymentStatus), nullable=False)
+    amount: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False)
+    currency: Mapped[str] = mapped_column(String(10), nullable=False)
+    transaction_id: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), nullable=True)
+    gateway_response: Mapped[Optional[Text]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+    refunded_amount: Mapped[Optional[DECIMAL]] = mapped_column(DECIMAL(18, 8))
+    parent_payment_id: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_payments_archive_order_id", "order_id"),
+        Index("ix_payments_archive_user_id_created_at", "user_id", "created_at"),
+        ARCHIVE_TABLE_ARGS,
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "user_id": self.user_id,
+            "method": self.method.value if self.method else None,
+            "status": self.status.value if self.status else None,
+            "amount": float(self.amount) if self.amount is not None else None,
+            "currency": self.currency,
+            "transaction_id": self.transaction_id,
+            "gateway_response": self.gateway_response,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "refunded_amount": float(self.refunded_amount) if self.refunded_amount is not None else 0,
+            "parent_payment_id": self.parent_payment_id,
+        }
+
+
+# Same JSON shape as the live models, so archived rows can be returned by the same endpoints
+register_encoder(ArchivedOrder, ["id", "user_id", "status", "total_amount", "currency", "created_at", "updated_at", "version", "items"])
+register_encoder(ArchivedOrderItem, ["id", "order_id", "product_id", "quantity", "price_per_unit", "total_price"])
+register_encoder(ArchivedPayment, [
+    "id", "order_id", "user_id", "method", "status", "amount", "currency", "transaction_id",
+    "gateway_response", "created_at", "updated_at", "refunded_amount", "parent_payment_id",
+])
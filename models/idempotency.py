@@ -0,0 +1,37 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, Integer, LargeBinary, Index
+from datetime import datetime
+from typing import Optional
+from core.database import Base, CHAR_LENGTH
+
+
+class IdempotencyKey(Base):
+    """
+    Outcome of a request sent with an Idempotency-Key header.
+
+    The row is inserted in the same transaction as the resource the request
+    creates, so a concurrent duplicate blocks on the primary key until the
+    first request commits (or rolls back). `status_code` stays NULL until the
+    response has been recorded; if that hasn't happened by `locked_until`
+    (the worker died in between), a retry may take the key over.
+    """
+    __tablename__ = "idempotency_keys"
+
+    scope: Mapped[str] = mapped_column(String(50), primary_key=True)  # e.g. "orders.create"
+    key: Mapped[str] = mapped_column(String(CHAR_LENGTH), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 of the request payload
+
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    response_body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # End of the claim's lease; NULL for keys claimed before leases existed (treated as lapsed)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey(scope={self.scope}, key={self.key}, status_code={self.status_code})>"
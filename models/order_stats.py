@@ -0,0 +1,31 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, Integer, Enum, Index
+from datetime import datetime
+from core.database import Base
+from models.orders import OrderStatus
+
+
+class OrderStatsHourly(Base):
+    """
+    Order count and GMV per creation hour, currency and current status.
+
+    Maintained incrementally by the order write paths in `services.orders`
+    (in the same transaction as the order), so `GET /api/v1/orders/stats`
+    aggregates buckets instead of orders. `services.order_stats.rebuild_order_stats`
+    recomputes it from `orders`.
+    """
+    __tablename__ = "order_stats_hourly"
+
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)  # created_at truncated to the hour
+    currency: Mapped[str] = mapped_column(String(10), primary_key=True)
+    status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), primary_key=True)
+
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    gmv: Mapped[float] = mapped_column(nullable=False, default=0)  # sum of total_amount
+
+    __table_args__ = (
+        Index("ix_order_stats_hourly_status_bucket", "status", "bucket"),
+    )
+
+    def __repr__(self):
+        return f"<OrderStatsHourly(bucket={self.bucket}, currency={self.currency}, status={self.status}, orders={self.order_count})>"
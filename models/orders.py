@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship, validates
-from sqlalchemy import Enum, Integer, String, DateTime, ForeignKey, Boolean, Text, DECIMAL, Table, Column
+from sqlalchemy import Enum, Integer, String, DateTime, ForeignKey, Boolean, Text, DECIMAL, Table, Column, Index
 from core.database import Base, CHAR_LENGTH
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -12,6 +12,7 @@ from enum import Enum as PyEnum
 from typing import List
 from uuid import uuid4
 from core.database import Base, CHAR_LENGTH
+from core.utils.serialization import register_encoder
 
 class OrderStatus(PyEnum):
     Pending = "Pending"
@@ -47,10 +48,23 @@ class Order(Base):
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Incremented by every write to the order or its items (optimistic concurrency)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
+    # Never loaded implicitly: queries that need the items ask for them with
+    # selectinload(Order.items) (see ORDER_LOADER in services/orders.py).
     items: Mapped[List["OrderItem"]] = relationship(
-        "OrderItem", back_populates="order", cascade="all, delete-orphan", lazy="joined"
+        "OrderItem", back_populates="order", cascade="all, delete-orphan", lazy="raise"
     )
+
+    __table_args__ = (
+        # Listings filter on user/status and sort or range-scan on created_at;
+        # (created_at, id) is the keyset pagination key of unfiltered listings.
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
@@ -60,6 +74,7 @@ class Order(Base):
             "currency": self.currency,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "version": self.version,
             "items": [item.to_dict() for item in self.items],
         }
     def __repr__(self):
@@ -71,13 +86,19 @@ class OrderItem(Base):
 
     id: Mapped[str] = mapped_column(String(CHAR_LENGTH), primary_key=True)
     order_id: Mapped[str] = mapped_column(ForeignKey("orders.id"), nullable=False)
-    order: Mapped["Order"] = relationship("Order", back_populates="items")
+    order: Mapped["Order"] = relationship("Order", back_populates="items", lazy="raise")
 
     product_id: Mapped[str] = mapped_column(String(CHAR_LENGTH), nullable=False)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
     price_per_unit: Mapped[float] = mapped_column(nullable=False)
 
     total_price: Mapped[float] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+        Index("ix_order_items_product_id", "product_id"),
+    )
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
@@ -90,3 +111,7 @@ class OrderItem(Base):
     def __repr__(self):
         return f"<OrderItem(id={self.id}, product_id={self.product_id}, quantity={self.quantity})>"
 
+
+# Fast JSON encoders used by core.utils.response.Response (same shape as to_dict)
+register_encoder(Order, ["id", "user_id", "status", "total_amount", "currency", "created_at", "updated_at", "version", "items"])
+register_encoder(OrderItem, ["id", "order_id", "product_id", "quantity", "price_per_unit", "total_price"])
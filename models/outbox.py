@@ -0,0 +1,35 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, Integer, BigInteger, Text, Index
+from datetime import datetime
+from typing import Optional
+from core.database import Base, CHAR_LENGTH
+
+
+class OrderOutbox(Base):
+    """
+    Order events waiting to be relayed to Kafka.
+
+    Rows are written in the same transaction as the order they describe and
+    drained in `id` order by `services.outbox.OutboxRelay`.
+    """
+    __tablename__ = "order_outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    aggregate_id: Mapped[str] = mapped_column(String(CHAR_LENGTH), nullable=False)  # order id, used as the Kafka key
+    event_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    topic: Mapped[str] = mapped_column(String(CHAR_LENGTH), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON encoded message
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    published_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Set while a relay is publishing the row; a lapsed claim is taken over by the next relay
+    claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_order_outbox_published_at_id", "published_at", "id"),
+    )
+
+    def __repr__(self):
+        return f"<OrderOutbox(id={self.id}, aggregate_id={self.aggregate_id}, event_type={self.event_type}, published_at={self.published_at})>"
@@ -1,10 +1,11 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey, DateTime, Enum, Integer, Boolean, DECIMAL, Text
+from sqlalchemy import String, ForeignKey, DateTime, Enum, Integer, Boolean, DECIMAL, Text, Index, text
 from enum import Enum as PyEnum
 from datetime import datetime
 from typing import Optional
 from uuid import uuid4
 from core.database import Base, CHAR_LENGTH
+from core.utils.serialization import register_encoder
 
 class PaymentMethod(PyEnum):
     CreditCard = "CreditCard"
@@ -64,6 +65,20 @@ class Payment(Base):
 
     # For partial refunds or multiple payment attempts
     parent_payment_id: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), ForeignKey("payments.id"), nullable=True)
+
+    __table_args__ = (
+        Index("ix_payments_order_id", "order_id"),
+        Index("ix_payments_user_id_created_at", "user_id", "created_at"),
+        Index("ix_payments_created_at_id", "created_at", "id"),
+        # A gateway transaction maps to exactly one payment (NULLs are allowed many times)
+        Index("uq_payments_transaction_id", "transaction_id", unique=True),
+        # An order has one root payment; refunds and retries hang off it via parent_payment_id
+        Index(
+            "uq_payments_order_id_root", "order_id", unique=True,
+            postgresql_where=text("parent_payment_id IS NULL"),
+            sqlite_where=text("parent_payment_id IS NULL"),
+        ),
+    )
     
     def to_dict(self) -> dict:
         return {
@@ -83,3 +98,10 @@ class Payment(Base):
         }
     def __repr__(self):
         return f"<Payment(id={self.id}, order_id={self.order_id}, method={self.method}, status={self.status}, amount={self.amount} {self.currency})>"
+
+
+# Fast JSON encoder used by core.utils.response.Response (same shape as to_dict)
+register_encoder(Payment, [
+    "id", "order_id", "user_id", "method", "status", "amount", "currency", "transaction_id",
+    "gateway_response", "created_at", "updated_at", "refunded_amount", "parent_payment_id",
+])
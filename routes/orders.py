@@ -1,37 +1,169 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, status, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import List, Optional, Literal
 from datetime import datetime
 from schemas.orders import OrderSchema, OrderItemSchema,UpdateOrderSchema,OrderFilterSchema
 from models.orders import Order, OrderItem, OrderStatus
-from services.orders import OrderService, OrderItemService
-from core.database import get_db  # Make sure this returns AsyncSession
+from services.orders import OrderService, OrderItemService, ConcurrentUpdateError, OrderNotFoundError
+from services.order_stats import OrderStatsService
+from services.idempotency import (
+    IdempotencyService, IdempotencyInProgressError, IdempotencyKeyReusedError,
+    IDEMPOTENCY_HEADER, request_fingerprint,
+)
+from fastapi.responses import StreamingResponse
+from core.database import get_db, get_read_db, get_read_sessionmaker  # Make sure this returns AsyncSession
+from core.utils.export import ndjson_stream, csv_stream, MEDIA_TYPES
 from core.utils.response import Response
+from core.utils.pagination import InvalidCursorError
+from core.utils.serialization import fragment
+from core.utils.etag import make_etag, payload_etag, etag_matches, not_modified, with_etag
+from core.config import settings
 
 router = APIRouter(prefix="/api/v1/orders", tags=["Orders"])
 
+ORDER_CSV_COLUMNS = ["id", "user_id", "status", "total_amount", "currency", "created_at", "updated_at", "item_count"]
+
 
 # --- Order Routes --- #
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_order(order_in: OrderSchema,db: AsyncSession = Depends(get_db)):
+async def create_order(
+    order_in: OrderSchema,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    db: AsyncSession = Depends(get_db),
+):
+    async def handler(session: AsyncSession):
+        try:
+            service = OrderService(session)
+            order = await service.create_order(order_in)
+            return Response(data=order, code=201)
+        except Exception as e:
+            return Response(success=False, message=str(e), code=500)
+
+    # Retries with the same Idempotency-Key get the first response back instead of a second order
+    try:
+        return await IdempotencyService(db, "orders.create").run(
+            idempotency_key, request_fingerprint(order_in.model_dump_json()), handler
+        )
+    except IdempotencyInProgressError as e:
+        return Response(success=False, message=str(e), code=409)
+    except (IdempotencyKeyReusedError, ValueError) as e:
+        return Response(success=False, message=str(e), code=422)
+
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def create_orders_bulk(
+    orders_in: List[OrderSchema],
+    partial: bool = Query(False, description="Store the valid orders even if some are rejected"),
+    db: AsyncSession = Depends(get_db),
+):
+    if len(orders_in) > settings.BULK_ORDERS_MAX:
+        return Response(success=False, message=f"At most {settings.BULK_ORDERS_MAX} orders per request", code=413)
     try:
         service = OrderService(db)
-        order = await service.create_order(order_in)
-        return Response(data=order.to_dict(), code=201)
+        results = await service.create_orders_bulk(orders_in, partial=partial)
+        all_created = all(result["success"] for result in results)
+        return Response(data=results, success=all_created, code=201 if all_created else 207)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=422)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/export")
+async def export_orders(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    user_id: Optional[str] = Query(None),
+    status: Optional[OrderStatus] = Query(None),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    session_factory=Depends(get_read_sessionmaker),
+):
+    async def rows():
+        # The request-scoped session is closed before streaming starts, so the export owns its own
+        async with session_factory() as db:
+            service = OrderService(db)
+            async for order in service.stream_all(
+                user_id=user_id,
+                status=status,
+                start_date=start_date,
+                end_date=end_date,
+            ):
+                yield order
+
+    if format == "csv":
+        body = csv_stream(rows(), ORDER_CSV_COLUMNS, lambda order: {**order.to_dict(), "item_count": len(order.items)})
+    else:
+        body = ndjson_stream(rows())
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
+
+
+# Declared before /{order_id}, which would otherwise capture "stats"
+@router.get("/stats")
+async def get_order_stats(
+    interval: Literal["hour", "day"] = Query("day"),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    currency: Optional[str] = Query(None),
+    status: Optional[OrderStatus] = Query(None),
+    by_status: bool = Query(False, description="Also split every bucket by order status"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        service = OrderStatsService(db)
+        series = await service.get_series(
+            interval=interval,
+            start_date=start_date,
+            end_date=end_date,
+            currency=currency,
+            status=status,
+            by_status=by_status,
+        )
+        return Response(data=series)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/stats/funnel")
+async def get_order_funnel(
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    currency: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        service = OrderStatsService(db)
+        funnels = await service.get_funnel(start_date=start_date, end_date=end_date, currency=currency)
+        return Response(data=funnels)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
 
 @router.get("/{order_id}")
-async def get_order(order_id: str, db: AsyncSession = Depends(get_db)):
+async def get_order(
+    order_id: str,
+    if_none_match: Optional[str] = Header(None),
+    # Primary: cache misses fill the shared order cache, which must not get rows a replica is behind on
+    db: AsyncSession = Depends(get_db),
+):
     try:
         service = OrderService(db)
-        order = await service.get_order_by_id(order_id)
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-        return Response(data=order.to_dict())
+        if if_none_match:
+            # Revalidation costs one primary key lookup, the order and its items aren't loaded
+            state = await service.get_order_state(order_id)
+            if state is not None:
+                etag = make_etag(order_id, *state)
+                if etag_matches(if_none_match, etag):
+                    return not_modified(etag)
+        order = await service.get_order_payload(order_id)
+        if order is None:
+            return Response(success=False, message="Order not found", code=404)
+        # Derived from the body actually sent, which may come from a cache
+        return with_etag(Response(data=fragment(order)), payload_etag(order, "version"))
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -41,7 +173,13 @@ async def update_order(order_id: str, update_data: UpdateOrderSchema, db: AsyncS
     try:
         service = OrderService(db)
         order = await service.update_order(order_id, update_data)
-        return Response(data=order.to_dict())
+        return Response(data=order)
+    except OrderNotFoundError as e:
+        return Response(success=False, message=str(e), code=404)
+    except ConcurrentUpdateError as e:
+        return Response(success=False, message=str(e), code=409)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=422)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -66,10 +204,21 @@ async def get_all_orders(
     end_date: Optional[datetime] = Query(None),
     limit: int = Query(10, ge=1),
     offset: int = Query(0, ge=0),
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: pass an empty value for the first page, then next_cursor"),
+    db: AsyncSession = Depends(get_read_db),
 ):
     try:
         service = OrderService(db)
+        if cursor is not None:
+            orders, next_cursor = await service.get_page(
+                user_id=user_id,
+                status=status,
+                start_date=start_date,
+                end_date=end_date,
+                cursor=cursor,
+                limit=limit,
+            )
+            return Response(data=orders, extra={"next_cursor": next_cursor})
         orders = await service.get_all(
             user_id=user_id,
             status=status,
@@ -78,7 +227,9 @@ async def get_all_orders(
             limit=limit,
             offset=offset,
         )
-        return Response(data=[order.to_dict() for order in orders])
+        return Response(data=orders)
+    except InvalidCursorError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -96,17 +247,21 @@ async def create_order_item(
     try:
         service = OrderItemService(db)
         item = await service.create_order_item(order_id, product_id, quantity, price_per_unit)
-        return Response(data=item.to_dict(), code=201)
+        return Response(data=item, code=201)
+    except OrderNotFoundError as e:
+        return Response(success=False, message=str(e), code=404)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
 
 @router.get("/items/{item_id}")
-async def get_order_item(item_id: str, db: AsyncSession = Depends(get_db)):
+async def get_order_item(item_id: str, db: AsyncSession = Depends(get_read_db)):
     try:
         service = OrderItemService(db)
         item = await service.get_order_item(item_id)
-        return Response(data=item.to_dict())
+        if not item:
+            return Response(success=False, message="Order item not found", code=404)
+        return Response(data=item)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -116,7 +271,9 @@ async def update_order_item(item_id: str, update_data:OrderItemSchema, db: Async
     try:
         service = OrderItemService(db)
         item = await service.update_order_item(item_id, update_data)
-        return Response(data=item.to_dict())
+        return Response(data=item)
+    except OrderNotFoundError as e:
+        return Response(success=False, message=str(e), code=404)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -125,10 +282,10 @@ async def update_order_item(item_id: str, update_data:OrderItemSchema, db: Async
 async def delete_order_item(item_id: str, db: AsyncSession = Depends(get_db)):
     try:
         service = OrderItemService(db)
-        deleted = await service.delete_order_item(item_id)
-        if not deleted:
-            raise HTTPException(status_code=404, detail="Order item not found")
+        await service.delete_order_item(item_id)
         return Response(message="Order item deleted successfully", code=204)
+    except OrderNotFoundError as e:
+        return Response(success=False, message=str(e), code=404)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -140,11 +297,30 @@ async def list_items_for_order(order_id: str,
             price_per_unit: Optional[float] = None,
             limit: int = 10,
             offset: int = 0, 
-            db: AsyncSession = Depends(get_db)):
+            cursor: Optional[str] = None,
+            if_none_match: Optional[str] = Header(None),
+            db: AsyncSession = Depends(get_read_db)):
     try:
+        # Every item write bumps the order's updated_at and version, so they validate the item list too;
+        # the query parameters pick the page and filters, so each combination gets its own ETag.
+        # Read before the items: a write in between only makes the ETag older than the body.
+        state = await OrderService(db).get_order_state(order_id)
+        etag = make_etag(
+            order_id, *state, product_id, quantity, price_per_unit, limit, offset, cursor,
+        ) if state is not None else None
+        if etag is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
         service = OrderItemService(db)
-        items = await service.get_all(order_id=order_id,product_id=product_id,quantity=quantity,price_per_unit=price_per_unit,limit=limit,offset=offset)
-        return Response(data=[item.to_dict() for item in items])
+        if cursor is not None:
+            items, next_cursor = await service.get_page(order_id=order_id,product_id=product_id,quantity=quantity,price_per_unit=price_per_unit,cursor=cursor,limit=limit)
+            response = Response(data=items, extra={"next_cursor": next_cursor})
+        else:
+            items = await service.get_all(order_id=order_id,product_id=product_id,quantity=quantity,price_per_unit=price_per_unit,limit=limit,offset=offset)
+            response = Response(data=items)
+        return with_etag(response, etag) if etag is not None else response
+    except InvalidCursorError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -1,14 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Literal
 from models.payments import Payment, PaymentMethod, PaymentStatus  # adjust imports
 from services.payments import PaymentService  # async service for payments
-from core.database import get_db  # async session dependency
+from services.idempotency import (
+    IdempotencyService, IdempotencyInProgressError, IdempotencyKeyReusedError,
+    IDEMPOTENCY_HEADER, request_fingerprint,
+)
+from core.database import get_db, get_read_db, get_read_sessionmaker  # async session dependency
+from core.utils.export import ndjson_stream, csv_stream, MEDIA_TYPES
 from core.utils.response import Response
+from core.utils.pagination import InvalidCursorError
+from core.utils.serialization import fragment, dumps
+from core.utils.etag import make_etag, payload_etag, etag_matches, not_modified, with_etag
 from datetime import datetime
 
 router = APIRouter(prefix="/api/v1/payments", tags=["Payments"])
 
+PAYMENT_CSV_COLUMNS = [
+    "id", "order_id", "user_id", "method", "status", "amount", "currency", "transaction_id",
+    "gateway_response", "created_at", "updated_at", "refunded_amount", "parent_payment_id",
+]
+
 
 @router.post("/",status_code=status.HTTP_201_CREATED)
 async def create_payment(
@@ -20,31 +35,108 @@ async def create_payment(
     transaction_id: Optional[str] = None,
     gateway_response: Optional[str] = None,
     parent_payment_id: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     db: AsyncSession = Depends(get_db),
 ):
+    params = dict(
+        order_id=order_id,
+        amount=amount,
+        currency=currency,
+        method=method,
+        user_id=user_id,
+        transaction_id=transaction_id,
+        gateway_response=gateway_response,
+        parent_payment_id=parent_payment_id,
+    )
+
+    async def handler(session: AsyncSession):
+        try:
+            service = PaymentService(session)
+            payment = await service.create_payment(**params)
+            return Response(data=payment, code=201)
+        except IntegrityError:
+            return Response(success=False, message="Order already has a payment or transaction_id is taken", code=409)
+        except Exception as e:
+            return Response(success=False, message=str(e), code=500)
+
+    # Retries with the same Idempotency-Key get the first response back instead of a second payment
     try:
-        service = PaymentService(db)
-        payment = await service.create_payment(
-            order_id=order_id,
-            amount=amount,
-            currency=currency,
-            method=method,
-            user_id=user_id,
-            transaction_id=transaction_id,
-            gateway_response=gateway_response,
-            parent_payment_id=parent_payment_id,
+        return await IdempotencyService(db, "payments.create").run(
+            idempotency_key, request_fingerprint(dumps(params)), handler
         )
-        
-        return Response(data=payment.to_dict(), code=201)
-    except Exception as e:
-        return Response(success=False, message=str(e), code=500)
+    except IdempotencyInProgressError as e:
+        return Response(success=False, message=str(e), code=409)
+    except (IdempotencyKeyReusedError, ValueError) as e:
+        return Response(success=False, message=str(e), code=422)
+
+@router.get("/export")
+async def export_payments(
+        format: Literal["ndjson", "csv"] = Query("ndjson"),
+        order_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        method: Optional[PaymentMethod] = None,
+        status: Optional[PaymentStatus] = None,
+        amount: Optional[float] = None,
+        currency: Optional[str] = None,
+        transaction_id: Optional[str] = None,
+        gateway_response: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+        refunded_amount: Optional[float] = None,
+        parent_payment_id: Optional[str] = None,
+        session_factory=Depends(get_read_sessionmaker)):
+    filters = dict(
+        order_id=order_id,
+        user_id=user_id,
+        method=method,
+        status=status,
+        amount=amount,
+        currency=currency,
+        transaction_id=transaction_id,
+        gateway_response=gateway_response,
+        created_at=created_at,
+        updated_at=updated_at,
+        refunded_amount=refunded_amount,
+        parent_payment_id=parent_payment_id,
+    )
+
+    async def rows():
+        # The request-scoped session is closed before streaming starts, so the export owns its own
+        async with session_factory() as db:
+            service = PaymentService(db)
+            async for payment in service.stream_all(**filters):
+                yield payment
+
+    if format == "csv":
+        body = csv_stream(rows(), PAYMENT_CSV_COLUMNS, lambda payment: payment.to_dict())
+    else:
+        body = ndjson_stream(rows())
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="payments.{format}"'},
+    )
+
 
 @router.get("/{payment_id}")
-async def get_payment(payment_id: str, db: AsyncSession = Depends(get_db)):
+async def get_payment(
+    payment_id: str,
+    if_none_match: Optional[str] = Header(None),
+    # Primary: cache misses fill the shared payment cache, which must not get rows a replica is behind on
+    db: AsyncSession = Depends(get_db),
+):
     try:
         service = PaymentService(db)
-        payment = await service.get_payment(payment_id)
-        return Response(data=payment.to_dict(), code=201)
+        if if_none_match:
+            updated_at = await service.get_payment_updated_at(payment_id)
+            if updated_at is not None:
+                etag = make_etag(payment_id, updated_at)
+                if etag_matches(if_none_match, etag):
+                    return not_modified(etag)
+        payment = await service.get_payment_payload(payment_id)
+        if payment is None:
+            return Response(success=False, message="Payment not found", code=404)
+        return with_etag(Response(data=fragment(payment)), payload_etag(payment))
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -54,7 +146,7 @@ async def update_payment(payment_id: str, update_data: dict, db: AsyncSession =
     try:
         service = PaymentService(db)
         payment = await service.update_payment(payment_id, **update_data)
-        return Response(data=payment.to_dict(), code=201)
+        return Response(data=payment, code=201)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -87,11 +179,31 @@ async def get_all_payments(
         parent_payment_id: Optional[str] = None,
         limit: int = 10,
         offset: int = 0, 
-        db: AsyncSession = Depends(get_db)):
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_read_db)):
     try:
         service = PaymentService(db)
-        payments = await service.get_all(order_id)
-        return Response(data=[payment.to_dict() for payment in payments])
+        filters = dict(
+            order_id=order_id,
+            user_id=user_id,
+            method=method,
+            status=status,
+            amount=amount,
+            currency=currency,
+            transaction_id=transaction_id,
+            gateway_response=gateway_response,
+            created_at=created_at,
+            updated_at=updated_at,
+            refunded_amount=refunded_amount,
+            parent_payment_id=parent_payment_id,
+        )
+        if cursor is not None:
+            payments, next_cursor = await service.get_page(cursor=cursor, limit=limit, **filters)
+            return Response(data=payments, extra={"next_cursor": next_cursor})
+        payments = await service.get_all(limit=limit, offset=offset, **filters)
+        return Response(data=payments)
+    except InvalidCursorError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -9,18 +9,23 @@ echo "Step 1: Copying the environment file..."
 echo "Step 2: Running alembic_ini_generator to create alembic.ini..."
 python3 -m alembic_ini_generator
 
-# Step 3: Initialize Alembic (This creates the alembic directory with necessary files)
-echo "Step 3: Initializing Alembic..."
-alembic init -t async alembic # for asynchronous support
+# Step 3: Initialize Alembic (only when the alembic directory is not checked out)
+if [ ! -d alembic ]; then
+    echo "Step 3: Initializing Alembic..."
+    alembic init -t async alembic # for asynchronous support
+else
+    echo "Step 3: Alembic directory found, skipping init..."
+fi
 
 
 # Step 3.1: Run the Python script to update the alembic/env.py file
 echo "Step 3.1: Running alembic_env_py_generator to update alembic/env.py..."
 python3 -m alembic_env_py_generator
 
-# Step 4: Generate a new migration (with an initial migration message)
-echo "Step 4: Generating initial migration..."
-alembic revision --autogenerate -m "Initial tables"
+# Step 4: Migrations are committed under alembic/versions; create new ones with
+#   alembic revision --autogenerate -m "<message>"
+# and review them before committing instead of generating them at deploy time.
+echo "Step 4: Using committed migrations in alembic/versions..."
 
 # Step 5: Apply the migrations (Upgrade to the latest revision)
 echo "Step 5: Applying migrations (upgrading to the latest revision)..."
@@ -49,6 +49,7 @@ class UpdateOrderSchema(BaseModel):
     currency: Optional[str] = None                 # if allowed
     total_amount: Optional[float] = None           # only if it's a draft or editable order
     items: Optional[List[OrderItemSchema]] = None  # only if you're allowing item updates
+    version: Optional[int] = None                  # version the client last read; rejected if stale
 
     class Config:
         from_attributes = True
\ No newline at end of file
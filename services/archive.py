@@ -0,0 +1,318 @@
+from typing import Optional, Callable, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from sqlalchemy import Table, DateTime, Float, Integer, Numeric, delete, func, insert, literal, or_, text
+from datetime import datetime, timedelta
+from enum import Enum as PyEnum
+from models.orders import Order, OrderItem, OrderStatus
+from models.payments import Payment, PaymentStatus
+from models.archive import ArchivedOrder, ArchivedOrderItem, ArchivedPayment
+from core.database import AsyncSessionDB
+from core.config import settings, logging
+from core.utils.cache import order_cache, payment_cache
+from core.utils import metrics
+import asyncio, os, time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed when ARCHIVE_PARQUET_AFTER_DAYS is set
+    pa = None
+
+# Orders in these statuses don't change any more. OrderStatus has no "Refunded":
+# a refund is a payment status, the order itself ends up Returned.
+CLOSED_ORDER_STATUSES = (OrderStatus.Delivered, OrderStatus.Cancelled, OrderStatus.Returned)
+# An order is archived only once none of its payments can still move
+FINAL_PAYMENT_STATUSES = (
+    PaymentStatus.Completed, PaymentStatus.Failed, PaymentStatus.Refunded,
+    PaymentStatus.Cancelled, PaymentStatus.Voided,
+)
+ARCHIVE_TABLES: List[Table] = [ArchivedOrder.__table__, ArchivedOrderItem.__table__, ArchivedPayment.__table__]
+
+# Only one archiver (across all workers) moves orders at a time
+ARCHIVE_LOCK_ID = 7_215_002
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def partition_name(table: Table, month: datetime) -> str:
+    return f"{table.name}_p{month:%Y%m}"
+
+
+async def ensure_archive_partitions(db: AsyncSession, first: datetime, last: datetime) -> None:
+    """
+    Create the monthly partitions of every archive table covering `first`..`last`.
+
+    PostgreSQL only (the tables are not partitioned elsewhere). Rows outside
+    every monthly partition land in the DEFAULT one, and PostgreSQL refuses
+    to create a partition whose range the DEFAULT partition already holds
+    rows of. So a missing partition is created as a plain table, the rows of
+    its month are moved over from the DEFAULT partition and it is attached.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    month = month_start(first)
+    while month <= last:
+        bounds = {"start": month, "end": next_month(month)}
+        for table in ARCHIVE_TABLES:
+            partition = partition_name(table, month)
+            if await db.scalar(select(func.to_regclass(partition))) is not None:
+                continue
+            await db.execute(text(f"CREATE TABLE {partition} (LIKE {table.name} INCLUDING DEFAULTS)"))
+            await db.execute(text(
+                f"WITH moved AS (DELETE FROM {table.name}_default"
+                f" WHERE created_at >= :start AND created_at < :end RETURNING *)"
+                f" INSERT INTO {partition} SELECT * FROM moved"
+            ), bounds)
+            await db.execute(text(
+                f"ALTER TABLE {table.name} ATTACH PARTITION {partition} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+            ))
+        month = next_month(month)
+
+
+def _arrow_schema(table: Table):
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Numeric):
+            arrow_type = pa.decimal128(column.type.precision, column.type.scale)
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+    return pa.schema(fields)
+
+
+class OrderArchiver:
+    """
+    Background task that moves closed orders out of the hot tables.
+
+    Orders in a closed status created more than `older_than` ago are moved,
+    together with their items and payments, to `orders_archive`,
+    `order_items_archive` and `payments_archive` (range partitioned by month
+    on PostgreSQL), `batch_size` orders per transaction. This keeps the hot
+    tables, their indexes and their vacuum work bounded by the recent orders.
+    Archived orders stay readable through OrderService.
+
+    With `parquet_after` set, whole archive months older than that are also
+    exported to Parquet files under `parquet_dir` and removed from the
+    database (their partitions are dropped); those orders are then only
+    available from the files.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionDB,
+        older_than: timedelta = timedelta(days=settings.ARCHIVE_AFTER_DAYS),
+        batch_size: int = settings.ARCHIVE_BATCH_SIZE,
+        interval: float = settings.ARCHIVE_INTERVAL,
+        parquet_dir: str = settings.ARCHIVE_PARQUET_DIR,
+        parquet_after: Optional[timedelta] = (
+            timedelta(days=settings.ARCHIVE_PARQUET_AFTER_DAYS) if settings.ARCHIVE_PARQUET_AFTER_DAYS else None
+        ),
+    ):
+        if parquet_after is not None and pa is None:
+            raise RuntimeError("Parquet offload of the archive requires pyarrow to be installed.")
+        self.session_factory = session_factory
+        self.older_than = older_than
+        self.batch_size = batch_size
+        self.interval = interval
+        self.parquet_dir = parquet_dir
+        self.parquet_after = parquet_after
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        while not self._stopping.is_set():
+            try:
+                archived = await self.archive_batch()
+                if archived >= self.batch_size:
+                    continue  # more orders are probably waiting, don't sleep
+                if self.parquet_after is not None:
+                    await self.offload_to_parquet()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"[Archive] Run failed, retrying in {self.interval:.0f}s: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopping.set()
+
+    async def archive_batch(self) -> int:
+        """
+        Move the oldest archivable orders, with their items and payments.
+
+        Orders with a payment that is not final yet, or with a payment that a
+        payment of another order refers to (parent_payment_id), are left alone.
+
+        Returns:
+        - int: Number of orders archived in this batch.
+        """
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - self.older_than
+        async with self.session_factory() as session:
+            async with session.begin():
+                if session.bind.dialect.name == "postgresql":
+                    locked = await session.scalar(select(func.pg_try_advisory_xact_lock(ARCHIVE_LOCK_ID)))
+                    if not locked:
+                        return 0
+
+                child = aliased(Payment)
+                open_payment = (
+                    select(Payment.id)
+                    .where(Payment.order_id == Order.id, Payment.status.not_in(FINAL_PAYMENT_STATUSES))
+                    .exists()
+                )
+                referenced_elsewhere = (
+                    select(child.id)
+                    .join(Payment, child.parent_payment_id == Payment.id)
+                    .where(Payment.order_id == Order.id, or_(child.order_id.is_(None), child.order_id != Order.id))
+                    .exists()
+                )
+                rows = (await session.execute(
+                    select(Order.id, Order.created_at)
+                    .where(
+                        Order.status.in_(CLOSED_ORDER_STATUSES),
+                        Order.created_at < cutoff,
+                        ~open_payment,
+                        ~referenced_elsewhere,
+                    )
+                    .order_by(Order.created_at)
+                    .limit(self.batch_size)
+                    .with_for_update(of=Order, skip_locked=True)
+                )).all()
+                if not rows:
+                    return 0
+
+                order_ids = [row.id for row in rows]
+                # Payments are partitioned on their own created_at, which may be months after the order's
+                first_payment, last_payment = (await session.execute(
+                    select(func.min(Payment.created_at), func.max(Payment.created_at))
+                    .where(Payment.order_id.in_(order_ids))
+                )).one()
+                await ensure_archive_partitions(
+                    session,
+                    min(rows[0].created_at, first_payment or rows[0].created_at),
+                    max(rows[-1].created_at, last_payment or rows[-1].created_at),
+                )
+
+                archived_at = literal(datetime.utcnow(), DateTime)
+                order_columns = list(Order.__table__.columns)
+                await session.execute(
+                    insert(ArchivedOrder).from_select(
+                        [column.name for column in order_columns] + ["archived_at"],
+                        select(*order_columns, archived_at).where(Order.id.in_(order_ids)),
+                    )
+                )
+                item_columns = list(OrderItem.__table__.columns)
+                await session.execute(
+                    insert(ArchivedOrderItem).from_select(
+                        [column.name for column in item_columns] + ["created_at"],
+                        select(*item_columns, Order.created_at)
+                        .join(Order, OrderItem.order_id == Order.id)
+                        .where(OrderItem.order_id.in_(order_ids)),
+                    )
+                )
+                payment_columns = list(Payment.__table__.columns)
+                await session.execute(
+                    insert(ArchivedPayment).from_select(
+                        [column.name for column in payment_columns] + ["archived_at"],
+                        select(*payment_columns, archived_at).where(Payment.order_id.in_(order_ids)),
+                    )
+                )
+
+                payment_ids = (await session.execute(
+                    delete(Payment).where(Payment.order_id.in_(order_ids)).returning(Payment.id)
+                )).scalars().all()
+                await session.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+                await session.execute(delete(Order).where(Order.id.in_(order_ids)))
+
+        await order_cache.invalidate(*order_ids)
+        await payment_cache.invalidate(*payment_ids)
+        metrics.ARCHIVED_ORDERS.inc(len(order_ids))
+        metrics.ARCHIVE_BATCH_SECONDS.observe(time.perf_counter() - started)
+        logging.info(f"[Archive] Archived {len(order_ids)} orders and {len(payment_ids)} payments")
+        return len(order_ids)
+
+    async def offload_to_parquet(self) -> List[str]:
+        """
+        Export whole archive months older than `parquet_after` to Parquet and drop them.
+
+        Each table and month becomes `<parquet_dir>/<table>/<YYYY-MM>.parquet`
+        (zstd compressed), written to a temporary file and renamed once
+        complete, and is removed from the database only after that.
+
+        Returns:
+        - list: Paths of the files written.
+        """
+        if pa is None:
+            raise RuntimeError("Parquet offload of the archive requires pyarrow to be installed.")
+        before = month_start(datetime.utcnow() - self.parquet_after)
+        written = []
+        for table in ARCHIVE_TABLES:
+            async with self.session_factory() as session:
+                oldest = await session.scalar(select(func.min(table.c.created_at)))
+            if oldest is None:
+                continue
+            month = month_start(oldest)
+            while month < before:
+                path = await self._offload_month(table, month)
+                if path:
+                    written.append(path)
+                month = next_month(month)
+        return written
+
+    async def _offload_month(self, table: Table, month: datetime) -> Optional[str]:
+        in_month = (table.c.created_at >= month, table.c.created_at < next_month(month))
+        directory = os.path.join(self.parquet_dir, table.name)
+        path = os.path.join(directory, f"{month:%Y-%m}.parquet")
+        os.makedirs(directory, exist_ok=True)
+
+        schema = _arrow_schema(table)
+        writer, rows_written = None, 0
+        async with self.session_factory() as session:
+            result = await session.stream(
+                select(*table.columns).where(*in_month).execution_options(yield_per=10_000)
+            )
+            try:
+                async for chunk in result.partitions():
+                    records = [
+                        {key: value.value if isinstance(value, PyEnum) else value for key, value in row._mapping.items()}
+                        for row in chunk
+                    ]
+                    if writer is None:
+                        writer = pq.ParquetWriter(path + ".tmp", schema, compression="zstd")
+                    await asyncio.to_thread(writer.write_table, pa.Table.from_pylist(records, schema=schema))
+                    rows_written += len(records)
+            finally:
+                if writer is not None:
+                    writer.close()
+        if writer is None:
+            return None
+        os.replace(path + ".tmp", path)
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                if session.bind.dialect.name == "postgresql":
+                    partition = partition_name(table, month)
+                    if await session.scalar(select(func.to_regclass(partition))) is not None:
+                        await session.execute(text(f"ALTER TABLE {table.name} DETACH PARTITION {partition}"))
+                        await session.execute(text(f"DROP TABLE {partition}"))
+                # Whatever is left (e.g. rows in the DEFAULT partition)
+                await session.execute(table.delete().where(*in_month))
+        logging.info(f"[Archive] Offloaded {rows_written} rows of {table.name} to {path}")
+        return path
@@ -0,0 +1,251 @@
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import insert, update, delete, or_
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import Response as StarletteResponse
+from datetime import datetime, timedelta
+from models.idempotency import IdempotencyKey
+from core.database import AsyncSessionDB, CHAR_LENGTH
+from core.config import settings, logging
+from core.utils.cache import TTLCache
+from core.utils.latency import not_latency
+import asyncio, hashlib, time
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# (fingerprint, status_code, body) of a recorded response
+StoredResponse = Tuple[str, int, bytes]
+
+# Recently recorded responses of this worker, so hot retries skip the database
+_hot_responses = TTLCache(max_entries=settings.IDEMPOTENCY_HOT_CACHE_ENTRIES, ttl=settings.IDEMPOTENCY_HOT_CACHE_TTL)
+# Requests of this worker currently executing, by (scope, key)
+_inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+class IdempotencyKeyReusedError(Exception):
+    """The key was already used for a request with a different payload."""
+
+
+class IdempotencyInProgressError(Exception):
+    """Another request with the same key is still running."""
+
+
+def request_fingerprint(payload: bytes | str) -> str:
+    """sha256 of the request payload; a key may only be replayed with the same payload."""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class IdempotencyService:
+    """
+    Execute a request at most once per Idempotency-Key and replay its response afterwards.
+
+    Lookups go to the worker's hot cache, then to requests of the same worker
+    that are still running (the duplicate waits for that result), then to the
+    `idempotency_keys` table. Responses with a 5xx status are not recorded, so
+    the client can retry them.
+
+    The handler runs in a savepoint of the transaction that claims the key:
+    its commits only release the savepoint, and the resource it creates, the
+    claim and the recorded response are committed together. A worker dying
+    in between leaves nothing behind, so the retry runs the handler once.
+
+    Claims made before responses were recorded this way may have been
+    committed without a response; such a key is taken over by the next
+    request once its lease (`lease` after the claim) has lapsed.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        scope: str,
+        ttl: timedelta = timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        wait: float = settings.IDEMPOTENCY_WAIT_SECONDS,
+        lease: timedelta = timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS),
+    ):
+        self.db = db
+        self.scope = scope
+        self.ttl = ttl
+        self.wait = wait
+        self.lease = lease
+
+    async def run(
+        self,
+        key: Optional[str],
+        fingerprint: str,
+        handler: Callable[[AsyncSession], Awaitable[StarletteResponse]],
+    ) -> StarletteResponse:
+        """
+        Run `handler` unless a response for `key` was already recorded.
+
+        Parameters:
+        - key: The Idempotency-Key header value; without one the handler just runs.
+        - fingerprint: request_fingerprint() of the request payload.
+        - handler: Performs the request with the session it is given and returns
+          its response. Its commits become final together with the recorded response.
+
+        Raises:
+        - ValueError: The key is too long.
+        - IdempotencyKeyReusedError: The key belongs to a different payload.
+        - IdempotencyInProgressError: A request with the key is still running elsewhere.
+        """
+        if not key:
+            return await handler(self.db)
+        if len(key) > CHAR_LENGTH:
+            raise ValueError(f"{IDEMPOTENCY_HEADER} must be at most {CHAR_LENGTH} characters")
+
+        cache_key = (self.scope, key)
+        stored = _hot_responses.get(cache_key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        pending = _inflight.get(cache_key)
+        if pending is not None:
+            with not_latency():
+                stored = await asyncio.shield(pending)
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+            # The first attempt failed without recording anything, try again
+            return await self.run(key, fingerprint, handler)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[cache_key] = future
+        stored = None
+        try:
+            stored, response = await self._execute(key, fingerprint, handler)
+            return response
+        finally:
+            del _inflight[cache_key]
+            future.set_result(stored)
+
+    async def _execute(self, key: str, fingerprint: str, handler) -> Tuple[Optional[StoredResponse], StarletteResponse]:
+        for _ in range(2):
+            now = datetime.utcnow()
+            try:
+                # Blocks while a concurrent transaction holds the same key
+                await self.db.execute(insert(IdempotencyKey).values(
+                    scope=self.scope, key=key, fingerprint=fingerprint,
+                    created_at=now, expires_at=now + self.ttl, locked_until=now + self.lease,
+                ))
+                break
+            except IntegrityError:
+                await self.db.rollback()
+            with not_latency():
+                stored = await self._wait_for_response(key, fingerprint)
+            if stored is not None:
+                return stored, self._replay(stored, fingerprint)
+            # The key expired, its request failed or its lease lapsed; claim it again
+        else:
+            raise IdempotencyInProgressError(f"A request with {IDEMPOTENCY_HEADER} {key!r} is in progress")
+
+        async with AsyncSession(
+            bind=await self.db.connection(), join_transaction_mode="create_savepoint", expire_on_commit=False
+        ) as session:
+            response = await handler(session)
+        if response.status_code >= 500:
+            await self._release(key)
+            return None, response
+
+        stored = (fingerprint, response.status_code, bytes(response.body))
+        await self._record(key, stored)
+        _hot_responses.set((self.scope, key), stored)
+        return stored, response
+
+    async def _record(self, key: str, stored: StoredResponse) -> None:
+        """Store the response with the claim and commit both, with everything the handler wrote."""
+        await self.db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.scope == self.scope, IdempotencyKey.key == key)
+            .values(status_code=stored[1], response_body=stored[2])
+        )
+        await self.db.commit()
+
+    async def _wait_for_response(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Poll the stored key until its response is recorded; None if the key is gone, expired or its lease lapsed."""
+        deadline = time.monotonic() + self.wait
+        while True:
+            row = (await self.db.execute(
+                select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.response_body,
+                       IdempotencyKey.expires_at, IdempotencyKey.locked_until)
+                .where(IdempotencyKey.scope == self.scope, IdempotencyKey.key == key)
+            )).one_or_none()
+            # End the read transaction so the next poll sees new commits
+            await self.db.rollback()
+
+            if row is None:
+                return None
+            now = datetime.utcnow()
+            if row.expires_at < now:
+                await self._release_stale(key, now)
+                return None
+            if row.fingerprint != fingerprint:
+                raise IdempotencyKeyReusedError(f"{IDEMPOTENCY_HEADER} {key!r} was used for a different request")
+            if row.status_code is None and (row.locked_until is None or row.locked_until < now):
+                # A claim committed without its response (see the class docstring)
+                await self._release_stale(key, now)
+                return None
+            if row.status_code is not None:
+                stored = (row.fingerprint, row.status_code, row.response_body)
+                _hot_responses.set((self.scope, key), stored)
+                return stored
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgressError(f"A request with {IDEMPOTENCY_HEADER} {key!r} is in progress")
+            await asyncio.sleep(0.05)
+
+    async def _release(self, key: str) -> None:
+        await self.db.rollback()
+        await self.db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.scope == self.scope, IdempotencyKey.key == key)
+        )
+        await self.db.commit()
+
+    async def _release_stale(self, key: str, now: datetime) -> None:
+        """Delete the key if it is still expired or unrecorded past its lease (not a claim made since)."""
+        await self.db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.scope == self.scope,
+                IdempotencyKey.key == key,
+                or_(
+                    IdempotencyKey.expires_at < now,
+                    IdempotencyKey.status_code.is_(None)
+                    & or_(IdempotencyKey.locked_until.is_(None), IdempotencyKey.locked_until < now),
+                ),
+            )
+        )
+        await self.db.commit()
+
+    @staticmethod
+    def _replay(stored: StoredResponse, fingerprint: str) -> StarletteResponse:
+        stored_fingerprint, status_code, body = stored
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReusedError(f"{IDEMPOTENCY_HEADER} was used for a different request")
+        return StarletteResponse(
+            content=body, status_code=status_code, media_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+
+async def purge_expired_keys(session_factory: Callable[[], AsyncSession] = AsyncSessionDB) -> int:
+    """Delete idempotency keys past their TTL."""
+    async with session_factory() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow())
+            )
+    return result.rowcount
+
+
+async def purge_expired_keys_forever(interval: float = settings.IDEMPOTENCY_PURGE_INTERVAL):
+    while True:
+        try:
+            purged = await purge_expired_keys()
+            if purged:
+                logging.info(f"[Idempotency] Purged {purged} expired keys")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"[Idempotency] Failed to purge expired keys: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,258 @@
+from typing import Optional, List, Dict, Any, Tuple, Literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, func, literal_column, text, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from models.order_stats import OrderStatsHourly
+from models.orders import Order, OrderStatus
+from models.archive import ArchivedOrder
+from datetime import datetime
+
+Interval = Literal["hour", "day"]
+
+# (hour bucket, currency, status) -> [order count, gmv]
+StatsDeltas = Dict[Tuple[datetime, str, OrderStatus], List[float]]
+
+# Order lifecycle, in funnel order; the remaining statuses are terminal exits
+FUNNEL_STATUSES = [OrderStatus.Pending, OrderStatus.Processing, OrderStatus.Shipped, OrderStatus.Delivered]
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def add_order_delta(
+    deltas: StatsDeltas,
+    created_at: datetime,
+    currency: str,
+    status: OrderStatus,
+    total_amount: float,
+    sign: int = 1,
+) -> None:
+    """Count an order into (sign=1) or out of (sign=-1) its rollup bucket."""
+    if created_at is None:
+        # Not bucketed by rebuild_order_stats either
+        return
+    counters = deltas.setdefault((hour_bucket(created_at), currency, status), [0, 0.0])
+    counters[0] += sign
+    counters[1] += sign * total_amount
+
+
+async def apply_stats_deltas(db: AsyncSession, deltas: StatsDeltas) -> None:
+    """
+    Add `deltas` to the hourly rollup within the caller's transaction.
+
+    One INSERT ... ON CONFLICT DO UPDATE for all touched buckets. Rows are
+    written in key order so concurrent writers lock them in the same order.
+    """
+    rows = [
+        {"bucket": bucket, "currency": currency, "status": status, "order_count": count, "gmv": gmv}
+        for (bucket, currency, status), (count, gmv) in sorted(
+            deltas.items(), key=lambda entry: (entry[0][0], entry[0][1], entry[0][2].value)
+        )
+        if count or gmv
+    ]
+    if not rows:
+        return
+    dialect = sqlite if db.get_bind().dialect.name == "sqlite" else postgresql
+    stmt = dialect.insert(OrderStatsHourly).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OrderStatsHourly.bucket, OrderStatsHourly.currency, OrderStatsHourly.status],
+        set_={
+            "order_count": OrderStatsHourly.order_count + stmt.excluded.order_count,
+            "gmv": OrderStatsHourly.gmv + stmt.excluded.gmv,
+        },
+    )
+    await db.execute(stmt)
+
+
+def _truncate(column, interval: Interval, dialect_name: str):
+    """SQL expression truncating a timestamp to the start of its hour or day."""
+    if dialect_name == "sqlite":
+        # Same text format SQLAlchemy stores DateTime values in, so buckets compare equal
+        fmt = "%Y-%m-%d %H:00:00.000000" if interval == "hour" else "%Y-%m-%d 00:00:00.000000"
+        return func.strftime(fmt, column)
+    return func.date_trunc(interval, column)
+
+
+def _as_datetime(value) -> datetime:
+    # SQLite returns the truncated bucket as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+async def rebuild_order_stats(db: AsyncSession) -> int:
+    """
+    Recompute the rollup from the orders tables with one INSERT ... SELECT.
+
+    Archived orders are counted too, so archiving doesn't change the stats.
+
+    Writers are blocked for the duration on PostgreSQL, so run it off-peak.
+
+    Returns:
+    - int: Number of buckets written.
+    """
+    dialect_name = db.get_bind().dialect.name
+    try:
+        if dialect_name == "postgresql":
+            await db.execute(text("LOCK TABLE orders IN SHARE MODE"))
+        await db.execute(delete(OrderStatsHourly))
+        orders = union_all(*(
+            select(model.created_at, model.currency, model.status, model.total_amount)
+            .where(model.created_at.is_not(None))
+            for model in (Order, ArchivedOrder)
+        )).subquery()
+        bucket = _truncate(orders.c.created_at, "hour", dialect_name)
+        source = (
+            select(bucket, orders.c.currency, orders.c.status, func.count(), func.coalesce(func.sum(orders.c.total_amount), 0))
+            .group_by(bucket, orders.c.currency, orders.c.status)
+        )
+        result = await db.execute(
+            OrderStatsHourly.__table__.insert().from_select(
+                ["bucket", "currency", "status", "order_count", "gmv"], source
+            )
+        )
+        await db.commit()
+        return result.rowcount
+    except Exception as e:
+        await db.rollback()
+        raise e
+
+
+class OrderStatsService:
+    """
+    Order analytics read from the hourly rollup (`order_stats_hourly`).
+
+    Every query aggregates rollup buckets, so its cost depends on the time
+    range and not on the number of orders. Ranges are matched on whole hours:
+    `start_date` is rounded down to its hour. Statuses are current statuses,
+    i.e. an order created on Monday and delivered on Friday counts as
+    Delivered in Monday's bucket.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _filters(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        currency: Optional[str],
+        status: Optional[OrderStatus] = None,
+    ) -> list:
+        filters = []
+        if start_date:
+            filters.append(OrderStatsHourly.bucket >= hour_bucket(start_date))
+        if end_date:
+            filters.append(OrderStatsHourly.bucket <= end_date)
+        if currency:
+            filters.append(OrderStatsHourly.currency == currency)
+        if status:
+            filters.append(OrderStatsHourly.status == status)
+        return filters
+
+    async def get_series(
+        self,
+        interval: Interval = "day",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        currency: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        by_status: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Order count, GMV and average order value per time bucket and currency.
+
+        Parameters:
+        - interval: "hour" or "day" (UTC) buckets.
+        - status: Only count orders currently in this status.
+        - by_status: Also split every bucket by status.
+
+        Returns:
+        - list: One row per (bucket, currency[, status]), oldest bucket first.
+        """
+        bucket = (
+            OrderStatsHourly.bucket if interval == "hour"
+            else _truncate(OrderStatsHourly.bucket, interval, self.db.get_bind().dialect.name)
+        ).label("bucket")
+        order_count = func.sum(OrderStatsHourly.order_count)
+        gmv = func.sum(OrderStatsHourly.gmv)
+        keys = [bucket, OrderStatsHourly.currency] + ([OrderStatsHourly.status] if by_status else [])
+
+        query = (
+            select(*keys, order_count.label("order_count"), gmv.label("gmv"))
+            .where(*self._filters(start_date, end_date, currency, status))
+            .group_by(*keys)
+            .having(order_count > 0)
+            .order_by(literal_column("bucket"), OrderStatsHourly.currency)
+        )
+        rows = (await self.db.execute(query)).all()
+        return [
+            {
+                "bucket": _as_datetime(row.bucket).isoformat(),
+                "currency": row.currency,
+                **({"status": row.status.value} if by_status else {}),
+                "order_count": row.order_count,
+                "gmv": round(row.gmv, 2),
+                "average_order_value": round(row.gmv / row.order_count, 2),
+            }
+            for row in rows
+        ]
+
+    async def get_funnel(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        currency: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Status breakdown of the orders created in the range, per currency.
+
+        Returns:
+        - list: Per currency, the totals and, for every status, its count, GMV
+          and share of the currency's orders. Funnel statuses (Pending →
+          Processing → Shipped → Delivered) also get `reached`, the orders
+          currently at that step or further along.
+        """
+        query = (
+            select(
+                OrderStatsHourly.currency,
+                OrderStatsHourly.status,
+                func.sum(OrderStatsHourly.order_count).label("order_count"),
+                func.sum(OrderStatsHourly.gmv).label("gmv"),
+            )
+            .where(*self._filters(start_date, end_date, currency))
+            .group_by(OrderStatsHourly.currency, OrderStatsHourly.status)
+            .order_by(OrderStatsHourly.currency)
+        )
+        by_currency: Dict[str, Dict[OrderStatus, Any]] = {}
+        for row in (await self.db.execute(query)).all():
+            if row.order_count:
+                by_currency.setdefault(row.currency, {})[row.status] = row
+
+        funnels = []
+        for currency_code, statuses in by_currency.items():
+            total_count = sum(row.order_count for row in statuses.values())
+            total_gmv = sum(row.gmv for row in statuses.values())
+            # Every order starts Pending; past that only the current status is known, so
+            # terminal exits (Cancelled, Returned, Failed) count towards Pending alone
+            reached, further = {OrderStatus.Pending.value: total_count}, 0
+            for status in reversed(FUNNEL_STATUSES[1:]):
+                further += statuses[status].order_count if status in statuses else 0
+                reached[status.value] = further
+            funnels.append({
+                "currency": currency_code,
+                "order_count": total_count,
+                "gmv": round(total_gmv, 2),
+                "average_order_value": round(total_gmv / total_count, 2),
+                "statuses": [
+                    {
+                        "status": status.value,
+                        "order_count": statuses[status].order_count if status in statuses else 0,
+                        "gmv": round(statuses[status].gmv, 2) if status in statuses else 0.0,
+                        "share": round(statuses[status].order_count / total_count, 4) if status in statuses else 0.0,
+                        **({"reached": reached[status.value]} if status.value in reached else {}),
+                    }
+                    for status in OrderStatus
+                ],
+            })
+        return funnels
@@ -1,18 +1,183 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import update, delete,and_
+from sqlalchemy import update, delete, and_, insert, func
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
 from core.utils.generator import generator
 from models.orders import Order, OrderItem, OrderStatus  # adjust import
+from models.archive import ArchivedOrder, ArchivedOrderItem
 from schemas.orders import OrderSchema, OrderItemSchema,UpdateOrderSchema,OrderFilterSchema
 from core.config import settings
-from core.utils.kafka import KafkaProducer, send_kafka_message, is_kafka_available
+from services.outbox import order_event_row
+from services.order_stats import StatsDeltas, add_order_delta, apply_stats_deltas
+from core.utils.pagination import keyset_paginate, split_page
+from core.utils.cache import order_cache
+from models.outbox import OrderOutbox
 from datetime import datetime
 
-kafka_producer = KafkaProducer(broker=settings.KAFKA_BOOTSTRAP_SERVERS,
-                                topic=str(settings.KAFKA_TOPIC))
+
+# Loader for every query whose orders are returned with their items. One extra
+# SELECT ... WHERE order_id IN (...) per page keeps LIMIT/OFFSET on plain order rows.
+ORDER_LOADER = selectinload(Order.items)
+
+
+class ConcurrentUpdateError(Exception):
+    """The order was changed by someone else since the version the caller read."""
+
+
+class OrderNotFoundError(LookupError):
+    """The order (or order item) to change doesn't exist."""
+
+
+def validate_order(order_in: OrderSchema) -> None:
+    """Business checks that pydantic can't express; raises ValueError."""
+    if order_in.total_amount < 0:
+        raise ValueError("total_amount must not be negative")
+    validate_items(order_in.items or [])
+
+
+def validate_items(items: List[OrderItemSchema]) -> None:
+    for item in items:
+        if item.quantity <= 0:
+            raise ValueError(f"Item {item.product_id}: quantity must be positive")
+        if item.price_per_unit < 0:
+            raise ValueError(f"Item {item.product_id}: price_per_unit must not be negative")
+
+
+def build_order(order_in: OrderSchema) -> Order:
+    """Build a transient Order, with its items, from the request payload."""
+    order_id = str(generator.get_id())
+    now = datetime.utcnow()
+    return Order(id = order_id, 
+        user_id=order_in.user_id, 
+        total_amount=order_in.total_amount, 
+        currency=order_in.currency,
+        created_at=now,
+        updated_at=now, 
+        version=1,
+        status=OrderStatus(order_in.status),
+        items=[
+            OrderItem(
+                id = str(generator.get_id()),
+                order_id=order_id,
+                product_id=item_data.product_id,
+                quantity=item_data.quantity,
+                price_per_unit=item_data.price_per_unit,
+                total_price = item_data.total_price if item_data.total_price is not None else item_data.quantity * item_data.price_per_unit
+            )
+            for item_data in order_in.items or []
+        ]
+    )
+
+
+def _order_row(order: Order) -> Dict[str, Any]:
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "status": order.status,
+        "total_amount": order.total_amount,
+        "currency": order.currency,
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "version": order.version,
+    }
+
+
+def _item_rows(order: Order) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": item.id,
+            "order_id": item.order_id,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "price_per_unit": item.price_per_unit,
+            "total_price": item.total_price,
+        }
+        for item in order.items
+    ]
+
+def diff_items(
+    order_id: str, existing: List[Any], incoming: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+    """
+    Compare the stored items of an order with the requested ones, keyed by product_id.
+
+    Parameters:
+    - order_id: The order the items belong to.
+    - existing: Stored item rows (id, product_id, quantity, price_per_unit, total_price).
+    - incoming: Requested items as dicts; product_id must be unique.
+
+    Returns:
+    - tuple: Rows to insert, rows to update (with their primary key) and item
+      ids to delete. Unchanged items appear in none of them.
+    """
+    wanted: Dict[str, Dict[str, Any]] = {}
+    for item in incoming:
+        if item["product_id"] in wanted:
+            raise ValueError(f"Item {item['product_id']}: product_id appears more than once")
+        total_price = item.get("total_price")
+        wanted[item["product_id"]] = {
+            "product_id": item["product_id"],
+            "quantity": item["quantity"],
+            "price_per_unit": item["price_per_unit"],
+            "total_price": total_price if total_price is not None else item["quantity"] * item["price_per_unit"],
+        }
+
+    updates, deletes, seen = [], [], set()
+    for row in existing:
+        values = wanted.get(row.product_id)
+        if values is None or row.product_id in seen:
+            # Dropped from the order (or a duplicate line left by the old replace-all update)
+            deletes.append(row.id)
+            continue
+        seen.add(row.product_id)
+        if (row.quantity, row.price_per_unit, row.total_price) != (
+            values["quantity"], values["price_per_unit"], values["total_price"]
+        ):
+            updates.append({"id": row.id, **values})
+
+    inserts = [
+        {"id": str(generator.get_id()), "order_id": order_id, **values}
+        for product_id, values in wanted.items()
+        if product_id not in seen
+    ]
+    return inserts, updates, deletes
+
+
+async def bump_order_version(db: AsyncSession, order_id: str, total_delta: float) -> None:
+    """
+    Mark the order as changed by a write to one of its items.
+
+    The version and updated_at feed optimistic concurrency checks and the
+    ETag. total_amount is shifted by `total_delta`, the change in the item's
+    total_price, so adjustments the client put into the total (shipping,
+    discounts) are kept; the change moves the order's GMV in the stats rollup
+    in the same transaction. The UPDATE locks the order row, so concurrent
+    item writes apply their deltas one after another.
+
+    Call it before adding a new item to the session: a pending item of a
+    missing order would be autoflushed first and fail its foreign key.
+
+    Raises:
+    - OrderNotFoundError: If the order doesn't exist.
+    """
+    updated = (await db.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(version=Order.version + 1, updated_at=datetime.utcnow(), total_amount=Order.total_amount + total_delta)
+        .returning(Order.created_at, Order.currency, Order.status, Order.total_amount)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    if updated is None:
+        raise OrderNotFoundError(f"Order with id '{order_id}' not found.")
+    if total_delta:
+        deltas: StatsDeltas = {}
+        add_order_delta(deltas, updated.created_at, updated.currency, updated.status, updated.total_amount - total_delta, sign=-1)
+        add_order_delta(deltas, *updated)
+        await apply_stats_deltas(db, deltas)
+
 
 class OrderService:
     def __init__(self, db: AsyncSession):
@@ -25,119 +190,248 @@ class OrderService:
             #           Updates inventory accordingly.(decrease item count on the service)
             #.     else : raise e
             #      Order status: Pending → Processing
-            order_id = str(generator.get_id())
-            order = Order(id = order_id, 
-                user_id=order_in.user_id, 
-                total_amount=order_in.total_amount, 
-                currency=order_in.currency,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(), 
-                status=order_in.status
-            )
-            self.db.add(order)
-            await self.db.flush()  # flush to get order.id
-
-            if order_in.items:
-                for item_data in order_in.items:
-                    item = OrderItem(
-                        id = str(generator.get_id()),
-                        order_id=order_id,
-                        product_id=item_data.product_id,
-                        quantity=item_data.quantity,
-                        price_per_unit=item_data.price_per_unit,
-                        total_price = item_data.total_price if item_data.total_price is not None else item_data.quantity * item_data.price_per_unit
-                    )
-                    self.db.add(item)
+            validate_order(order_in)
+            order = build_order(order_in)
 
+            # One INSERT each for the order, its items and the outbox event (committed
+            # together; OutboxRelay publishes it to Kafka). Every column value is
+            # generated here, so the in-memory order is returned without a re-read.
+            await self._insert_orders([order])
             await self.db.commit()
-
-            
-            # Reload product with relationships eagerly loaded
-            order = await self.get_order_by_id(order_id)
-            
-            # Kafka background task
-            await kafka_producer.start()
-            await kafka_producer.send({
-                    "order": order.to_dict(),
-                    "action": "create"
-                })
-            await kafka_producer.stop()
-            await self.db.refresh(order)
             return order
         except Exception as e:
             await self.db.rollback()
             raise e
 
+    async def create_orders_bulk(self, orders_in: List[OrderSchema], partial: bool = False) -> List[Dict[str, Any]]:
+        """
+        Create many orders in one transaction.
+
+        Orders, items and their outbox events are written with one multi-row
+        INSERT per table (batched by the driver for very large payloads), so the
+        whole import costs a handful of round trips instead of several per order.
+
+        Parameters:
+        - orders_in: The orders to create.
+        - partial: When False any invalid order rejects the whole batch. When
+          True the valid orders are stored and the invalid ones are reported.
+
+        Returns:
+        - list: One result per input order, in input order, with `index`,
+          `success` and either `order` or `error`.
+        """
+        results: List[Dict[str, Any]] = []
+        orders: List[Order] = []
+        for index, order_in in enumerate(orders_in):
+            try:
+                validate_order(order_in)
+                order = build_order(order_in)
+                orders.append(order)
+                results.append({"index": index, "success": True, "id": order.id, "order": order})
+            except ValueError as e:
+                results.append({"index": index, "success": False, "error": str(e)})
+
+        failed = [r for r in results if not r["success"]]
+        if failed and not partial:
+            raise ValueError(f"{len(failed)} of {len(orders_in)} orders are invalid: " +
+                             "; ".join(f"#{r['index']}: {r['error']}" for r in failed))
+
+        try:
+            if orders:
+                try:
+                    async with self.db.begin_nested():
+                        await self._insert_orders(orders)
+                except IntegrityError:
+                    if not partial:
+                        raise
+                    # Find the offending rows: retry each order in its own savepoint
+                    by_id = {r.get("id"): r for r in results}
+                    for order in orders:
+                        try:
+                            async with self.db.begin_nested():
+                                await self._insert_orders([order])
+                        except IntegrityError as e:
+                            result = by_id[order.id]
+                            result.update(success=False, error=str(e.orig))
+                            result.pop("order", None)
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+        return results
+
+    async def _insert_orders(self, orders: List[Order]) -> None:
+        """Multi-row INSERT of orders, their items and their "create" outbox events, plus the stats rollup."""
+        await self.db.execute(insert(Order), [_order_row(order) for order in orders])
+        item_rows = [row for order in orders for row in _item_rows(order)]
+        if item_rows:
+            await self.db.execute(insert(OrderItem), item_rows)
+        await self.db.execute(insert(OrderOutbox), [order_event_row(order.to_dict(), "create") for order in orders])
+
+        deltas: StatsDeltas = {}
+        for order in orders:
+            add_order_delta(deltas, order.created_at, order.currency, order.status, order.total_amount)
+        await apply_stats_deltas(self.db, deltas)
+
     async def get_order_by_id(self, order_id: str) -> Optional[Order]:
-        result = await self.db.execute(select(Order)
-                    .options(
-                        selectinload(Order.items)
-                    ).where(Order.id == order_id))
-        return result.scalar_one_or_none()
+        """The order with its items, looked up in the archive when it is not a live order."""
+        result = await self.db.execute(select(Order).options(ORDER_LOADER).where(Order.id == order_id))
+        order = result.scalar_one_or_none()
+        if order is None:
+            result = await self.db.execute(
+                select(ArchivedOrder).options(selectinload(ArchivedOrder.items)).where(ArchivedOrder.id == order_id)
+            )
+            order = result.scalar_one_or_none()
+        return order
+
+    async def get_order_state(self, order_id: str) -> Optional[Tuple[datetime, int]]:
+        """(updated_at, version) of an order, which change on every write to it or its items."""
+        result = await self.db.execute(select(Order.updated_at, Order.version).where(Order.id == order_id))
+        state = result.one_or_none()
+        if state is None:
+            result = await self.db.execute(
+                select(ArchivedOrder.updated_at, ArchivedOrder.version).where(ArchivedOrder.id == order_id)
+            )
+            state = result.one_or_none()
+        return state
 
-    async def update_order(self, order_id: str, update_data: UpdateOrderSchema) -> Optional[Order]:
-        order = await self.get_order_by_id(order_id)
-        if not order:
-            raise Exception("Order not found")
+    async def get_order_payload(self, order_id: str) -> Optional[bytes]:
+        """JSON encoded order (with items) through the read-through cache; None if it doesn't exist."""
+        return await order_cache.get_or_load(order_id, lambda: self.get_order_by_id(order_id))
 
+    async def update_order(self, order_id: str, update_data: UpdateOrderSchema) -> Optional[Order]:
+        """
+        Update an order and, when `items` is given, make its items match that list.
+
+        Items are diffed against the stored ones by product_id and applied with
+        at most one INSERT, one UPDATE and one DELETE statement, so unchanged
+        lines are not touched. A total_amount given in `update_data` is stored
+        as is; otherwise item changes shift the stored total by the change in
+        the items' total_price, the same rule the item endpoints follow, so
+        shipping or discounts included in the total are kept.
+
+        The order's version is incremented. The update only applies if the
+        version is still the one given in `update_data.version` (or, when that
+        is omitted, the one read at the start); otherwise ConcurrentUpdateError
+        is raised and nothing is written.
+
+        Changes to status, currency or total_amount move the order between
+        buckets of the stats rollup in the same transaction.
+        """
+        data = update_data.model_dump(exclude_unset=True)
         try:
-            data = update_data.model_dump(exclude_unset=True)
-
-            # Update allowed fields
-            if "status" in data:
-                order.status = data["status"]
-            if "total_amount" in data:
-                order.total_amount = data["total_amount"]
-            if "currency" in data:
-                order.currency = data["currency"]
-            order.updated_at = data.get("updated_at", datetime.utcnow())
-
-            # Handle items
-            if "items" in data and data["items"] is not None:
-                # Delete existing items
-                await self.db.execute(
-                    delete(OrderItem).where(OrderItem.order_id == order.id)
+            current = (await self.db.execute(
+                select(Order.version, Order.created_at, Order.currency, Order.status, Order.total_amount)
+                .where(Order.id == order_id)
+            )).one_or_none()
+            if current is None:
+                raise OrderNotFoundError(f"Order with id '{order_id}' not found.")
+            expected_version = data.get("version") or current.version
+            if expected_version != current.version:
+                raise ConcurrentUpdateError(
+                    f"Order {order_id} was modified concurrently (expected version {expected_version})"
                 )
 
-                # Add new items
-                for item_data in data["items"]:
-                    
-                    new_item = OrderItem(
-                        id=str(generator.get_id()),
-                        order_id=order.id,
-                        product_id=item_data['product_id'],
-                        quantity=item_data['quantity'],
-                        price_per_unit=item_data['price_per_unit'],
-                        total_price=(
-                            item_data['total_price']
-                            if item_data['total_price'] is not None
-                            else item_data['quantity'] * item_data['price_per_unit']
-                        )
+            values: Dict[str, Any] = {"updated_at": datetime.utcnow(), "version": Order.version + 1}
+            if data.get("status") is not None:
+                values["status"] = OrderStatus(data["status"])
+            if "currency" in data:
+                values["currency"] = data["currency"]
+            if "total_amount" in data:
+                values["total_amount"] = data["total_amount"]
+
+            if data.get("items") is not None:
+                validate_items(update_data.items)
+                existing = (await self.db.execute(
+                    select(OrderItem.id, OrderItem.product_id, OrderItem.quantity,
+                           OrderItem.price_per_unit, OrderItem.total_price)
+                    .where(OrderItem.order_id == order_id)
+                )).all()
+                inserts, updates, deletes = diff_items(order_id, existing, data["items"])
+                if deletes:
+                    await self.db.execute(delete(OrderItem).where(OrderItem.id.in_(deletes)))
+                if updates:
+                    await self.db.execute(update(OrderItem), updates)
+                if inserts:
+                    await self.db.execute(insert(OrderItem), inserts)
+                if "total_amount" not in data:
+                    previous = {row.id: row.total_price for row in existing}
+                    values["total_amount"] = Order.total_amount + (
+                        sum(row["total_price"] for row in inserts)
+                        + sum(row["total_price"] - previous[row["id"]] for row in updates)
+                        - sum(previous[item_id] for item_id in deletes)
                     )
-                    self.db.add(new_item)  # ✅ Move this inside the loop
 
-            await self.db.flush()
-            await self.db.refresh(order)
+            updated = (await self.db.execute(
+                update(Order)
+                .where(Order.id == order_id, Order.version == expected_version)
+                .values(**values)
+                .returning(Order.currency, Order.status, Order.total_amount)
+                .execution_options(synchronize_session=False)
+            )).one_or_none()
+            if updated is None:
+                raise ConcurrentUpdateError(
+                    f"Order {order_id} was modified concurrently (expected version {expected_version})"
+                )
+            if tuple(updated) != (current.currency, current.status, current.total_amount):
+                deltas: StatsDeltas = {}
+                add_order_delta(deltas, current.created_at, current.currency, current.status, current.total_amount, sign=-1)
+                add_order_delta(deltas, current.created_at, updated.currency, updated.status, updated.total_amount)
+                await apply_stats_deltas(self.db, deltas)
             await self.db.commit()
-            return order
-
         except Exception as e:
             await self.db.rollback()
             raise e
 
+        await order_cache.invalidate(order_id)
+        return await self.get_order_by_id(order_id)
 
     async def delete_order(self, order_id: str) -> bool:
-        order = await self.get_order_by_id(order_id)
-        if not order:
-            raise Exception("Order not found")
         try:
-            await self.db.delete(order)
+            # Statements instead of session.delete(), which would load the order and its items first
+            await self.db.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+            deleted = (await self.db.execute(
+                delete(Order).where(Order.id == order_id)
+                .returning(Order.created_at, Order.currency, Order.status, Order.total_amount)
+                .execution_options(synchronize_session=False)
+            )).one_or_none()
+            if deleted is None:
+                await self.db.rollback()
+                return False
+            deltas: StatsDeltas = {}
+            add_order_delta(deltas, *deleted, sign=-1)
+            await apply_stats_deltas(self.db, deltas)
             await self.db.commit()
+            await order_cache.invalidate(order_id)
             return True
         except Exception as e:
             await self.db.rollback()
             raise e
 
+    ORDER_SORT_KEY = (Order.created_at, Order.id)
+    ARCHIVED_ORDER_SORT_KEY = (ArchivedOrder.created_at, ArchivedOrder.id)
+
+    def _filtered_query(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        model=Order,
+    ):
+        query = select(model).options(ORDER_LOADER if model is Order else selectinload(model.items))
+
+        if user_id:
+            query = query.where(model.user_id == user_id)
+        if status:
+            query = query.where(model.status == status)
+        if start_date:
+            query = query.where(model.created_at >= start_date)
+        if end_date:
+            query = query.where(model.created_at <= end_date)
+        return query
+
     async def get_all(
         self,
         user_id: Optional[str] = None,
@@ -146,30 +440,104 @@ class OrderService:
         end_date: Optional[datetime] = None,
         limit: int = 10,
         offset: int = 0,
+        include_archived: bool = True,
     ) -> List[Order]:
+        """
+        Offset pagination over the live orders, continued by the archived ones.
+
+        The archive is only queried once a page runs past the last live order,
+        so pages of recent orders cost a single query as before.
+        """
         try:
-            query = select(Order).options(
-                selectinload(Order.items)
-            )
+            filters = (user_id, status, start_date, end_date)
+            query = self._filtered_query(*filters)
+            query = query.offset(offset).limit(limit)
 
-            if user_id:
-                query = query.where(Order.user_id == user_id)
-            if status:
-                query = query.where(Order.status == status)
-            if start_date:
-                query = query.where(Order.created_at >= start_date)
-            if end_date:
-                query = query.where(Order.created_at <= end_date)
+            result = await self.db.execute(query)
+            orders = result.scalars().all()
+            if not include_archived or len(orders) >= limit:
+                return orders
+
+            if orders or offset == 0:
+                live_count = offset + len(orders)
+            else:
+                live_count = await self.db.scalar(
+                    select(func.count()).select_from(self._filtered_query(*filters).subquery())
+                )
+            query = self._filtered_query(*filters, model=ArchivedOrder)
+            query = query.offset(max(offset - live_count, 0)).limit(limit - len(orders))
 
-            query = query.offset(offset).limit(limit)
+            result = await self.db.execute(query)
+            return [*orders, *result.scalars().all()]
 
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+    async def get_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 10,
+        include_archived: bool = True,
+    ) -> Tuple[List[Order], Optional[str]]:
+        """
+        Keyset pagination on (created_at, id), newest first, over live and archived orders.
+
+        Both tables are read with the same cursor and merged, so pages stay in
+        order however live and archived orders interleave. An empty archive
+        page costs one indexed query.
+
+        Returns:
+        - tuple: The orders of the page and the cursor of the next page (None on the last page).
+        """
+        try:
+            filters = (user_id, status, start_date, end_date)
+            query = keyset_paginate(self._filtered_query(*filters), self.ORDER_SORT_KEY, cursor, limit)
             result = await self.db.execute(query)
-            return result.scalars().all()
+            orders = result.scalars().all()
+            if include_archived:
+                query = keyset_paginate(
+                    self._filtered_query(*filters, model=ArchivedOrder), self.ARCHIVED_ORDER_SORT_KEY, cursor, limit
+                )
+                result = await self.db.execute(query)
+                orders = sorted(
+                    [*orders, *result.scalars().all()], key=lambda order: (order.created_at, order.id), reverse=True
+                )[:limit + 1]
+            return split_page(orders, self.ORDER_SORT_KEY, limit)
 
         except Exception as e:
             await self.db.rollback()
             raise e
 
+    async def stream_all(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        batch_size: int = 1000,
+        include_archived: bool = True,
+    ) -> AsyncIterator[Order]:
+        """
+        Iterate over every matching order with a server-side cursor.
+
+        Rows are fetched `batch_size` at a time (items are loaded per batch), so
+        memory stays flat no matter how many orders match. The live orders come
+        first, then the archived ones, each part in (created_at, id) order.
+        """
+        models = (Order, ArchivedOrder) if include_archived else (Order,)
+        for model in models:
+            query = self._filtered_query(user_id, status, start_date, end_date, model=model)
+            query = query.order_by(model.created_at, model.id).execution_options(yield_per=batch_size)
+
+            result = await self.db.stream_scalars(query)
+            async for order in result:
+                yield order
+
 
 class OrderItemService:
     def __init__(self, db: AsyncSession):
@@ -184,6 +552,7 @@ class OrderItemService:
     ) -> OrderItem:
         try:
             total_price = quantity * price_per_unit
+            await bump_order_version(self.db, order_id, total_price)
             item = OrderItem(
                 id = str(generator.get_id()),
                 order_id=order_id,
@@ -193,8 +562,8 @@ class OrderItemService:
                 total_price=total_price,
             )
             self.db.add(item)
-            await self.db.flush()
             await self.db.commit() 
+            await order_cache.invalidate(order_id)
             return item
         except Exception as e:
             await self.db.rollback()
@@ -207,10 +576,11 @@ class OrderItemService:
     async def update_order_item(self, item_id: str, update_data:OrderItemSchema) -> Optional[OrderItem]:
         item = await self.get_order_item(item_id)
         if not item:
-            raise Exception("OrderItem not found")
+            raise OrderNotFoundError(f"Order item with id '{item_id}' not found.")
 
         try:
             data = update_data.model_dump(exclude_unset=True)
+            previous_total = item.total_price
 
             # Update allowed fields
             if "product_id" in data:
@@ -219,17 +589,17 @@ class OrderItemService:
                 item.quantity = data["quantity"]
             if "price_per_unit" in data:
                 item.price_per_unit = data["price_per_unit"]
-            if "total_price" in data:
+            if data.get("total_price") is not None:
                 item.total_price = data["total_price"]
             
 
             # Recalculate total_price if quantity or price_per_unit changed and total_price not explicitly set
-            if ("quantity" in kwargs or "price_per_unit" in kwargs) and "total_price" not in kwargs:
+            if ("quantity" in data or "price_per_unit" in data) and data.get("total_price") is None:
                 item.total_price = item.quantity * item.price_per_unit
 
-            await self.db.flush()
-            await self.db.refresh(item)
+            await bump_order_version(self.db, item.order_id, item.total_price - previous_total)
             await self.db.commit()  # ✅ Ensure the update is persisted
+            await order_cache.invalidate(item.order_id)
 
             return item
 
@@ -240,16 +610,48 @@ class OrderItemService:
     async def delete_order_item(self, item_id: str) -> bool:
         item = await self.get_order_item(item_id)
         if not item:
-            raise Exception("OrderItem not found")
+            raise OrderNotFoundError(f"Order item with id '{item_id}' not found.")
         try:
             await self.db.delete(item)
+            await bump_order_version(self.db, item.order_id, -item.total_price)
             await self.db.commit()
+            await order_cache.invalidate(item.order_id)
             return True
         except Exception as e:
             await self.db.rollback()
             raise e
 
 
+    # Items have no timestamp; their KSUID ids are time-ordered, so the id alone is the sort key
+    ITEM_SORT_KEY = (OrderItem.id,)
+    ARCHIVED_ITEM_SORT_KEY = (ArchivedOrderItem.id,)
+
+    def _filtered_query(
+            self,
+            order_id: Optional[str] = None,
+            product_id: Optional[str] = None,
+            quantity: Optional[int] = None,
+            price_per_unit: Optional[float] = None,
+            model=OrderItem,
+        ):
+        # Items are returned without their order; OrderItem.order is never loaded
+        query = select(model)
+
+        filters = []
+
+        if order_id:
+            filters.append(model.order_id == order_id)
+        if product_id:
+            filters.append(model.product_id == product_id)
+        if quantity is not None:
+            filters.append(model.quantity == quantity)
+        if price_per_unit is not None:
+            filters.append(model.price_per_unit == price_per_unit)
+
+        if filters:
+            query = query.where(and_(*filters))
+        return query
+
     async def get_all(
             self,
             order_id: Optional[str] = None,
@@ -259,31 +661,54 @@ class OrderItemService:
             limit: int = 10,
             offset: int = 0,
         ) -> List[OrderItem]:
+        """
+        Offset pagination over the items; those of an archived order come from the archive.
+
+        An order's items are either all live or all archived, so the archive
+        is only queried when the items of `order_id` come back empty.
+        """
         try:
-            query = select(OrderItem).options(
-                selectinload(OrderItem.order)  # eager load related Order if needed
-            )
+            filters = (order_id, product_id, quantity, price_per_unit)
+            query = self._filtered_query(*filters)
+            query = query.limit(limit).offset(offset)
 
-            filters = []
+            result = await self.db.execute(query)
+            items = result.scalars().all()
+            if items or not order_id:
+                return items
 
-            if order_id:
-                filters.append(OrderItem.order_id == order_id)
-            if product_id:
-                filters.append(OrderItem.product_id == product_id)
-            if quantity is not None:
-                filters.append(OrderItem.quantity == quantity)
-            if price_per_unit is not None:
-                filters.append(OrderItem.price_per_unit == price_per_unit)
+            query = self._filtered_query(*filters, model=ArchivedOrderItem).limit(limit).offset(offset)
+            result = await self.db.execute(query)
+            return result.scalars().all()
 
-            if filters:
-                query = query.where(and_(*filters))
+        except Exception as e:
+            await self.db.rollback()
+            raise e
 
-            query = query.limit(limit).offset(offset)
+    async def get_page(
+            self,
+            order_id: Optional[str] = None,
+            product_id: Optional[str] = None,
+            quantity: Optional[int] = None,
+            price_per_unit: Optional[float] = None,
+            cursor: Optional[str] = None,
+            limit: int = 10,
+        ) -> Tuple[List[OrderItem], Optional[str]]:
+        """Keyset pagination on the item id, newest first (archived orders as in get_all)."""
+        try:
+            filters = (order_id, product_id, quantity, price_per_unit)
+            query = self._filtered_query(*filters)
+            query = keyset_paginate(query, self.ITEM_SORT_KEY, cursor, limit)
 
             result = await self.db.execute(query)
             items = result.scalars().all()
+            if items or not order_id:
+                return split_page(items, self.ITEM_SORT_KEY, limit)
 
-            return items
+            query = self._filtered_query(*filters, model=ArchivedOrderItem)
+            query = keyset_paginate(query, self.ARCHIVED_ITEM_SORT_KEY, cursor, limit)
+            result = await self.db.execute(query)
+            return split_page(result.scalars().all(), self.ARCHIVED_ITEM_SORT_KEY, limit)
 
         except Exception as e:
             await self.db.rollback()
@@ -0,0 +1,219 @@
+from typing import Optional, Callable, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update, delete, func, exists
+from sqlalchemy.orm import aliased
+from datetime import datetime, timedelta
+from models.outbox import OrderOutbox
+from core.database import AsyncSessionDB
+from core.config import settings, logging
+from core.utils.kafka import KafkaProducer
+from core.utils import metrics
+import asyncio, json, time
+
+# Serializes batch claims on PostgreSQL; only one claimed batch is in flight at a time, which keeps events in order
+OUTBOX_LOCK_ID = 7_215_001
+
+
+def order_event_row(order: dict, action: str) -> dict:
+    """Column values of the outbox row describing `action` on `order`."""
+    return {
+        "aggregate_id": order["id"],
+        "event_type": action,
+        "topic": str(settings.KAFKA_TOPIC),
+        "payload": json.dumps({"order": order, "action": action}),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def add_order_event(db: AsyncSession, order: dict, action: str) -> OrderOutbox:
+    """
+    Stage an order event in the outbox of the current transaction.
+
+    The event becomes visible to the relay only when the caller commits, so it
+    is published if and only if the order change itself was persisted.
+    """
+    event = OrderOutbox(**order_event_row(order, action))
+    db.add(event)
+    return event
+
+
+class OutboxRelay:
+    """
+    Background task that drains `order_outbox` to Kafka in batches.
+
+    Delivery is at-least-once: rows are marked published only after the broker
+    acknowledged them, and failed batches are retried with exponential backoff.
+    A batch is claimed in a short transaction and published with no transaction
+    open, so a slow broker doesn't hold a DB connection or row locks.
+    """
+    def __init__(
+        self,
+        producer: KafkaProducer,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionDB,
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        poll_interval: float = settings.OUTBOX_POLL_INTERVAL,
+        max_backoff: float = settings.OUTBOX_MAX_BACKOFF,
+        retention: timedelta = timedelta(hours=settings.OUTBOX_RETENTION_HOURS),
+        claim_for: timedelta = timedelta(seconds=settings.OUTBOX_CLAIM_SECONDS),
+    ):
+        self.producer = producer
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.retention = retention
+        self.claim_for = claim_for
+        self._stopping = asyncio.Event()
+        self._last_purge = 0.0
+
+    async def run(self):
+        backoff = self.poll_interval
+        while not self._stopping.is_set():
+            try:
+                if not self.producer.is_started:
+                    await self.producer.start()
+                published = await self.relay_batch()
+                backoff = self.poll_interval
+                if published >= self.batch_size:
+                    continue  # more rows are probably waiting, don't sleep
+                await self.purge_published()
+                delay = self.poll_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.OUTBOX_RELAY_FAILURES.inc()
+                logging.error(f"[Outbox Relay] Batch failed, retrying in {backoff:.1f}s: {e}")
+                delay = backoff
+                backoff = min(backoff * 2, self.max_backoff)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopping.set()
+
+    async def relay_batch(self) -> int:
+        """
+        Publish the oldest unpublished events.
+
+        Returns:
+        - int: Number of events published in this batch.
+        """
+        started = time.perf_counter()
+        events = await self.claim_batch()
+        if not events:
+            return 0
+
+        # Enqueue the whole batch first so the producer can pack it, then wait for the acks
+        futures, error = [], None
+        for event in events:
+            try:
+                futures.append(await self.producer.send(
+                    event.payload.encode(), key=event.aggregate_id, topic=event.topic, wait=False
+                ))
+            except Exception as e:
+                error = e
+                break
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        # Only the prefix acknowledged in order is marked, the rest is released and retried
+        published_ids = []
+        for event, outcome in zip(events, results):
+            if isinstance(outcome, BaseException):
+                error = outcome
+                break
+            published_ids.append(event.id)
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                if published_ids:
+                    await session.execute(
+                        update(OrderOutbox)
+                        .where(OrderOutbox.id.in_(published_ids))
+                        .values(published_at=datetime.utcnow(), claimed_until=None)
+                    )
+                failed_ids = [event.id for event in events[len(published_ids):]]
+                if failed_ids:
+                    await session.execute(
+                        update(OrderOutbox)
+                        .where(OrderOutbox.id.in_(failed_ids))
+                        .values(attempts=OrderOutbox.attempts + 1, last_error=str(error), claimed_until=None)
+                    )
+                await self._record_lag(session)
+
+        metrics.OUTBOX_PUBLISHED.inc(len(published_ids))
+        metrics.OUTBOX_BATCH_SECONDS.observe(time.perf_counter() - started)
+        if error is not None:
+            raise error
+        return len(published_ids)
+
+    async def claim_batch(self) -> List[OrderOutbox]:
+        """
+        Claim the oldest unpublished events for `claim_for` and commit the claim.
+
+        Nothing is claimed while another relay holds a live claim, so one batch
+        is in flight at a time and events stay in order. The claim is a single
+        conditional UPDATE, which SQLite serializes with other writers; on
+        PostgreSQL the transaction also takes an advisory lock, since under
+        READ COMMITTED two such UPDATEs could both see no live claim.
+
+        Returns:
+        - list: The claimed events in id order (empty if there are none or
+          another relay holds them).
+        """
+        async with self.session_factory() as session:
+            async with session.begin():
+                if session.bind.dialect.name == "postgresql":
+                    locked = await session.scalar(select(func.pg_try_advisory_xact_lock(OUTBOX_LOCK_ID)))
+                    if not locked:
+                        return []
+
+                now = datetime.utcnow()
+                claimed = aliased(OrderOutbox)
+                oldest = (
+                    select(OrderOutbox.id)
+                    .where(OrderOutbox.published_at.is_(None))
+                    .order_by(OrderOutbox.id)
+                    .limit(self.batch_size)
+                    .scalar_subquery()
+                )
+                result = await session.execute(
+                    update(OrderOutbox)
+                    .where(
+                        OrderOutbox.id.in_(oldest),
+                        ~exists().where(claimed.published_at.is_(None), claimed.claimed_until > now),
+                    )
+                    .values(claimed_until=now + self.claim_for)
+                    .returning(OrderOutbox)
+                    .execution_options(synchronize_session=False)
+                )
+                events = sorted(result.scalars().all(), key=lambda event: event.id)
+                if not events:
+                    await self._record_lag(session)
+                return events
+
+    async def _record_lag(self, session: AsyncSession):
+        pending, oldest = (await session.execute(
+            select(func.count(OrderOutbox.id), func.min(OrderOutbox.created_at))
+            .where(OrderOutbox.published_at.is_(None))
+        )).one()
+        metrics.OUTBOX_PENDING.set(pending)
+        metrics.OUTBOX_LAG.set((datetime.utcnow() - oldest).total_seconds() if oldest else 0)
+
+    async def purge_published(self, interval: float = 60.0) -> Optional[int]:
+        """Delete published events older than the retention window, at most once per interval."""
+        now = time.monotonic()
+        if now - self._last_purge < interval:
+            return None
+        self._last_purge = now
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(OrderOutbox).where(
+                        OrderOutbox.published_at.is_not(None),
+                        OrderOutbox.published_at < datetime.utcnow() - self.retention,
+                    )
+                )
+        return result.rowcount
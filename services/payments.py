@@ -1,10 +1,17 @@
-from typing import Optional, List
+from typing import Optional, List, Callable, Tuple, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import update, delete, and_
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
 from datetime import datetime
+from core.database import AsyncSessionDB
+from core.config import logging
+from core.utils.generator import generator
+from core.utils.pagination import keyset_paginate, split_page
+from core.utils.cache import payment_cache
 from models.payments import Payment, PaymentStatus, PaymentMethod  # adjust import as needed
+from models.archive import ArchivedPayment
 
 
 class PaymentService:
@@ -40,23 +47,42 @@ class PaymentService:
                 refunded_amount=refunded_amount,
             )
             self.db.add(payment)
-            await self.db.flush()  # flush to get ID if needed
+            await self.db.commit()
             return payment
         except Exception as e:
             await self.db.rollback()
             raise e
 
-    async def get_payment(self, payment_id: str) -> Optional[Payment]:
+    async def get_payment(self, payment_id: str, include_archived: bool = True) -> Optional[Payment]:
+        """The payment, looked up in the archive when it is not a live payment (and `include_archived`)."""
         result = await self.db.execute(select(Payment).where(Payment.id == payment_id))
-        return result.scalar_one_or_none()
+        payment = result.scalar_one_or_none()
+        if payment is None and include_archived:
+            result = await self.db.execute(select(ArchivedPayment).where(ArchivedPayment.id == payment_id))
+            payment = result.scalar_one_or_none()
+        return payment
+
+    async def get_payment_updated_at(self, payment_id: str) -> Optional[datetime]:
+        result = await self.db.execute(select(Payment.updated_at).where(Payment.id == payment_id))
+        updated_at = result.scalar_one_or_none()
+        if updated_at is None:
+            result = await self.db.execute(
+                select(ArchivedPayment.updated_at).where(ArchivedPayment.id == payment_id)
+            )
+            updated_at = result.scalar_one_or_none()
+        return updated_at
+
+    async def get_payment_payload(self, payment_id: str) -> Optional[bytes]:
+        """JSON encoded payment through the read-through cache; None if it doesn't exist."""
+        return await payment_cache.get_or_load(payment_id, lambda: self.get_payment(payment_id))
 
     async def update_payment(
         self,
         payment_id: str,
         **kwargs
     ) -> Optional[Payment]:
-        # Fetch existing payment
-        payment = await self.get_payment(payment_id)
+        # Fetch existing payment (archived payments are read-only)
+        payment = await self.get_payment(payment_id, include_archived=False)
         if not payment:
             raise Exception("Payment not found")
         try:
@@ -66,6 +92,8 @@ class PaymentService:
                     setattr(payment, key, value)
 
             await self.db.flush()
+            await self.db.commit()
+            await payment_cache.invalidate(payment_id)
             return payment
         except Exception as e:
             await self.db.rollback()
@@ -73,17 +101,67 @@ class PaymentService:
 
     async def delete_payment(self, payment_id: str) -> bool:
         
-        payment = await self.get_payment(payment_id)
+        payment = await self.get_payment(payment_id, include_archived=False)
         if not payment:
             raise Exception("Payment not found")
         try:
             await self.db.delete(payment)
             await self.db.commit()
+            await payment_cache.invalidate(payment_id)
             return True
         except Exception as e:
             await self.db.rollback()
             raise e
 
+    PAYMENT_SORT_KEY = (Payment.created_at, Payment.id)
+
+    def _filtered_query(
+        self,
+        order_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        method: Optional[PaymentMethod] = None,
+        status: Optional[PaymentStatus] = None,
+        amount: Optional[float] = None,
+        currency: Optional[str] = None,
+        transaction_id: Optional[str] = None,
+        gateway_response: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+        refunded_amount: Optional[float] = None,
+        parent_payment_id: Optional[str] = None,
+    ):
+        query = select(Payment)
+        filters = []
+
+        if order_id:
+            filters.append(Payment.order_id == order_id)
+        if user_id:
+            filters.append(Payment.user_id == user_id)
+        if method:
+            filters.append(Payment.method == method)
+        if status:
+            filters.append(Payment.status == status)
+        if amount is not None:
+            filters.append(Payment.amount == amount)
+        if currency:
+            filters.append(Payment.currency == currency)
+        if transaction_id:
+            filters.append(Payment.transaction_id == transaction_id)
+        if gateway_response:
+            filters.append(Payment.gateway_response == gateway_response)
+        if created_at:
+            filters.append(Payment.created_at == created_at)
+        if updated_at:
+            filters.append(Payment.updated_at == updated_at)
+        if refunded_amount is not None:
+            filters.append(Payment.refunded_amount == refunded_amount)
+        if parent_payment_id:
+            filters.append(Payment.parent_payment_id == parent_payment_id)
+
+        if filters:
+            query = query.where(and_(*filters))
+        return query
+
     async def get_all(
         self,
         order_id: Optional[str] = None,
@@ -102,37 +180,20 @@ class PaymentService:
         offset: int = 0,
     ) -> List[Payment]:
         try:
-            query = select(Payment)
-            filters = []
-
-            if order_id:
-                filters.append(Payment.order_id == order_id)
-            if user_id:
-                filters.append(Payment.user_id == user_id)
-            if method:
-                filters.append(Payment.method == method)
-            if status:
-                filters.append(Payment.status == status)
-            if amount is not None:
-                filters.append(Payment.amount == amount)
-            if currency:
-                filters.append(Payment.currency == currency)
-            if transaction_id:
-                filters.append(Payment.transaction_id == transaction_id)
-            if gateway_response:
-                filters.append(Payment.gateway_response == gateway_response)
-            if created_at:
-                filters.append(Payment.created_at == created_at)
-            if updated_at:
-                filters.append(Payment.updated_at == updated_at)
-            if refunded_amount is not None:
-                filters.append(Payment.refunded_amount == refunded_amount)
-            if parent_payment_id:
-                filters.append(Payment.parent_payment_id == parent_payment_id)
-
-            if filters:
-                query = query.where(and_(*filters))
-
+            query = self._filtered_query(
+                order_id=order_id,
+                user_id=user_id,
+                method=method,
+                status=status,
+                amount=amount,
+                currency=currency,
+                transaction_id=transaction_id,
+                gateway_response=gateway_response,
+                created_at=created_at,
+                updated_at=updated_at,
+                refunded_amount=refunded_amount,
+                parent_payment_id=parent_payment_id,
+            )
             query = query.limit(limit).offset(offset)
             result = await self.db.execute(query)
             payments = result.scalars().all()
@@ -141,4 +202,70 @@ class PaymentService:
 
         except Exception as e:
             await self.db.rollback()
-            raise e
\ No newline at end of file
+            raise e
+
+    async def get_page(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 10,
+        **filters,
+    ) -> Tuple[List[Payment], Optional[str]]:
+        """
+        Keyset pagination on (created_at, id), newest first.
+
+        `filters` are the same keyword filters accepted by `get_all`.
+        """
+        try:
+            query = self._filtered_query(**filters)
+            query = keyset_paginate(query, self.PAYMENT_SORT_KEY, cursor, limit)
+            result = await self.db.execute(query)
+            return split_page(result.scalars().all(), self.PAYMENT_SORT_KEY, limit)
+
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+    async def stream_all(self, batch_size: int = 1000, **filters) -> AsyncIterator[Payment]:
+        """
+        Iterate over every matching payment with a server-side cursor.
+
+        `filters` are the same keyword filters accepted by `get_all`.
+        """
+        query = self._filtered_query(**filters)
+        query = query.order_by(*self.PAYMENT_SORT_KEY).execution_options(yield_per=batch_size)
+
+        result = await self.db.stream_scalars(query)
+        async for payment in result:
+            yield payment
+
+
+async def handle_order_event(payload: dict, session_factory: Callable[[], AsyncSession] = AsyncSessionDB):
+    """
+    Kafka handler: open a pending payment for every created order.
+
+    The payment is committed before returning so the consumer can commit the
+    offset afterwards. Redelivered events are ignored when the order already
+    has a payment: the unique root payment index rejects the second insert,
+    which keeps at-least-once delivery from double charging even when two
+    deliveries are handled at the same time.
+    """
+    if payload.get("action") != "create":
+        return
+    order_data = payload.get("order")
+    if not order_data:
+        raise ValueError("Order create event without an order")
+
+    async with session_factory() as session:
+        service = PaymentService(session)
+        try:
+            payment = await service.create_payment(
+                order_id=order_data["id"],
+                amount=order_data["total_amount"],
+                currency=order_data["currency"],
+                method=PaymentMethod(order_data.get("payment_method") or PaymentMethod.Other.value),
+                user_id=order_data.get("user_id"),
+            )
+        except IntegrityError:
+            logging.info(f"A payment already exists for order {order_data['id']}")
+            return
+        logging.info(f"Payment-{payment.id} made on: {order_data['id']}")
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from core.database import AsyncSessionDB
+from models.archive import ArchivedOrder
+from models.orders import Order, OrderStatus
+from models.payments import Payment, PaymentMethod, PaymentStatus
+from services.archive import OrderArchiver
+from services.payments import PaymentService
+import json
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def archived(client, db):
+    """An order with three items and a completed payment, moved to the archive."""
+    order = await create_order(client, items=3, status="Delivered")
+    payment = await PaymentService(db).create_payment(
+        order_id=order["id"], method=PaymentMethod.CreditCard, amount=30.0, currency="USD",
+        status=PaymentStatus.Completed,
+    )
+    # Cache the live versions, archiving must invalidate them
+    live_order = (await client.get(f"/api/v1/orders/{order['id']}")).json()["data"]
+    live_payment = (await client.get(f"/api/v1/payments/{payment.id}")).json()["data"]
+
+    assert await OrderArchiver(session_factory=AsyncSessionDB, older_than=timedelta(0)).archive_batch() == 1
+    assert await db.scalar(select(func.count()).select_from(ArchivedOrder)) == 1
+    return live_order, live_payment
+
+
+async def test_archived_order_and_payment_stay_readable(client, archived):
+    live_order, live_payment = archived
+
+    response = await client.get(f"/api/v1/orders/{live_order['id']}")
+    assert response.status_code == 200
+    assert response.json()["data"] == live_order
+
+    response = await client.get(f"/api/v1/payments/{live_payment['id']}")
+    assert response.status_code == 200
+    assert response.json()["data"] == live_payment
+
+    etag = response.headers["etag"]
+    response = await client.get(f"/api/v1/payments/{live_payment['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+async def test_archived_order_items_are_listed(client, archived):
+    live_order, _ = archived
+    item_ids = sorted(item["id"] for item in live_order["items"])
+
+    response = await client.get(f"/api/v1/orders/{live_order['id']}/items")
+    assert sorted(item["id"] for item in response.json()["data"]) == item_ids
+
+    response = await client.get(f"/api/v1/orders/{live_order['id']}/items", params={"cursor": "", "limit": 2})
+    first_page = response.json()
+    response = await client.get(
+        f"/api/v1/orders/{live_order['id']}/items", params={"cursor": first_page["next_cursor"], "limit": 2}
+    )
+    second_page = response.json()
+    assert second_page["next_cursor"] is None
+    assert sorted(item["id"] for item in first_page["data"] + second_page["data"]) == item_ids
+
+
+async def test_cursor_listing_and_export_include_archived_orders(client, archived):
+    live_order, _ = archived
+    newer = await create_order(client, items=1)
+
+    response = await client.get("/api/v1/orders/", params={"cursor": "", "limit": 1})
+    first_page = response.json()
+    response = await client.get("/api/v1/orders/", params={"cursor": first_page["next_cursor"], "limit": 1})
+    second_page = response.json()
+    assert [o["id"] for o in first_page["data"] + second_page["data"]] == [newer["id"], live_order["id"]]
+    assert second_page["next_cursor"] is None
+
+    response = await client.get("/api/v1/orders/export", params={"format": "ndjson"})
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [o["id"] for o in exported] == [newer["id"], live_order["id"]]
+    assert exported[1]["items"] == live_order["items"]
+
+
+@pytest.fixture
+async def postgres_sessions(postgres_url):
+    engine = create_async_engine(postgres_url)
+    async with engine.begin() as conn:
+        # Monthly partitions left by earlier runs would hide missing ones
+        partitions = (await conn.execute(
+            text("SELECT tablename FROM pg_tables WHERE tablename ~ '_archive_p[0-9]{6}$'")
+        )).scalars().all()
+        for partition in partitions:
+            await conn.execute(text(f"DROP TABLE {partition}"))
+        await conn.execute(text(
+            "TRUNCATE payments, order_items, orders, payments_archive, order_items_archive, orders_archive"
+        ))
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def closed_order(order_id: str, created_at: datetime) -> Order:
+    return Order(
+        id=order_id, user_id="u1", status=OrderStatus.Delivered, total_amount=10.0, currency="USD",
+        created_at=created_at, updated_at=created_at, version=1,
+    )
+
+
+def completed_payment(payment_id: str, order_id: str, created_at: datetime) -> Payment:
+    return Payment(
+        id=payment_id, order_id=order_id, method=PaymentMethod.CreditCard, status=PaymentStatus.Completed,
+        amount=10.0, currency="USD", created_at=created_at, updated_at=created_at,
+    )
+
+
+async def test_postgres_payment_in_a_later_month_than_its_order(postgres_sessions):
+    # Ordered in January, paid in March; another order from March is archived afterwards
+    async with postgres_sessions() as session:
+        session.add(closed_order("jan", datetime(2025, 1, 30)))
+        await session.flush()
+        session.add(completed_payment("pay-jan", "jan", datetime(2025, 3, 2)))
+        await session.commit()
+
+    archiver = OrderArchiver(session_factory=postgres_sessions, older_than=timedelta(0), batch_size=1)
+    assert await archiver.archive_batch() == 1
+
+    async with postgres_sessions() as session:
+        session.add(closed_order("mar", datetime(2025, 3, 15)))
+        await session.flush()
+        session.add(completed_payment("pay-mar", "mar", datetime(2025, 3, 16)))
+        await session.commit()
+    assert await archiver.archive_batch() == 1
+
+    async with postgres_sessions() as session:
+        partitions = dict((await session.execute(
+            text("SELECT id, tableoid::regclass::text FROM payments_archive")
+        )).all())
+    assert partitions == {"pay-jan": "payments_archive_p202503", "pay-mar": "payments_archive_p202503"}
+
+
+async def test_postgres_rows_stranded_in_the_default_partition_are_moved(postgres_sessions):
+    # As left behind by archivers that only created partitions for the orders' months
+    async with postgres_sessions() as session:
+        await session.execute(text(
+            "INSERT INTO payments_archive (id, order_id, method, status, amount, currency, created_at, updated_at, archived_at)"
+            " VALUES ('stranded', 'gone', 'CreditCard', 'Completed', 1, 'USD', '2025-05-03', '2025-05-03', now())"
+        ))
+        session.add(closed_order("may", datetime(2025, 5, 10)))
+        await session.commit()
+
+    archiver = OrderArchiver(session_factory=postgres_sessions, older_than=timedelta(0))
+    assert await archiver.archive_batch() == 1
+
+    async with postgres_sessions() as session:
+        partition = await session.scalar(
+            text("SELECT tableoid::regclass::text FROM payments_archive WHERE id = 'stranded'")
+        )
+    assert partition == "payments_archive_p202505"
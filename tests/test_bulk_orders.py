@@ -0,0 +1,50 @@
+from sqlalchemy import func, select
+from core.config import settings
+from models.order_stats import OrderStatsHourly
+from models.orders import Order, OrderItem
+from models.outbox import OrderOutbox
+import pytest
+from test_query_counts import assert_queries, count_queries, order_payload
+
+pytestmark = pytest.mark.anyio
+
+
+async def count(db, model) -> int:
+    return await db.scalar(select(func.count()).select_from(model))
+
+
+async def test_bulk_create_costs_the_same_statements_for_any_size(client, db):
+    orders = [order_payload(items=3) for _ in range(50)]
+    with count_queries() as log:
+        response = await client.post("/api/v1/orders/bulk", json=orders)
+    assert response.status_code == 201
+    # orders, order_items and outbox INSERTs and the stats rollup upsert, inside one savepoint
+    assert_queries(log, 6)
+
+    results = response.json()["data"]
+    assert [result["index"] for result in results] == list(range(50))
+    assert (await count(db, Order), await count(db, OrderItem), await count(db, OrderOutbox)) == (50, 150, 50)
+    assert await db.scalar(select(func.sum(OrderStatsHourly.order_count))) == 50
+
+
+async def test_one_invalid_order_rejects_the_batch(client, db):
+    orders = [order_payload(), order_payload(total_amount=-1.0), order_payload()]
+    response = await client.post("/api/v1/orders/bulk", json=orders)
+    assert response.status_code == 422
+    assert "#1" in response.json()["message"]
+    assert await count(db, Order) == 0
+
+
+async def test_partial_batch_stores_the_valid_orders(client, db):
+    orders = [order_payload(), order_payload(total_amount=-1.0), order_payload()]
+    response = await client.post("/api/v1/orders/bulk", params={"partial": True}, json=orders)
+    assert response.status_code == 207
+    assert [result["success"] for result in response.json()["data"]] == [True, False, True]
+    assert await count(db, Order) == 2
+
+
+async def test_oversized_batch_is_refused(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_ORDERS_MAX", 2)
+    response = await client.post("/api/v1/orders/bulk", json=[order_payload() for _ in range(3)])
+    assert response.status_code == 413
+    assert await count(db, Order) == 0
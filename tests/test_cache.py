@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from core.utils.cache import ReadThroughCache
+from core.utils.serialization import loads
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    """The few Redis commands ReadThroughCache uses, with a hook run on every SET."""
+
+    def __init__(self):
+        self.data = {}
+        self.on_set = None
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        if self.on_set:
+            self.on_set(key)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def publish(self, channel, message):
+        pass
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = ReadThroughCache("test")
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "a"}
+
+    results = await asyncio.gather(*(cache.get_or_load("a", loader) for _ in range(5)))
+    assert calls == 1
+    assert all(loads(result) == {"id": "a"} for result in results)
+
+
+async def test_cancelled_leader_does_not_fail_followers():
+    cache = ReadThroughCache("test")
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_loader():
+        started.set()
+        await release.wait()
+        return {"id": "leader"}
+
+    async def loader():
+        return {"id": "follower"}
+
+    leader = asyncio.create_task(cache.get_or_load("a", slow_loader))
+    await started.wait()
+    followers = [asyncio.create_task(cache.get_or_load("a", loader)) for _ in range(2)]
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    results = await asyncio.gather(*followers)
+    assert [loads(result) for result in results] == [{"id": "follower"}] * 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+async def test_loader_errors_reach_every_waiter():
+    cache = ReadThroughCache("test")
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(cache.get_or_load("a", loader) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_fill_invalidated_during_redis_write_is_dropped():
+    redis = FakeRedis()
+    cache = ReadThroughCache("test", redis=redis)
+    # Another worker's invalidation arrives over pub/sub while the fill is being written
+    redis.on_set = cache._evict_local
+
+    async def loader():
+        return {"id": "stale"}
+
+    await cache.get_or_load("a", loader)
+    assert "test:a" not in redis.data
+
+
+async def test_fill_invalidated_during_load_is_not_stored():
+    redis = FakeRedis()
+    cache = ReadThroughCache("test", redis=redis)
+
+    async def loader():
+        await cache.invalidate("a")
+        return {"id": "stale"}
+
+    await cache.get_or_load("a", loader)
+    assert "test:a" not in redis.data
+    assert cache.local.get("test:a") is None
@@ -0,0 +1,44 @@
+from starlette.responses import PlainTextResponse
+from core.middleware.compression import CompressionMiddleware
+import gzip
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+BODY = "row\n" * 1000
+ETAG = '"v1"'
+
+
+async def versioned(scope, receive, send):
+    await PlainTextResponse(BODY, headers={"ETag": ETAG})(scope, receive, send)
+
+
+def client_for(endpoint, minimum_size=500):
+    app = CompressionMiddleware(endpoint, minimum_size=minimum_size)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.parametrize("minimum_size", [500, len(BODY) + 1], ids=["compressed", "under-minimum"])
+async def test_negotiated_coding_weakens_the_etag(minimum_size):
+    async with client_for(versioned, minimum_size) as client:
+        response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == "W/" + ETAG
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == BODY
+
+
+async def test_identity_keeps_the_strong_etag():
+    async with client_for(versioned) as client:
+        response = await client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == ETAG
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+async def test_gzip_body_round_trips():
+    async with client_for(versioned) as client:
+        async with client.stream("GET", "/", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(raw).decode() == BODY
@@ -0,0 +1,53 @@
+from starlette.responses import PlainTextResponse, StreamingResponse
+from core.middleware.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimitMiddleware
+from core.utils.latency import not_latency
+import asyncio
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+DELAY = 0.1  # well over the limiter's target latency
+
+
+def client_for(endpoint):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, min_limit=1, max_limit=10, target_latency=0.02)
+    app = ConcurrencyLimitMiddleware(endpoint, limiter=limiter, path_prefix="/")
+    return limiter, httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def slow_response(scope, receive, send):
+    await asyncio.sleep(DELAY)
+    await PlainTextResponse("done")(scope, receive, send)
+
+
+async def slow_stream(scope, receive, send):
+    async def chunks():
+        for _ in range(3):
+            await asyncio.sleep(DELAY / 3)
+            yield b"row\n"
+
+    await StreamingResponse(chunks())(scope, receive, send)
+
+
+async def waits_on_another_request(scope, receive, send):
+    with not_latency():
+        await asyncio.sleep(DELAY)
+    await PlainTextResponse("replayed")(scope, receive, send)
+
+
+async def test_slow_response_cuts_the_limit():
+    limiter, client = client_for(slow_response)
+    async with client:
+        await client.get("/")
+    assert limiter.limit == 9
+
+
+@pytest.mark.parametrize("endpoint", [slow_stream, waits_on_another_request])
+async def test_streaming_and_waits_on_other_requests_are_not_latency(endpoint):
+    limiter, client = client_for(endpoint)
+    async with client:
+        response = await client.get("/")
+    assert response.status_code == 200
+    assert limiter.limit == 10
+    assert limiter.in_flight == 0
@@ -0,0 +1,48 @@
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from core import database
+from core.config import settings
+from core.database import InstrumentedQueuePool, engine_db, pool_wait, _engine_options
+from core.utils import metrics
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def test_engine_options_follow_the_settings(monkeypatch):
+    for name, value in (("DB_POOL_SIZE", 7), ("DB_MAX_OVERFLOW", 3), ("DB_POOL_TIMEOUT", 2.5), ("DB_STATEMENT_CACHE_SIZE", 50)):
+        monkeypatch.setattr(settings, name, value)
+
+    options = _engine_options("postgresql+asyncpg://u@db/orders")
+    assert (options["pool_size"], options["max_overflow"], options["pool_timeout"]) == (7, 3, 2.5)
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["connect_args"] == {"prepared_statement_cache_size": 50}
+
+    # Only asyncpg takes the statement cache option; the replica pool isn't instrumented
+    options = _engine_options("postgresql+psycopg://u@db/orders", instrumented=False)
+    assert "connect_args" not in options
+    assert options["poolclass"] is not InstrumentedQueuePool
+
+
+async def test_checkouts_are_reported_in_the_pool_gauges(db):
+    assert engine_db.sync_engine.pool.size() == settings.DB_POOL_SIZE
+    async with engine_db.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        assert metrics.DB_POOL_CHECKED_OUT._value.get() >= 1
+    assert metrics.DB_POOL_CHECKED_OUT._value.get() == 0
+
+
+async def test_exhausted_pool_times_out_and_records_the_wait(monkeypatch):
+    engine = create_async_engine(
+        database.SQL_DATABASE_URI, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1,
+    )
+    monkeypatch.setattr(pool_wait, "value", 0.0)
+    try:
+        async with engine.connect():
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+    finally:
+        await engine.dispose()
+    assert pool_wait.value > 0
@@ -0,0 +1,98 @@
+from aiosmtpd.controller import Controller
+from core.utils.messages.email import MailService, SMTPConnectionPool, build_message
+import socket
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingHandler:
+    """Keeps every accepted message with the client address of the connection it came over."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((session.peer, envelope.rcpt_tos))
+        return "250 OK"
+
+    @property
+    def connections(self) -> set:
+        return {peer for peer, _ in self.messages}
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def make_pool(port: int, size: int = 1) -> SMTPConnectionPool:
+    return SMTPConnectionPool(
+        hostname="127.0.0.1", port=port, username=None, password=None,
+        start_tls=False, timeout=5, size=size,
+    )
+
+
+def message(n: int):
+    return build_message(f"user{n}@example.com", "Hello", "Hi", from_email="shop@example.com")
+
+
+class CountingPool(SMTPConnectionPool):
+    checkouts = 0
+
+    def acquire(self):
+        self.checkouts += 1
+        return super().acquire()
+
+
+async def test_connections_are_reused_across_sends(smtp_server):
+    handler, port = smtp_server
+    service = MailService(pool=make_pool(port, size=1))
+    for n in range(3):
+        await service.send(message(n))
+    await service.pool.close()
+
+    assert len(handler.messages) == 3
+    # One connection opened (and authenticated) once, not one per message
+    assert len(handler.connections) == 1
+
+
+async def test_send_many_batches_per_checkout(smtp_server):
+    handler, port = smtp_server
+    pool = CountingPool(hostname="127.0.0.1", port=port, username=None, password=None,
+                        start_tls=False, timeout=5, size=2)
+    service = MailService(pool=pool, batch_size=2)
+
+    sent = await service.send_many(message(n) for n in range(5))
+    await pool.close()
+
+    assert sent == 5
+    assert sorted(rcpt for _, (rcpt,) in handler.messages) == sorted(f"user{n}@example.com" for n in range(5))
+    assert pool.checkouts == 3  # batches of 2, 2 and 1
+    assert len(handler.connections) <= 2
+
+
+async def test_queue_full_drops_new_messages(smtp_server):
+    handler, port = smtp_server
+    service = MailService(pool=make_pool(port), queue_size=2, batch_size=10)
+    await service.start()
+
+    # The workers can't run between these calls, so the queue fills up
+    accepted = [service.enqueue(message(n)) for n in range(4)]
+    await service.stop()
+
+    assert accepted == [True, True, False, False]
+    assert len(handler.messages) == 2
+
+
+async def test_enqueue_without_started_service_is_refused():
+    service = MailService(pool=make_pool(1))
+    assert service.enqueue(message(0)) is False
+    assert service.queue.empty()
@@ -0,0 +1,54 @@
+from models.payments import PaymentMethod
+from services.payments import PaymentService
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("accept_encoding, weak", [("gzip", True), ("identity", False)])
+async def test_payment_is_revalidated_per_representation(client, db, accept_encoding, weak):
+    payment = await PaymentService(db).create_payment(
+        order_id="o1", method=PaymentMethod.CreditCard, amount=10.0, currency="USD",
+    )
+    headers = {"Accept-Encoding": accept_encoding}
+
+    response = await client.get(f"/api/v1/payments/{payment.id}", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith("W/") == weak
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    etag = response.headers["etag"]
+    response = await client.get(f"/api/v1/payments/{payment.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+async def test_item_pages_have_their_own_etags(client):
+    order = await create_order(client, items=4)
+    url = f"/api/v1/orders/{order['id']}/items"
+
+    first = await client.get(url, params={"limit": 2})
+    second = await client.get(url, params={"limit": 2, "offset": 2})
+    assert first.headers["etag"] != second.headers["etag"]
+
+    response = await client.get(url, params={"limit": 2, "offset": 2}, headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    response = await client.get(url, params={"limit": 2, "offset": 2}, headers={"If-None-Match": second.headers["etag"]})
+    assert response.status_code == 304
+
+
+async def test_order_etag_changes_with_every_write(client):
+    order = await create_order(client, items=1)
+    url = f"/api/v1/orders/{order['id']}"
+    etag = (await client.get(url)).headers["etag"]
+    assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+    await client.post(
+        "/api/v1/orders/items",
+        params={"order_id": order["id"], "product_id": "px", "quantity": 1, "price_per_unit": 1.0},
+    )
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()["data"]["items"]) == 2
@@ -0,0 +1,53 @@
+from models.payments import PaymentMethod
+from services.payments import PaymentService
+from core.utils import export
+import csv
+import io
+import json
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_orders_ndjson_export_has_one_order_per_line(client):
+    orders = [await create_order(client, items=n) for n in (1, 2, 3)]
+    await create_order(client, status="Shipped")
+
+    response = await client.get("/api/v1/orders/export", params={"status": "Pending"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in exported] == [order["id"] for order in orders]
+    assert [len(row["items"]) for row in exported] == [1, 2, 3]
+
+
+async def test_orders_csv_export_counts_items(client):
+    order = await create_order(client, items=3)
+
+    response = await client.get("/api/v1/orders/export", params={"format": "csv"})
+    assert response.headers["content-disposition"] == 'attachment; filename="orders.csv"'
+    (row,) = csv.DictReader(io.StringIO(response.text))
+    assert (row["id"], row["item_count"], row["total_amount"]) == (order["id"], "3", "30.0")
+
+
+async def test_payments_csv_export(client, db):
+    payment = await PaymentService(db).create_payment(
+        order_id="o1", method=PaymentMethod.CreditCard, amount=12.5, currency="EUR",
+    )
+
+    response = await client.get("/api/v1/payments/export", params={"format": "csv", "currency": "EUR"})
+    (row,) = csv.DictReader(io.StringIO(response.text))
+    assert (row["id"], row["method"], row["amount"]) == (payment.id, "CreditCard", "12.5")
+
+
+async def test_large_exports_are_sent_in_chunks(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_SIZE", 100)
+
+    async def rows():
+        for n in range(50):
+            yield {"n": n}
+
+    chunks = [chunk async for chunk in export.ndjson_stream(rows())]
+    assert len(chunks) > 1
+    assert [json.loads(line)["n"] for line in b"".join(chunks).splitlines()] == list(range(50))
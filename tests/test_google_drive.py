@@ -0,0 +1,107 @@
+from googleapiclient.http import HttpMockSequence
+from core.utils.file import CHUNK_ALIGNMENT, AsyncGoogleDrive, GoogleDrive
+import json, os, threading, time
+import pytest
+
+CHUNK = CHUNK_ALIGNMENT
+
+
+def drive_for(responses) -> tuple[GoogleDrive, HttpMockSequence]:
+    http = HttpMockSequence(responses)
+    return GoogleDrive(jsonkey=None, chunk_size=CHUNK, http=http), http
+
+
+def test_chunk_size_must_be_aligned():
+    with pytest.raises(ValueError):
+        GoogleDrive(jsonkey=None, chunk_size=CHUNK + 1, http=HttpMockSequence([]))
+
+
+def test_upload_is_resumable_across_chunks(tmp_path):
+    data = os.urandom(2 * CHUNK + 100)
+    path = tmp_path / "report.bin"
+    path.write_bytes(data)
+    drive, http = drive_for([
+        ({"status": "200", "location": "https://upload.example/session"}, ""),
+        ({"status": "308", "range": f"bytes=0-{CHUNK - 1}"}, ""),
+        ({"status": "308", "range": f"bytes=0-{2 * CHUNK - 1}"}, ""),
+        ({"status": "200"}, json.dumps({"id": "F1", "webViewLink": "https://drive.example/F1"})),
+    ])
+
+    assert drive.upload_file(str(path), folder_id="D1") == {"id": "F1", "link": "https://drive.example/F1"}
+
+    start, *chunks = http.request_sequence
+    assert "uploadType=resumable" in start[0]
+    assert [uri for uri, *_ in chunks] == ["https://upload.example/session"] * 3
+    assert [headers["Content-Range"] for *_, headers in chunks] == [
+        f"bytes 0-{CHUNK - 1}/{len(data)}",
+        f"bytes {CHUNK}-{2 * CHUNK - 1}/{len(data)}",
+        f"bytes {2 * CHUNK}-{len(data) - 1}/{len(data)}",
+    ]
+
+
+def test_download_uses_ranged_requests(tmp_path):
+    data = os.urandom(CHUNK + 10)
+    drive, http = drive_for([
+        ({"status": "200"}, json.dumps({"name": "report.bin"})),
+        ({"status": "206", "content-range": f"bytes 0-{CHUNK - 1}/{len(data)}"}, data[:CHUNK]),
+        ({"status": "206", "content-range": f"bytes {CHUNK}-{len(data) - 1}/{len(data)}"}, data[CHUNK:]),
+    ])
+
+    path = drive.download_file("F1", destination_path=str(tmp_path))
+
+    assert path == str(tmp_path / "report.bin")
+    assert (tmp_path / "report.bin").read_bytes() == data
+    assert [headers["range"] for *_, headers in http.request_sequence[1:]] == [
+        f"bytes=0-{CHUNK - 1}",
+        f"bytes={CHUNK}-{2 * CHUNK - 1}",
+    ]
+
+
+def test_folder_contents_follow_every_page():
+    drive, http = drive_for([
+        ({"status": "200"}, json.dumps({"files": [{"id": "a"}, {"id": "b"}], "nextPageToken": "p2"})),
+        ({"status": "200"}, json.dumps({"files": [{"id": "c"}], "nextPageToken": "p3"})),
+        ({"status": "200"}, json.dumps({"files": [{"id": "d"}]})),
+    ])
+
+    assert [f["id"] for f in drive.get_folder_contents("D1")] == ["a", "b", "c", "d"]
+    uris = [uri for uri, *_ in http.request_sequence]
+    assert "pageToken" not in uris[0]
+    assert "pageToken=p2" in uris[1] and "pageToken=p3" in uris[2]
+
+
+class SlowDrive(GoogleDrive):
+    """Uploads that take a while and record how many ran at the same time."""
+
+    def __init__(self):
+        super().__init__(jsonkey=None, http=HttpMockSequence([]))
+        self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def upload_file(self, filepath='', folder_id=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(0.05)
+            if filepath.startswith("missing"):
+                raise FileNotFoundError(filepath)
+            return {"id": filepath, "link": f"https://drive.example/{filepath}"}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.mark.anyio
+async def test_upload_many_returns_per_item_results_under_the_cap():
+    drive = SlowDrive()
+    client = AsyncGoogleDrive(drive, max_workers=8, max_concurrency=2)
+    paths = ["a", "missing-b", "c", "d", "missing-e"]
+    try:
+        results = await client.upload_many(paths, folder_id="D1")
+    finally:
+        client.close()
+
+    assert [r["id"] for r in (results[0], results[2], results[3])] == ["a", "c", "d"]
+    assert isinstance(results[1], FileNotFoundError) and isinstance(results[4], FileNotFoundError)
+    assert drive.peak == 2
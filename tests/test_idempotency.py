@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response as StarletteResponse
+from core.database import AsyncSessionDB
+from models.idempotency import IdempotencyKey
+from models.orders import Order
+from schemas.orders import OrderSchema
+from services.idempotency import IdempotencyInProgressError, IdempotencyService, request_fingerprint, _hot_responses
+from services.orders import OrderService
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+SCOPE = "orders.create"
+ORDER = OrderSchema(user_id="u1", status="Pending", currency="USD", total_amount=10.0, items=[])
+FINGERPRINT = request_fingerprint(ORDER.model_dump_json())
+
+
+@pytest.fixture(autouse=True)
+def empty_hot_cache():
+    _hot_responses.clear()
+
+
+class WorkerDied(BaseException):
+    """Stands in for the process going away: nothing after it runs, nothing commits."""
+
+
+def order_handler():
+    calls = []
+
+    async def handler(session: AsyncSession):
+        calls.append(1)
+        order = await OrderService(session).create_order(ORDER)
+        return StarletteResponse(order.id.encode(), status_code=201)
+
+    return handler, calls
+
+
+async def count_orders() -> int:
+    async with AsyncSessionDB() as session:
+        return await session.scalar(select(func.count()).select_from(Order))
+
+
+async def claim(db, key: str, locked_until):
+    """A claim committed without its response, as recorded before responses were stored atomically."""
+    now = datetime.utcnow()
+    await db.execute(insert(IdempotencyKey).values(
+        scope=SCOPE, key=key, fingerprint=FINGERPRINT,
+        created_at=now, expires_at=now + timedelta(hours=24), locked_until=locked_until,
+    ))
+    await db.commit()
+
+
+async def test_worker_dying_after_the_handler_commits_leaves_nothing_behind(db, monkeypatch):
+    async def die(self, key, stored):
+        raise WorkerDied()
+
+    handler, calls = order_handler()
+    with monkeypatch.context() as patch:
+        patch.setattr(IdempotencyService, "_record", die)
+        with pytest.raises(WorkerDied):
+            await IdempotencyService(db, SCOPE).run("k1", FINGERPRINT, handler)
+    # The connection goes away with the worker
+    await db.close()
+    assert await count_orders() == 0
+
+    async with AsyncSessionDB() as session:
+        first = await IdempotencyService(session, SCOPE).run("k1", FINGERPRINT, handler)
+    _hot_responses.clear()
+    async with AsyncSessionDB() as session:
+        replayed = await IdempotencyService(session, SCOPE).run("k1", FINGERPRINT, handler)
+
+    assert replayed.body == first.body
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert await count_orders() == 1
+    assert len(calls) == 2  # the attempt that died, and the retry
+
+
+async def test_failed_handler_releases_the_key(db):
+    async def failing(session: AsyncSession):
+        await OrderService(session).create_order(ORDER)
+        return StarletteResponse(b"boom", status_code=500)
+
+    response = await IdempotencyService(db, SCOPE).run("k2", FINGERPRINT, failing)
+    assert response.status_code == 500
+    assert await count_orders() == 0
+    assert await db.scalar(select(func.count()).select_from(IdempotencyKey)) == 0
+
+
+@pytest.mark.parametrize("locked_until", [
+    pytest.param(datetime.utcnow() - timedelta(seconds=1), id="lease-lapsed"),
+    pytest.param(None, id="claimed-before-leases"),
+])
+async def test_claim_without_response_is_taken_over_once_its_lease_lapses(db, locked_until):
+    await claim(db, "k3", locked_until)
+    handler, calls = order_handler()
+
+    response = await IdempotencyService(db, SCOPE, wait=1).run("k3", FINGERPRINT, handler)
+
+    assert response.status_code == 201 and len(calls) == 1
+    row = await db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == "k3"))
+    assert row.status_code == 201
+
+
+async def test_claim_within_its_lease_is_in_progress(db):
+    await claim(db, "k4", datetime.utcnow() + timedelta(minutes=1))
+    handler, calls = order_handler()
+
+    with pytest.raises(IdempotencyInProgressError):
+        await IdempotencyService(db, SCOPE, wait=0.1).run("k4", FINGERPRINT, handler)
+    assert calls == []
+
+
+async def test_postgres_concurrent_duplicates_create_one_order(postgres_url):
+    engine = create_async_engine(postgres_url)
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    key = f"concurrent-{datetime.utcnow().timestamp()}"
+    handler, calls = order_handler()
+
+    async def request():
+        async with sessions() as session:
+            # Separate workers: no shared in-process state
+            _hot_responses.clear()
+            return await IdempotencyService(session, SCOPE).run(key, FINGERPRINT, handler)
+
+    try:
+        responses = await asyncio.gather(*(request() for _ in range(4)))
+    finally:
+        await engine.dispose()
+    assert len({response.body for response in responses}) == 1
+    assert len(calls) == 1
@@ -0,0 +1,63 @@
+from PIL import Image
+from core.utils.file import ImageFile
+from core.utils.images import ImagePipeline, ImageVariant, fit_size, process_image
+import io
+import pytest
+
+VARIANTS = (
+    ImageVariant("large", (1600, 1600), "webp", 75),
+    ImageVariant("thumbnail", (200, 200), "jpeg", 60),
+    ImageVariant("original", None, "png"),
+)
+
+
+def jpeg(size=(2000, 1000), orientation=None) -> bytes:
+    buffer = io.BytesIO()
+    image = Image.new("RGB", size, (200, 30, 30))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def decoded(data: bytes):
+    with Image.open(io.BytesIO(data)) as image:
+        return image.format, image.size
+
+
+def test_fit_size_keeps_the_aspect_ratio_and_never_upscales():
+    assert fit_size((2000, 1000), (800, 800)) == (800, 400)
+    assert fit_size((300, 600), (800, 800)) == (300, 600)
+    assert fit_size((300, 600), None) == (300, 600)
+
+
+def test_every_variant_comes_from_one_decode():
+    results = process_image(jpeg(), VARIANTS)
+    assert decoded(results["large"]) == ("WEBP", (1600, 800))
+    assert decoded(results["thumbnail"]) == ("JPEG", (200, 100))
+    assert decoded(results["original"]) == ("PNG", (2000, 1000))
+
+
+def test_exif_rotation_is_applied():
+    # Orientation 6: stored landscape, displayed portrait
+    results = process_image(jpeg(orientation=6), VARIANTS[:1])
+    assert decoded(results["large"]) == ("WEBP", (800, 1600))
+
+
+def test_reduce_image_quality_writes_the_target_format(tmp_path):
+    source, target = tmp_path / "in.jpg", tmp_path / "out.webp"
+    source.write_bytes(jpeg())
+    ImageFile.reduce_image_quality(str(source), str(target), quality=30)
+    assert decoded(target.read_bytes()) == ("WEBP", (2000, 1000))
+
+
+@pytest.mark.anyio
+async def test_pipeline_reports_failures_per_image():
+    pipeline = ImagePipeline(max_workers=1)
+    try:
+        good, bad = await pipeline.process_many([jpeg(), b"not an image"], VARIANTS[1:2])
+    finally:
+        pipeline.close()
+    assert decoded(good["thumbnail"]) == ("JPEG", (200, 100))
+    assert isinstance(bad, Exception)
@@ -0,0 +1,115 @@
+from aiokafka.structs import TopicPartition
+from types import SimpleNamespace
+from core.utils.kafka import KafkaConsumer
+import asyncio
+import json
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+TP = TopicPartition("orders", 0)
+
+
+class Rewound(Exception):
+    pass
+
+
+class Drained(Exception):
+    pass
+
+
+class FakeConsumer:
+    """Hands out `messages` as one batch, then stops the loop with Drained."""
+
+    def __init__(self, messages, running=()):
+        self.messages = messages
+        self.running = running
+        self.rewound_while_running = None
+        self.committed = []
+
+    async def getmany(self, timeout_ms, max_records):
+        if self.committed:
+            raise Drained()
+        return {TP: self.messages}
+
+    async def commit(self, offsets):
+        self.committed.append(offsets)
+
+    def seek(self, tp, offset):
+        self.rewound_while_running = set(self.running)
+        raise Rewound()
+
+    def assignment(self):
+        return []
+
+
+def message(offset: int, key: bytes, value: bytes):
+    return SimpleNamespace(topic=TP.topic, partition=TP.partition, offset=offset, key=key, value=value, timestamp=0)
+
+
+async def test_failed_batch_cancels_in_flight_groups_before_rewinding():
+    running, finished = set(), []
+
+    async def handler(payload):
+        running.add(payload["id"])
+        try:
+            await asyncio.sleep(0.5)
+            finished.append(payload["id"])
+        finally:
+            running.discard(payload["id"])
+
+    consumer = KafkaConsumer("broker", "orders", "group", handler=handler, enable_auto_commit=False)
+    consumer.consumer = FakeConsumer([
+        message(0, b"slow", json.dumps({"id": "slow"}).encode()),
+        # Undecodable and no dead-letter topic: the batch fails
+        message(1, b"poison", b"not json"),
+    ], running)
+
+    with pytest.raises(Rewound):
+        await consumer.consume_batches()
+
+    assert consumer.consumer.rewound_while_running == set()
+    assert finished == []
+
+
+async def test_keys_run_concurrently_in_order_and_offsets_follow_the_batch():
+    handled = []
+
+    async def handler(payload):
+        # Later messages of another key finish first unless keys are processed concurrently
+        await asyncio.sleep(payload["delay"])
+        handled.append((payload["key"], payload["n"]))
+
+    messages = [
+        message(0, b"a", json.dumps({"key": "a", "n": 0, "delay": 0.05}).encode()),
+        message(1, b"b", json.dumps({"key": "b", "n": 0, "delay": 0.0}).encode()),
+        message(2, b"a", json.dumps({"key": "a", "n": 1, "delay": 0.0}).encode()),
+    ]
+    consumer = KafkaConsumer("broker", "orders", "group", handler=handler, enable_auto_commit=False)
+    consumer.consumer = FakeConsumer(messages)
+
+    with pytest.raises(Drained):
+        await consumer.consume_batches()
+
+    assert handled == [("b", 0), ("a", 0), ("a", 1)]
+    assert consumer.consumer.committed == [{TP: 3}]
+
+
+async def test_poison_message_is_dead_lettered_and_the_batch_committed():
+    class Producer:
+        sent = []
+
+        async def send(self, message, key=None, topic=None, wait=True):
+            self.sent.append((topic, message["offset"], key))
+
+    consumer = KafkaConsumer(
+        "broker", "orders", "group", handler=None, producer=Producer(),
+        dlq_topic="orders.dlq", enable_auto_commit=False,
+    )
+    consumer.consumer = FakeConsumer([message(0, b"o1", b"not json"), message(1, b"o2", b"{}")])
+
+    with pytest.raises(Drained):
+        await consumer.consume_batches()
+
+    assert Producer.sent == [("orders.dlq", 0, "o1")]
+    assert consumer.consumer.committed == [{TP: 2}]
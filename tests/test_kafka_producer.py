@@ -0,0 +1,85 @@
+from core.utils import kafka
+from core.utils.kafka import KafkaProducer
+import asyncio
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeAIOKafkaProducer:
+    instances = []
+
+    def __init__(self, **config):
+        self.config = config
+        self.calls = []
+        FakeAIOKafkaProducer.instances.append(self)
+
+    async def start(self):
+        await asyncio.sleep(0.01)  # lets concurrent start() calls overlap
+        self.calls.append("start")
+
+    async def send(self, topic, value, key=None):
+        self.calls.append(("send", topic, value, key))
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    async def send_and_wait(self, topic, value, key=None):
+        self.calls.append(("send_and_wait", topic, value, key))
+
+    async def flush(self):
+        self.calls.append("flush")
+
+    async def stop(self):
+        self.calls.append("stop")
+
+
+@pytest.fixture
+def fake_producer(monkeypatch):
+    FakeAIOKafkaProducer.instances = []
+    monkeypatch.setattr(kafka, "AIOKafkaProducer", FakeAIOKafkaProducer)
+    return FakeAIOKafkaProducer.instances
+
+
+@pytest.mark.parametrize("acks, expected", [("1", 1), ("-1", -1), ("all", "all")])
+async def test_concurrent_starts_share_one_producer(fake_producer, acks, expected):
+    producer = KafkaProducer("broker:9092", "orders", acks=acks)
+
+    await asyncio.gather(*(producer.start() for _ in range(5)))
+
+    assert len(fake_producer) == 1
+    assert fake_producer[0].calls == ["start"]
+    assert fake_producer[0].config["acks"] == expected
+    assert producer.is_started
+
+
+async def test_send_without_waiting_returns_the_delivery_future(fake_producer):
+    producer = KafkaProducer("broker:9092", "orders")
+    await producer.start()
+
+    future = await producer.send({"id": "o1"}, key="o1", wait=False)
+    await producer.send(b"raw", topic="orders.dlq")
+
+    assert await future is None
+    assert fake_producer[0].calls[1:] == [
+        ("send", "orders", b'{"id": "o1"}', b"o1"),
+        ("send_and_wait", "orders.dlq", b"raw", None),
+    ]
+
+
+async def test_stop_flushes_before_stopping(fake_producer):
+    producer = KafkaProducer("broker:9092", "orders")
+    await producer.start()
+
+    await producer.stop()
+    await producer.stop()
+
+    assert fake_producer[0].calls == ["start", "flush", "stop"]
+    with pytest.raises(RuntimeError):
+        await producer.send({"id": "o1"})
+
+
+async def test_creating_an_order_starts_no_producer(fake_producer, client):
+    await create_order(client)
+    assert fake_producer == []
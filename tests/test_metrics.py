@@ -0,0 +1,43 @@
+from prometheus_client import REGISTRY
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+ORDER_ROUTE = "/api/v1/orders/{order_id}"
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+async def test_requests_are_counted_by_route_template(client):
+    order = await create_order(client, items=2)
+    requests = sample("http_requests_total", method="GET", route=ORDER_ROUTE, status="200")
+    queries = sample("http_request_db_queries_sum", route=ORDER_ROUTE)
+
+    response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.status_code == 200
+
+    assert sample("http_requests_total", method="GET", route=ORDER_ROUTE, status="200") == requests + 1
+    assert sample("http_request_duration_seconds_count", method="GET", route=ORDER_ROUTE) >= 1
+    # The order and its items
+    assert sample("http_request_db_queries_sum", route=ORDER_ROUTE) == queries + 2
+    assert sample("http_requests_in_flight", method="GET") == 0
+
+
+async def test_unknown_paths_share_one_series(client):
+    before = sample("http_requests_total", method="GET", route="unmatched", status="404")
+    for path in ("/wp-login.php", "/.env"):
+        assert (await client.get(path)).status_code == 404
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") == before + 2
+
+
+async def test_metrics_endpoint_exposes_the_series(client):
+    order = await create_order(client)
+    await client.get(f"/api/v1/orders/{order['id']}")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert f'route="{ORDER_ROUTE}"' in response.text
+    assert order["id"] not in response.text
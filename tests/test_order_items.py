@@ -0,0 +1,75 @@
+from sqlalchemy import func, select
+from models.order_stats import OrderStatsHourly
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def gmv(db) -> float:
+    return await db.scalar(select(func.coalesce(func.sum(OrderStatsHourly.gmv), 0)))
+
+
+async def test_item_writes_keep_order_total_and_stats_in_step(client, db):
+    order = await create_order(client, items=2)  # two items of 10.0
+    assert await gmv(db) == 20.0
+
+    response = await client.post(
+        "/api/v1/orders/items",
+        params={"order_id": order["id"], "product_id": "px", "quantity": 2, "price_per_unit": 3.0},
+    )
+    item_id = response.json()["data"]["id"]
+    response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.json()["data"]["total_amount"] == 26.0
+    assert await gmv(db) == 26.0
+
+    await client.put(
+        f"/api/v1/orders/items/{item_id}",
+        json={"product_id": "px", "quantity": 5, "price_per_unit": 3.0, "total_price": None},
+    )
+    response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.json()["data"]["total_amount"] == 35.0
+    assert response.json()["data"]["version"] == order["version"] + 2
+    assert await gmv(db) == 35.0
+
+    await client.delete(f"/api/v1/orders/items/{item_id}")
+    response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.json()["data"]["total_amount"] == 20.0
+    assert await gmv(db) == 20.0
+
+
+async def test_item_writes_keep_adjustments_in_the_total(client, db):
+    # Two items of 10.0 plus 5.0 shipping
+    order = await create_order(client, items=2, total_amount=25.0)
+
+    await client.post(
+        "/api/v1/orders/items",
+        params={"order_id": order["id"], "product_id": "px", "quantity": 1, "price_per_unit": 4.0},
+    )
+    response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.json()["data"]["total_amount"] == 29.0
+
+    items = [{"product_id": "p0", "quantity": 2, "price_per_unit": 10.0, "total_price": None}]
+    response = await client.put(f"/api/v1/orders/{order['id']}", json={"items": items})
+    assert response.json()["data"]["total_amount"] == 25.0
+    assert await gmv(db) == 25.0
+
+    # A total given with the items is taken as is
+    response = await client.put(f"/api/v1/orders/{order['id']}", json={"items": items, "total_amount": 22.0})
+    assert response.json()["data"]["total_amount"] == 22.0
+    assert await gmv(db) == 22.0
+
+
+async def test_missing_order_or_item_is_404(client):
+    response = await client.put("/api/v1/orders/missing", json={"status": "Shipped"})
+    assert response.status_code == 404
+
+    response = await client.post(
+        "/api/v1/orders/items",
+        params={"order_id": "missing", "product_id": "px", "quantity": 1, "price_per_unit": 1.0},
+    )
+    assert response.status_code == 404
+
+    item = {"product_id": "px", "quantity": 1, "price_per_unit": 1.0, "total_price": None}
+    assert (await client.put("/api/v1/orders/items/missing", json=item)).status_code == 404
+    assert (await client.delete("/api/v1/orders/items/missing")).status_code == 404
@@ -0,0 +1,64 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from core.database import AsyncSessionDB
+from models.order_stats import OrderStatsHourly
+from models.orders import Order
+from services.order_stats import rebuild_order_stats
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def rollup(db) -> set:
+    rows = (await db.execute(select(OrderStatsHourly).where(OrderStatsHourly.order_count != 0))).scalars().all()
+    return {(row.bucket, row.currency, row.status, row.order_count, round(row.gmv, 2)) for row in rows}
+
+
+async def test_write_paths_keep_the_rollup_equal_to_a_rebuild(client, db):
+    orders = [await create_order(client, items=n) for n in (1, 2, 3)]
+    await create_order(client, currency="EUR")
+    await client.put(f"/api/v1/orders/{orders[0]['id']}", json={"status": "Shipped"})
+    await client.put(f"/api/v1/orders/{orders[1]['id']}", json={"total_amount": 12.5})
+    await client.post(
+        "/api/v1/orders/items",
+        params={"order_id": orders[2]["id"], "product_id": "px", "quantity": 1, "price_per_unit": 4.0},
+    )
+    await client.delete(f"/api/v1/orders/{orders[2]['id']}")
+    incremental = await rollup(db)
+
+    async with AsyncSessionDB() as session:
+        await rebuild_order_stats(session)
+    assert await rollup(db) == incremental
+
+
+async def test_series_and_funnel(client, db):
+    created = {
+        datetime(2025, 3, 1, 9, 15): "Delivered",
+        datetime(2025, 3, 1, 17, 40): "Shipped",
+        datetime(2025, 3, 2, 8, 5): "Pending",
+        datetime(2025, 3, 2, 8, 50): "Cancelled",
+    }
+    orders = {created_at: await create_order(client, items=1, status=status) for created_at, status in created.items()}
+    for created_at, order in orders.items():
+        await db.execute(update(Order).where(Order.id == order["id"]).values(created_at=created_at))
+    await db.commit()
+    await rebuild_order_stats(db)
+
+    response = await client.get("/api/v1/orders/stats", params={"interval": "day"})
+    days = [(row["bucket"], row["order_count"], row["gmv"]) for row in response.json()["data"]]
+    assert days == [("2025-03-01T00:00:00", 2, 20.0), ("2025-03-02T00:00:00", 2, 20.0)]
+
+    response = await client.get(
+        "/api/v1/orders/stats",
+        params={"interval": "hour", "start_date": "2025-03-02T08:30:00", "by_status": True},
+    )
+    hours = [(row["bucket"], row["status"], row["order_count"]) for row in response.json()["data"]]
+    # start_date is rounded down to its hour
+    assert sorted(hours) == [("2025-03-02T08:00:00", "Cancelled", 1), ("2025-03-02T08:00:00", "Pending", 1)]
+
+    (funnel,) = (await client.get("/api/v1/orders/stats/funnel")).json()["data"]
+    reached = {row["status"]: row.get("reached") for row in funnel["statuses"]}
+    assert funnel["order_count"] == 4
+    assert (reached["Pending"], reached["Processing"], reached["Shipped"], reached["Delivered"]) == (4, 2, 2, 1)
+    assert reached["Cancelled"] is None
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from core.database import AsyncSessionDB
+from models.outbox import OrderOutbox
+from services.outbox import OutboxRelay, order_event_row
+import asyncio
+import json
+import pytest
+from test_query_counts import create_order, order_payload
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeProducer:
+    """Acks every send once `acked` is set; payloads listed in `failing` are nacked."""
+
+    is_started = True
+
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+        self.acked = asyncio.Event()
+        self.acked.set()
+
+    async def send(self, payload, key=None, topic=None, wait=True):
+        self.sent.append(key)
+        return asyncio.ensure_future(self._ack(key))
+
+    async def _ack(self, key):
+        await self.acked.wait()
+        if key in self.failing:
+            raise RuntimeError(f"broker rejected {key}")
+
+
+async def add_events(session_factory, *order_ids):
+    async with session_factory() as session:
+        await session.execute(insert(OrderOutbox), [order_event_row({"id": order_id}, "create") for order_id in order_ids])
+        await session.commit()
+
+
+async def outbox(session_factory):
+    async with session_factory() as session:
+        return (await session.execute(select(OrderOutbox).order_by(OrderOutbox.id))).scalars().all()
+
+
+async def test_batch_is_claimed_before_it_is_published(db):
+    await add_events(AsyncSessionDB, "o1", "o2")
+    producer = FakeProducer()
+    producer.acked.clear()
+    relay = OutboxRelay(producer, batch_size=10)
+
+    first = asyncio.create_task(relay.relay_batch())
+    while len(producer.sent) < 2:
+        await asyncio.sleep(0.01)
+    # The claim is committed while the acks are pending, and a second relay leaves the batch alone
+    assert all(event.claimed_until is not None for event in await outbox(AsyncSessionDB))
+    assert await OutboxRelay(producer, batch_size=10).relay_batch() == 0
+
+    producer.acked.set()
+    assert await first == 2
+    assert producer.sent == ["o1", "o2"]
+    events = await outbox(AsyncSessionDB)
+    assert all(event.published_at is not None and event.claimed_until is None for event in events)
+
+
+async def test_unacknowledged_suffix_is_released_for_retry(db):
+    await add_events(AsyncSessionDB, "o1", "o2", "o3")
+    relay = OutboxRelay(FakeProducer(failing={"o2"}), batch_size=10)
+
+    with pytest.raises(RuntimeError):
+        await relay.relay_batch()
+
+    published, failed, after = await outbox(AsyncSessionDB)
+    assert published.published_at is not None
+    for event in (failed, after):
+        assert event.published_at is None and event.claimed_until is None and event.attempts == 1
+
+    relay.producer = FakeProducer()
+    assert await relay.relay_batch() == 2
+    assert relay.producer.sent == ["o2", "o3"]
+
+
+async def test_lapsed_claim_is_taken_over(db):
+    await add_events(AsyncSessionDB, "o1")
+    async with AsyncSessionDB() as session:
+        # A relay that died while publishing
+        await session.execute(update(OrderOutbox).values(claimed_until=datetime.utcnow() - timedelta(seconds=1)))
+        await session.commit()
+
+    producer = FakeProducer()
+    assert await OutboxRelay(producer).relay_batch() == 1
+    assert producer.sent == ["o1"]
+
+
+async def test_postgres_concurrent_relays_publish_each_event_once(postgres_url):
+    engine = create_async_engine(postgres_url)
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("TRUNCATE order_outbox"))
+        await add_events(sessions, *(f"o{n}" for n in range(20)))
+
+        producer = FakeProducer()
+        relays = [OutboxRelay(producer, session_factory=sessions, batch_size=5) for _ in range(4)]
+        while len(producer.sent) < 20:
+            await asyncio.gather(*(relay.relay_batch() for relay in relays))
+    finally:
+        await engine.dispose()
+    assert producer.sent == [f"o{n}" for n in range(20)]
+
+
+async def test_order_and_its_event_commit_together(client, monkeypatch):
+    order = await create_order(client)
+    (event,) = await outbox(AsyncSessionDB)
+    assert (event.aggregate_id, event.event_type, event.published_at) == (order["id"], "create", None)
+    assert json.loads(event.payload)["order"]["id"] == order["id"]
+
+    async def fail(*args):
+        raise RuntimeError("stats rollup unavailable")
+
+    monkeypatch.setattr("services.orders.apply_stats_deltas", fail)
+    response = await client.post("/api/v1/orders/", json=order_payload())
+    assert response.status_code == 500
+    assert len(await outbox(AsyncSessionDB)) == 1
+
+    producer = FakeProducer()
+    assert await OutboxRelay(producer).relay_batch() == 1
+    assert producer.sent == [order["id"]]
@@ -0,0 +1,55 @@
+from datetime import datetime
+from sqlalchemy import update
+from models.orders import Order
+from models.payments import Payment, PaymentMethod
+from services.payments import PaymentService
+import pytest
+from test_query_counts import create_order
+
+pytestmark = pytest.mark.anyio
+
+SAME_TIME = datetime(2025, 6, 1, 12, 0, 0)
+
+
+async def walk(client, url, limit=2, **params):
+    """Every page of a keyset listing, following next_cursor from the first page."""
+    ids, cursor = [], ""
+    while cursor is not None:
+        response = await client.get(url, params={**params, "cursor": cursor, "limit": limit})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert len(body["data"]) <= limit
+        ids += [row["id"] for row in body["data"]]
+        cursor = body["next_cursor"]
+    return ids
+
+
+async def test_orders_cursor_walks_every_order_once_newest_first(client, db):
+    first, *tied, last = [(await create_order(client))["id"] for _ in range(5)]
+    for order_ids, created_at in (([first], datetime(2025, 5, 1)), (tied, SAME_TIME), ([last], datetime(2025, 7, 1))):
+        await db.execute(update(Order).where(Order.id.in_(order_ids)).values(created_at=created_at))
+    await db.commit()
+
+    # Ties on created_at are broken by id
+    assert await walk(client, "/api/v1/orders/") == [last, *sorted(tied, reverse=True), first]
+
+
+async def test_items_and_payments_cursors_walk_every_row_once(client, db):
+    order = await create_order(client, items=5)
+    item_ids = await walk(client, f"/api/v1/orders/{order['id']}/items")
+    assert item_ids == sorted((item["id"] for item in order["items"]), reverse=True)
+
+    service = PaymentService(db)
+    payments = [
+        await service.create_payment(order_id=f"o{n}", method=PaymentMethod.CreditCard, amount=1.0, currency="USD")
+        for n in range(5)
+    ]
+    await db.execute(update(Payment).values(created_at=SAME_TIME))
+    await db.commit()
+    assert await walk(client, "/api/v1/payments/") == sorted((p.id for p in payments), reverse=True)
+
+
+@pytest.mark.parametrize("url", ["/api/v1/orders/", "/api/v1/payments/"])
+async def test_malformed_cursor_is_a_bad_request(client, url):
+    response = await client.get(url, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,45 @@
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from models.payments import Payment
+from services.payments import handle_order_event
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+EVENT = {
+    "action": "create",
+    "order": {"id": "o1", "user_id": "u1", "total_amount": 10.0, "currency": "USD", "payment_method": "CreditCard"},
+}
+
+
+async def test_redelivered_event_opens_one_payment(db):
+    await handle_order_event(EVENT)
+    await handle_order_event(EVENT)
+
+    assert await db.scalar(select(func.count()).select_from(Payment)) == 1
+
+
+async def test_second_root_payment_for_an_order_is_a_conflict(db, client):
+    params = {"order_id": "o1", "amount": 10.0, "currency": "USD", "method": "CreditCard"}
+    assert (await client.post("/api/v1/payments/", params=params)).status_code == 201
+
+    assert (await client.post("/api/v1/payments/", params=params)).status_code == 409
+
+    root = await db.scalar(select(Payment.id))
+    refund = await client.post("/api/v1/payments/", params={**params, "parent_payment_id": root})
+    assert refund.status_code == 201
+
+
+async def test_postgres_concurrent_deliveries_open_one_payment(postgres_url):
+    engine = create_async_engine(postgres_url)
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("TRUNCATE payments"))
+        await asyncio.gather(*(handle_order_event(EVENT, session_factory=sessions) for _ in range(4)))
+        async with sessions() as session:
+            assert await session.scalar(select(func.count()).select_from(Payment)) == 1
+    finally:
+        await engine.dispose()
@@ -0,0 +1,51 @@
+from starlette.responses import PlainTextResponse
+from core.middleware.profiling import ProfilingMiddleware, profiling_available
+import asyncio
+import httpx
+import os
+import pytest
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(not profiling_available(), reason="pyinstrument is not installed"),
+]
+
+
+async def slow(scope, receive, send):
+    await asyncio.sleep(0.05)
+    await PlainTextResponse("done")(scope, receive, send)
+
+
+async def fast(scope, receive, send):
+    await PlainTextResponse("done")(scope, receive, send)
+
+
+async def request(endpoint, directory, headers=None, **options):
+    app = ProfilingMiddleware(endpoint, directory=str(directory), threshold_ms=20, **options)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/", headers=headers)).status_code == 200
+    return os.listdir(directory)
+
+
+async def test_every_slow_request_is_kept_by_default(tmp_path):
+    for _ in range(3):
+        await request(slow, tmp_path)
+    assert len(os.listdir(tmp_path)) == 3
+
+
+async def test_fast_request_is_not_kept(tmp_path):
+    assert await request(fast, tmp_path) == []
+
+
+@pytest.mark.parametrize("allow_header, kept", [(True, 1), (False, 0)])
+async def test_profiling_header_only_forces_a_profile_when_allowed(tmp_path, allow_header, kept):
+    files = await request(fast, tmp_path, headers={"X-Profile": "1"}, header="X-Profile", allow_header=allow_header)
+    assert len(files) == kept
+
+
+async def test_only_the_newest_profiles_are_kept(tmp_path):
+    for _ in range(4):
+        files = await request(slow, tmp_path, max_files=2)
+    assert len(files) == 2
+    # No route matched outside the app, hence "unmatched"
+    assert all("-GET-unmatched-" in name and name.endswith("ms.speedscope.json") for name in files)
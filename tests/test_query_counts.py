@@ -0,0 +1,176 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+import pytest
+from core.database import engine_db
+
+pytestmark = pytest.mark.anyio
+
+
+class QueryLog(list):
+    """Statements executed inside count_queries(), for assertion messages."""
+
+
+@contextmanager
+def count_queries():
+    log = QueryLog()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        log.append(statement)
+
+    event.listen(engine_db.sync_engine, "before_cursor_execute", record)
+    try:
+        yield log
+    finally:
+        event.remove(engine_db.sync_engine, "before_cursor_execute", record)
+
+
+def order_payload(items=2, **fields):
+    return {
+        "user_id": "u1",
+        "status": "Pending",
+        "currency": "USD",
+        "total_amount": 10.0 * items,
+        "items": [
+            {"product_id": f"p{n}", "quantity": 1, "price_per_unit": 10.0, "total_price": None}
+            for n in range(items)
+        ],
+        **fields,
+    }
+
+
+async def create_order(client, **fields):
+    response = await client.post("/api/v1/orders/", json=order_payload(**fields))
+    assert response.status_code == 201, response.text
+    return response.json()["data"]
+
+
+def assert_queries(log, expected):
+    assert len(log) == expected, f"{len(log)} statements, expected {expected}:\n" + "\n".join(log)
+
+
+# Fixed statement counts per route. An N+1 shows up as a count growing with the number of
+# orders or items; a relationship loaded implicitly fails with lazy="raise" (500).
+
+async def test_create_order(client):
+    with count_queries() as log:
+        await create_order(client, items=3)
+    # orders, order_items and outbox INSERTs, stats rollup upsert
+    assert_queries(log, 4)
+
+
+async def test_created_order_is_returned_without_a_reread(client):
+    with count_queries() as log:
+        order = await create_order(client, items=2)
+    assert not any(statement.lstrip().upper().startswith("SELECT") for statement in log)
+    # What was returned from memory is what got stored
+    response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.json()["data"] == order
+    assert order["version"] == 1 and len(order["items"]) == 2
+
+
+async def test_get_order(client):
+    order = await create_order(client, items=3)
+    with count_queries() as log:
+        response = await client.get(f"/api/v1/orders/{order['id']}")
+    assert response.status_code == 200
+    assert len(response.json()["data"]["items"]) == 3
+    # The order, then its items with one selectin load
+    assert_queries(log, 2)
+
+    with count_queries() as log:
+        response = await client.get(f"/api/v1/orders/{order['id']}", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert_queries(log, 1)
+
+
+@pytest.mark.parametrize("orders", [1, 5])
+async def test_list_orders(client, orders):
+    for _ in range(orders):
+        await create_order(client, items=2)
+    with count_queries() as log:
+        response = await client.get("/api/v1/orders/", params={"limit": 10})
+    assert len(response.json()["data"]) == orders
+    # Live orders, their items, then the archive (the page is short of the limit)
+    assert_queries(log, 3)
+
+    with count_queries() as log:
+        response = await client.get("/api/v1/orders/", params={"cursor": "", "limit": 10})
+    assert len(response.json()["data"]) == orders
+    # Live orders, their items, the archived orders of the same page (none, so no items query)
+    assert_queries(log, 3)
+
+
+async def test_update_order_status(client):
+    order = await create_order(client)
+    with count_queries() as log:
+        response = await client.put(f"/api/v1/orders/{order['id']}", json={"status": "Processing"})
+    assert response.status_code == 200
+    # Current state, UPDATE ... RETURNING, stats upsert, then the order and its items
+    assert_queries(log, 5)
+
+
+async def test_update_order_items(client):
+    order = await create_order(client, items=3)
+    items = [
+        {"product_id": "p0", "quantity": 3, "price_per_unit": 10.0, "total_price": None},  # changed
+        {"product_id": "p1", "quantity": 1, "price_per_unit": 10.0, "total_price": None},  # unchanged
+        {"product_id": "p9", "quantity": 1, "price_per_unit": 5.0, "total_price": None},   # new
+    ]
+    with count_queries() as log:
+        response = await client.put(f"/api/v1/orders/{order['id']}", json={"items": items})
+    assert response.status_code == 200
+    assert response.json()["data"]["total_amount"] == 45.0
+    # Current state, stored items, one DELETE, one UPDATE and one INSERT for the item diff,
+    # UPDATE ... RETURNING, stats upsert, then the order and its items
+    assert_queries(log, 9)
+
+
+async def test_delete_order(client):
+    order = await create_order(client, items=3)
+    with count_queries() as log:
+        response = await client.delete(f"/api/v1/orders/{order['id']}")
+    assert response.status_code == 204
+    # Items, DELETE ... RETURNING of the order, stats upsert
+    assert_queries(log, 3)
+
+
+async def test_list_items_for_order(client):
+    order = await create_order(client, items=4)
+    with count_queries() as log:
+        response = await client.get(f"/api/v1/orders/{order['id']}/items")
+    assert len(response.json()["data"]) == 4
+    # Order state for the ETag, then the items
+    assert_queries(log, 2)
+
+
+async def test_item_writes(client):
+    order = await create_order(client, items=1)
+    with count_queries() as log:
+        response = await client.post(
+            "/api/v1/orders/items",
+            params={"order_id": order["id"], "product_id": "px", "quantity": 2, "price_per_unit": 3.0},
+        )
+    assert response.status_code == 201
+    item_id = response.json()["data"]["id"]
+    # UPDATE ... RETURNING of the order (which checks it exists), item INSERT, stats upsert
+    assert_queries(log, 3)
+
+    with count_queries() as log:
+        response = await client.get(f"/api/v1/orders/items/{item_id}")
+    assert response.status_code == 200
+    assert_queries(log, 1)
+
+    with count_queries() as log:
+        response = await client.put(
+            f"/api/v1/orders/items/{item_id}",
+            json={"product_id": "px", "quantity": 4, "price_per_unit": 3.0, "total_price": None},
+        )
+    assert response.status_code == 200
+    # The item, item UPDATE, UPDATE ... RETURNING of the order, stats upsert
+    assert_queries(log, 4)
+
+    with count_queries() as log:
+        response = await client.delete(f"/api/v1/orders/items/{item_id}")
+    assert response.status_code == 204
+    # The item, item DELETE, UPDATE ... RETURNING of the order, stats upsert
+    assert_queries(log, 4)
@@ -0,0 +1,110 @@
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from core.config import settings
+from core.database import AsyncSessionDB, Base, ReplicaLag, _engine_options, get_read_sessionmaker
+from core.middleware.replica import ReadYourWritesMiddleware
+from core.utils import metrics
+from schemas.orders import OrderSchema
+from services.orders import build_order
+import core.database
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+class FixedLag(ReplicaLag):
+    def __init__(self, engine, lag):
+        super().__init__(engine, max_lag=2, interval=0)
+        self.fixed = lag
+
+    async def measure(self):
+        return self.fixed
+
+
+def request(cookies: str = "") -> Request:
+    headers = [(b"cookie", cookies.encode())] if cookies else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def checkout_waits() -> float:
+    return metrics.DB_POOL_CHECKOUT_WAIT._sum.get()
+
+
+@pytest.fixture
+async def replica(tmp_path, monkeypatch):
+    """A second SQLite database standing in for the read replica."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"
+    engine = create_async_engine(url, **_engine_options(url, instrumented=False))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(core.database, "AsyncSessionReplica", factory)
+    monkeypatch.setattr(core.database, "replica_lag", ReplicaLag(engine, interval=0))
+    yield factory
+    await engine.dispose()
+
+
+async def test_without_replica_reads_use_the_primary():
+    assert core.database.AsyncSessionReplica is None
+    assert await get_read_sessionmaker(request()) is AsyncSessionDB
+
+
+async def test_reads_use_the_replica(replica):
+    assert await get_read_sessionmaker(request()) is replica
+
+
+async def test_recent_writer_reads_from_the_primary(replica):
+    assert await get_read_sessionmaker(request(f"{settings.DB_PRIMARY_COOKIE}=1")) is AsyncSessionDB
+
+
+@pytest.mark.parametrize("lag,database", [(0.5, "replica"), (2.0, "replica"), (5.0, "primary")])
+async def test_lagging_replica_falls_back_to_the_primary(replica, monkeypatch, lag, database):
+    monkeypatch.setattr(core.database, "replica_lag", FixedLag(None, lag))
+    expected = replica if database == "replica" else AsyncSessionDB
+    assert await get_read_sessionmaker(request()) is expected
+
+
+async def test_unreachable_replica_falls_back_to_the_primary(replica, tmp_path, monkeypatch):
+    missing = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'no-such-dir' / 'replica.db'}")
+    monkeypatch.setattr(core.database, "replica_lag", ReplicaLag(missing, interval=0))
+    assert await get_read_sessionmaker(request()) is AsyncSessionDB
+    assert core.database.replica_lag.lag is None
+
+
+async def test_replica_checkouts_do_not_feed_the_primary_pool_wait(replica):
+    waited, ewma = checkout_waits(), core.database.pool_wait.value
+    async with replica() as session:
+        await session.connection()
+    assert checkout_waits() == waited
+    assert core.database.pool_wait.value == ewma
+
+
+async def test_listing_reads_the_replica_unless_the_client_wrote(client, replica):
+    async with replica() as session:
+        session.add(build_order(OrderSchema(user_id="on-replica", status="Pending", currency="USD", total_amount=1.0)))
+        await session.commit()
+    response = await client.post("/api/v1/orders/", json={
+        "user_id": "on-primary", "status": "Pending", "currency": "USD", "total_amount": 1.0, "items": [],
+    })
+    assert response.status_code == 201
+
+    response = await client.get("/api/v1/orders/")
+    assert [order["user_id"] for order in response.json()["data"]] == ["on-replica"]
+    # The app under test has no replica configured, so ReadYourWritesMiddleware isn't installed
+    client.cookies.set(settings.DB_PRIMARY_COOKIE, "1")
+    response = await client.get("/api/v1/orders/")
+    assert [order["user_id"] for order in response.json()["data"]] == ["on-primary"]
+
+
+@pytest.mark.parametrize("method,sets_cookie", [("GET", False), ("POST", True), ("DELETE", True)])
+async def test_writes_set_the_read_primary_cookie(method, sets_cookie):
+    async def endpoint(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    app = ReadYourWritesMiddleware(endpoint, max_age=5)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.request(method, "/")
+    assert (settings.DB_PRIMARY_COOKIE in response.cookies) is sets_cookie
@@ -0,0 +1,49 @@
+from datetime import datetime
+from decimal import Decimal
+from models.orders import Order, OrderItem, OrderStatus
+from models.payments import Payment, PaymentMethod, PaymentStatus
+from core.utils.response import Response
+from core.utils.serialization import dumps, fragment, loads
+import pytest
+
+CREATED = datetime(2025, 6, 1, 12, 30, 15, 123456)
+
+
+def order() -> Order:
+    return Order(
+        id="o1", user_id="u1", status=OrderStatus.Pending, total_amount=25.0, currency="USD",
+        created_at=CREATED, updated_at=CREATED, version=2,
+        items=[OrderItem(id="i1", order_id="o1", product_id="p1", quantity=2, price_per_unit=10.0, total_price=20.0)],
+    )
+
+
+def payment() -> Payment:
+    return Payment(
+        id="pay1", order_id="o1", user_id="u1", method=PaymentMethod.UPI, status=PaymentStatus.Completed,
+        amount=Decimal("25.50000000"), currency="USD", created_at=CREATED, updated_at=CREATED,
+        refunded_amount=Decimal("0"),
+    )
+
+
+@pytest.mark.parametrize("model", [order, payment])
+def test_registered_encoder_matches_to_dict(model):
+    instance = model()
+    assert loads(dumps(instance)) == instance.to_dict()
+
+
+def test_response_envelope():
+    response = Response(data=[order()], extra={"next_cursor": "abc"}, code=201)
+    body = loads(response.body)
+    assert response.status_code == 201
+    assert body["data"] == [order().to_dict()]
+    assert (body["success"], body["message"], body["next_cursor"]) == (True, "Created", "abc")
+
+
+def test_cached_payload_is_embedded_as_is():
+    payload = dumps(payment())
+    assert loads(Response(data=fragment(payload)).body)["data"] == payment().to_dict()
+
+
+def test_unregistered_type_is_rejected():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
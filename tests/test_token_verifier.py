@@ -0,0 +1,81 @@
+from fastapi import Depends, FastAPI
+from core.utils.auth.verifier import TokenVerifier, get_token_claims, token_verifier
+import asyncio
+import httpx
+import jwt
+import pytest
+import time
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "test-secret-key-with-enough-bytes!"
+
+
+def token(expires_in: float = 60, secret: str = SECRET, algorithm: str = "HS256", **claims) -> str:
+    claims = {"sub": "u1", "exp": int(time.time() + expires_in), **claims}
+    return jwt.encode(claims, secret, algorithm=algorithm)
+
+
+def counting_verifier(**options) -> tuple:
+    verifier = TokenVerifier(secret_key=SECRET, algorithms=["HS256"], jwks_url=None, **options)
+    decoded = []
+    decode = verifier._decode
+
+    async def counted(raw):
+        decoded.append(raw)
+        return await decode(raw)
+
+    verifier._decode = counted
+    return verifier, decoded
+
+
+async def test_valid_token_is_verified_once():
+    verifier, decoded = counting_verifier()
+    raw = token()
+    assert (await verifier.verify(raw))["sub"] == "u1"
+    assert (await verifier.verify(raw))["sub"] == "u1"
+    assert len(decoded) == 1
+
+    verifier.forget(raw)
+    await verifier.verify(raw)
+    assert len(decoded) == 2
+
+
+async def test_cached_token_expires_with_its_exp():
+    verifier, _ = counting_verifier(cache_ttl=300)
+    exp = int(time.time()) + 1
+    raw = token(exp=exp)
+    await verifier.verify(raw)
+    await asyncio.sleep(exp - time.time() + 0.05)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        await verifier.verify(raw)
+
+
+@pytest.mark.parametrize("raw", [
+    pytest.param(token(secret="someone-elses-secret-key-32-bytes"), id="forged"),
+    pytest.param(token(algorithm="HS512"), id="algorithm-not-allowed"),
+    pytest.param(jwt.encode({"sub": "u1"}, SECRET, algorithm="HS256"), id="no-exp"),
+])
+async def test_invalid_tokens_are_rejected_every_time(raw):
+    verifier, decoded = counting_verifier()
+    for _ in range(2):
+        with pytest.raises(jwt.PyJWTError):
+            await verifier.verify(raw)
+    assert len(decoded) == 2
+
+
+async def test_dependency_answers_401_without_a_valid_token(monkeypatch):
+    monkeypatch.setattr(token_verifier, "secret_key", SECRET)
+    app = FastAPI()
+
+    @app.get("/me")
+    async def me(claims: dict = Depends(get_token_claims)):
+        return {"sub": claims["sub"]}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/me")).status_code == 401
+        response = await client.get("/me", headers={"Authorization": f"Bearer {token(expires_in=-10)}"})
+        assert (response.status_code, response.json()["detail"]) == (401, "Token expired")
+        assert "invalid_token" in response.headers["www-authenticate"]
+        response = await client.get("/me", headers={"Authorization": f"Bearer {token()}"})
+        assert response.json() == {"sub": "u1"}